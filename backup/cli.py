@@ -1,28 +1,75 @@
 import argparse
+import cProfile
 import sys
 
+from core import profiling
 from core.extensions import BackupExtension
 
+# Top level options that are followed by a value.
+OPTIONS_WITH_VALUES = ('--profile-output',)
+
+
+def _get_command_index(argv):
+    # The sub-command is the first positional argument that isn't the value
+    #   of a top level option.
+    args = iter(enumerate(argv))
+    for i, arg in args:
+        if arg in OPTIONS_WITH_VALUES:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return i
+    return None
+
 
 def do_program():
+    argv = sys.argv[1:]
+    command_index = _get_command_index(argv)
+    command = argv[command_index] if command_index is not None else None
+
+    # Profiling has to start before the arguments can be parsed properly,
+    #   since finding the extensions to parse them with is one of the phases.
+    top_level_argv = argv[:command_index]
+    if any(arg == '--profile' or arg.startswith('--profile-output') for arg in top_level_argv):
+        profiling.enable()
+
     parser = argparse.ArgumentParser(description='Backup management tool')
+    parser.add_argument('--profile', action='store_true', help='report how long each phase of the run takes')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='report phases like --profile, and write cProfile statistics to PATH for use with pstats')
 
     subparsers = parser.add_subparsers(dest='command', help='sub-commands')
 
-    cli_extension_classes = {e.get_extension_name(): e for e in BackupExtension.get_all_extensions()}
-    cli_extensions = {}
-    for name, extension in cli_extension_classes.items():
-        extension_parser = subparsers.add_parser(name)
-        cli_extensions[name] = extension(extension_parser)
+    # Only the extension that's actually being run is imported; the others
+    #   just need a name and help text, which are cached between runs.
+    cli_extension = None
+    with profiling.span('extension discovery'):
+        for metadata in BackupExtension.get_extensions_metadata():
+            extension_parser = subparsers.add_parser(metadata.name, help=metadata.help)
+            if metadata.name == command:
+                extension_class = BackupExtension.load_extension(metadata.module_dirname)
+                cli_extension = extension_class(extension_parser)
 
     args = parser.parse_args()
-    extension = cli_extensions.get(args.command)
 
-    if not extension:
+    if not cli_extension:
         parser.print_usage(sys.stderr)
         sys.exit(1)
 
-    extension.run(args)
+    profiler = cProfile.Profile() if args.profile_output else None
+    try:
+        with profiling.span('run {}'.format(args.command)):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                cli_extension.run(args)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(args.profile_output)
+        if profiling.get_profiler() is not None:
+            print('\n'.join(['Phases:'] + profiling.get_profiler().report()), file=sys.stderr)
 
 
 if __name__ == '__main__':
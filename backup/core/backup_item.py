@@ -1,7 +1,17 @@
 class BackupItem(object):
-    def __init__(self, local_path, remote_path):
+    def __init__(self, local_path, remote_path, snapshot=None):
+        """
+        Positional arguments:
+            local_path -- Where the item is kept on this machine
+            remote_path -- Where the item is kept on the remote
+
+        Keyword arguments:
+            snapshot -- The snapshot to load the item from, for copy managers
+                that keep snapshots (default the latest)
+        """
         self.local_path = local_path
         self.remote_path = remote_path
+        self.snapshot = snapshot
 
     def __eq__(self, other):
         if not issubclass(type(other), BackupItem):
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+
+
+def get_cache_dir():
+    """The directory that anything cached between runs is kept in. It's
+    `$BACKUP_CACHE_DIR` if set, and otherwise `backup` within the user's cache
+    directory.
+    """
+    if 'BACKUP_CACHE_DIR' in os.environ:
+        return os.environ['BACKUP_CACHE_DIR']
+
+    cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_root, 'backup')
+
+
+def read_json_cache(filename):
+    """Return what was last cached as filename within the cache directory, or
+    None if nothing usable was.
+    """
+    try:
+        with open(os.path.join(get_cache_dir(), filename)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_cache(filename, value):
+    """Cache value as JSON in filename within the cache directory.
+
+    Caches are only an optimization, so failing to write one, or having a value
+    that can't be represented as JSON, isn't an error.
+
+    The file is replaced atomically, so concurrent runs never read a partially
+    written cache.
+    """
+    cache_path = os.path.join(get_cache_dir(), filename)
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except (OSError, TypeError, ValueError):  # pragma: no cover
+        pass
@@ -1,6 +1,9 @@
-from .copy_manager import DestinationAlreadyExistsError
+from .archive_copy_manager import ArchiveCopyManager, UnavailableCompressionError
+from .chunk_store_copy_manager import ChunkStoreCopyManager
+from .copy_manager import DestinationAlreadyExistsError, IAsyncCopyManager, ICopyListener, ICopyManager
+from .copy_manager import ThreadedAsyncCopyManager
 from .native_copy_manager import NativeCopyManager
-from .rsync_copy_manager import RsyncCopyManager
+from .rsync_copy_manager import AsyncRsyncCopyManager, RsyncCopyManager
 
 
 class UnknownCopyManagerError(Exception):
@@ -9,17 +12,40 @@ class UnknownCopyManagerError(Exception):
 
 class CopyManagerFactory(object):
     @classmethod
-    def get(cls, manager_name):
-        if manager_name in globals():
-            return globals()[manager_name]()
+    def get(cls, manager_name, **options):
+        """Create the copy manager with the given class name.
+
+        Positional arguments:
+            manager_name -- The class name of the copy manager
+
+        Keyword arguments are passed on to the copy manager's constructor.
+        """
+        if manager_name in cls.get_manager_names():
+            return globals()[manager_name](**options)
 
         raise UnknownCopyManagerError('Failed to find copy manager: {}'.format(manager_name))
 
+    @classmethod
+    def get_manager_names(cls):
+        """Return the names of every copy manager that can be created."""
+        return sorted(
+            name for name, value in globals().items()
+            if isinstance(value, type) and issubclass(value, ICopyManager) and value is not ICopyManager
+        )
+
 
 __all__ = [
+    'ArchiveCopyManager',
+    'AsyncRsyncCopyManager',
+    'ChunkStoreCopyManager',
     'CopyManagerFactory',
     'DestinationAlreadyExistsError',
+    'IAsyncCopyManager',
+    'ICopyListener',
+    'ICopyManager',
     'NativeCopyManager',
     'RsyncCopyManager',
+    'ThreadedAsyncCopyManager',
+    'UnavailableCompressionError',
     'UnknownCopyManagerError'
 ]
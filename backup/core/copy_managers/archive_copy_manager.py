@@ -0,0 +1,216 @@
+import gzip
+import os
+import shutil
+import subprocess
+import tarfile
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover (Depends on what's installed)
+    zstandard = None
+
+from ..throttle import ThrottledFile
+from .copy_manager import ICopyManager, DestinationAlreadyExistsError
+
+
+class UnavailableCompressionError(Exception):
+    pass
+
+
+class Compression(object):
+    AUTO = 'auto'
+    ZSTD = 'zstd'
+    GZIP = 'gzip'
+
+
+ARCHIVE_EXTENSIONS = {
+    Compression.ZSTD: '.tar.zst',
+    Compression.GZIP: '.tar.gz'
+}
+PARTIAL_SUFFIX = '.partial'
+
+# Newer Pythons can sanitize archive members themselves; older ones rely on
+#   the checks made before each member is extracted.
+EXTRACT_OPTIONS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+
+class ArchiveCopyManager(ICopyManager):
+    """
+    Stores each item as a single compressed tar archive, which is much cheaper
+    than copying many small files to remotes where every file has a high
+    fixed cost (SMB shares, slow USB drives).
+
+    The archive is streamed straight to `<remote_path>/<local directory
+    name>.tar.zst` (or `.tar.gz`) as it's compressed, without staging it
+    anywhere locally. It's written under a `.partial` name and renamed once
+    complete, so an interrupted save never looks like a finished one. Loading
+    streams the archive back and extracts it as it's read.
+
+    The remote must be reachable as a path (local disk, mounted share).
+
+    Keyword arguments:
+        compression -- `zstd`, `gzip`, or `auto`, which uses zstd when the
+            zstandard package is installed and gzip otherwise (default `auto`)
+        level -- Compression level (default 3 for zstd, 6 for gzip)
+        threads -- Number of threads to compress with, 0 meaning one per CPU.
+            Gzip is only multithreaded when pigz is installed (default 0)
+    """
+    def __init__(self, compression=Compression.AUTO, level=None, threads=0):
+        if compression == Compression.AUTO:
+            compression = Compression.ZSTD if zstandard is not None else Compression.GZIP
+
+        if compression not in ARCHIVE_EXTENSIONS:
+            raise UnavailableCompressionError('Unknown compression: {}'.format(compression))
+        if compression == Compression.ZSTD and zstandard is None:
+            raise UnavailableCompressionError('zstd compression requires the zstandard package')
+
+        self.compression = compression
+        self.level = level
+        self.threads = threads
+
+    def save_item(self, backup_item, force=False):
+        src = backup_item.local_path
+        if not os.path.exists(src):
+            raise OSError(2, 'No such file or directory', src)
+
+        archive_path = self._archive_path(backup_item, self.compression)
+        if not force and any(os.path.exists(self._archive_path(backup_item, c)) for c in ARCHIVE_EXTENSIONS):
+            raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        os.makedirs(backup_item.remote_path, exist_ok=True)
+        partial_path = archive_path + PARTIAL_SUFFIX
+        try:
+            with open(partial_path, 'wb') as f:
+                if self.compression == Compression.ZSTD:
+                    self._write_zstd(src, f, backup_item)
+                else:
+                    self._write_gzip(src, f, backup_item)
+        except BaseException:
+            os.unlink(partial_path)
+            raise
+
+        os.replace(partial_path, archive_path)
+
+        # Only one archive of an item should ever exist, in case the
+        #   compression used has changed since it was last saved.
+        for compression in ARCHIVE_EXTENSIONS:
+            other_path = self._archive_path(backup_item, compression)
+            if other_path != archive_path and os.path.exists(other_path):
+                os.unlink(other_path)
+
+    def load_item(self, backup_item, force=False):
+        for compression in ARCHIVE_EXTENSIONS:
+            archive_path = self._archive_path(backup_item, compression)
+            if os.path.exists(archive_path):
+                break
+        else:
+            raise OSError(2, 'No such file or directory', self._archive_path(backup_item, self.compression))
+
+        dst = backup_item.local_path
+        if not force and os.path.isdir(dst) and os.listdir(dst):
+            raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        os.makedirs(dst, exist_ok=True)
+        with open(archive_path, 'rb') as f:
+            f = self._throttled(f)
+            if compression == Compression.ZSTD:
+                if zstandard is None:
+                    raise UnavailableCompressionError('zstd compression requires the zstandard package')
+                with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                    self._extract(reader, dst, self._get_file_callback(backup_item))
+            else:
+                with gzip.GzipFile(fileobj=f, mode='rb') as reader:
+                    self._extract(reader, dst, self._get_file_callback(backup_item))
+
+    def _write_zstd(self, src, f, backup_item):
+        level = self.level if self.level is not None else 3
+        threads = self.threads if self.threads > 0 else -1
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        with compressor.stream_writer(f, closefd=False) as writer:
+            self._archive(src, self._throttled(writer), self._get_file_callback(backup_item))
+
+    def _write_gzip(self, src, f, backup_item):
+        level = self.level if self.level is not None else 6
+
+        on_file = self._get_file_callback(backup_item)
+        pigz = shutil.which('pigz')
+        if pigz is None or self.threads == 1:
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=level) as writer:
+                self._archive(src, self._throttled(writer), on_file)
+            return
+
+        args = [pigz, '-{}'.format(level)]
+        if self._throttle is not None:
+            args = self._throttle.get_command_prefix() + args
+        if self.threads > 0:
+            args += ['-p', str(self.threads)]
+
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=f)
+        try:
+            self._archive(src, self._throttled(process.stdin), on_file)
+        finally:
+            process.stdin.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            raise OSError(returncode, 'pigz failed to compress', src)
+
+    def _throttled(self, fileobj):
+        # Saves are throttled by what goes into the compressor, since pigz
+        #   writes the archive itself, and loads by what's read of the
+        #   archive.
+        if self._throttle is None:
+            return fileobj
+        return ThrottledFile(fileobj, self._throttle)
+
+    def _get_file_callback(self, backup_item):
+        """Return a function to call with each regular file's TarInfo as it's
+        archived or extracted, or None if nothing needs to know about them.
+        """
+        if not self._listeners:
+            return None
+
+        def on_file(member):
+            self._notify_file_copied(backup_item, os.path.normpath(member.name), member.size)
+
+        return on_file
+
+    @staticmethod
+    def _archive(src, fileobj, on_file=None):
+        def tar_filter(member):
+            if on_file is not None and member.isfile():
+                on_file(member)
+            return member
+
+        # Stream mode, so the archive is written strictly sequentially.
+        with tarfile.open(fileobj=fileobj, mode='w|') as tar:
+            tar.add(src, arcname=os.curdir, filter=tar_filter)
+
+    @staticmethod
+    def _extract(fileobj, dst, on_file=None):
+        root = os.path.realpath(dst)
+        with tarfile.open(fileobj=fileobj, mode='r|') as tar:
+            for member in tar:
+                # Never let an archive write outside of the destination.
+                path = os.path.realpath(os.path.join(root, member.name))
+                if path != root and not path.startswith(root + os.sep):
+                    raise OSError(1, 'Archive member is outside of the destination', member.name)
+                if member.issym() or member.islnk():
+                    link_root = os.path.dirname(path) if member.issym() else root
+                    target = os.path.realpath(os.path.join(link_root, member.linkname))
+                    if target != root and not target.startswith(root + os.sep):
+                        raise OSError(1, 'Archive member links outside of the destination', member.name)
+
+                # Replace what's already there rather than writing through it,
+                #   in case it's a link.
+                member_path = os.path.join(root, member.name)
+                if os.path.lexists(member_path) and not os.path.isdir(member_path):
+                    os.unlink(member_path)
+                tar.extract(member, root, **EXTRACT_OPTIONS)
+                if on_file is not None and member.isfile():
+                    on_file(member)
+
+    @staticmethod
+    def _archive_path(backup_item, compression):
+        name = os.path.basename(os.path.normpath(backup_item.local_path))
+        return os.path.join(backup_item.remote_path, name + ARCHIVE_EXTENSIONS[compression])
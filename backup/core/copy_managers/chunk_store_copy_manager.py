@@ -0,0 +1,323 @@
+import errno
+import hashlib
+import json
+import os
+import random
+import tempfile
+
+from .copy_manager import ICopyManager, DestinationAlreadyExistsError
+from .tree_sync import walk
+
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+DEFAULT_STORE_DIRNAME = '.chunks'
+READ_SIZE = 1 << 20
+
+
+def _gear_table(seed):
+    rng = random.Random(seed)
+    return tuple(rng.getrandbits(64) for _ in range(256))
+
+
+def _gear_byte_tables(gear):
+    # The n-th byte of each gear value, as a table for bytes.translate.
+    return tuple(bytes((g >> (8 * n)) & 0xff for g in gear) for n in range(8))
+
+
+class ContentDefinedChunker(object):
+    """
+    Splits a stream into chunks whose boundaries are chosen by the content of
+    the stream, using a gear-based rolling hash. Inserting or removing a few
+    bytes in the middle of a file only changes the chunks around the edit, so
+    the rest of the file still deduplicates against earlier saves.
+
+    Keyword arguments:
+        min_size -- Smallest chunk that will be produced, except at the end of
+            a stream (default 16 KiB)
+        avg_size -- Target average chunk size, must be a power of two (default
+            64 KiB)
+        max_size -- Largest chunk that will be produced (default 256 KiB)
+    """
+    # Gear values only need to be random-looking, but must never change, or
+    #   chunk boundaries would move and nothing would deduplicate with saves
+    #   made by earlier versions.
+    _GEAR = _gear_table(0x6261636b7570)
+
+    # The hash is computed for up to this many bytes at a time, or about a
+    #   chunk's worth for small chunks. Larger windows are faster to hash, but
+    #   more of each is wasted past the cut.
+    _WINDOW_SIZE = 16 * 1024
+    # Only the last 64 bytes make a difference to a 64 bit gear hash, since
+    #   each byte's gear value is shifted out 64 bytes later.
+    _HISTORY = 63
+    # Each byte's hash is computed in a lane of this many bits, which is
+    #   wide enough to hold every gear value that makes up the hash without
+    #   carrying into the next lane.
+    _LANE_BITS = 128
+    _LANE_BYTES = _LANE_BITS // 8
+    _GEAR_BYTES = _gear_byte_tables(_GEAR)
+
+    def __init__(self, min_size=16 * 1024, avg_size=64 * 1024, max_size=256 * 1024):
+        if avg_size & (avg_size - 1):
+            raise ValueError('avg_size must be a power of two')
+        if not min_size <= avg_size <= max_size:
+            raise ValueError('Chunk sizes must satisfy min_size <= avg_size <= max_size')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        # Cut where the top cut_bits bits of the hash are all 0, since the low
+        #   bits have only seen the last few bytes of input.
+        self.cut_bits = avg_size.bit_length() - 1
+        self.window_size = max(min(avg_size, self._WINDOW_SIZE), self._HISTORY + 1)
+        self._lane_masks = {}
+
+    def chunks(self, f):
+        """Yield successive chunks read from the binary file object f."""
+        pending = b''
+        while True:
+            data = f.read(READ_SIZE)
+            pending += data
+
+            start = 0
+            while True:
+                cut = self._find_cut(pending, start, final=not data)
+                if cut is None:
+                    break
+                yield pending[start:cut]
+                start = cut
+
+            pending = pending[start:]
+            if not data:
+                return
+
+    def _find_cut(self, data, start, final):
+        available = len(data) - start
+        if available == 0:
+            return None
+        if available <= self.min_size:
+            return len(data) if final else None
+
+        begin = start + self.min_size
+        end = start + min(available, self.max_size)
+        for window in range(begin, end, self.window_size):
+            cut = self._find_cut_in_window(data, begin, window, min(window + self.window_size, end))
+            if cut is not None:
+                return cut
+
+        if end - start == self.max_size or final:
+            return end
+        return None
+
+    def _find_cut_in_window(self, data, begin, window, end):
+        """Return the position just past the first byte in data[window:end]
+        where the hash of data[begin:] has all of its cut bits 0, or None.
+
+        Rather than hashing byte by byte, the hash at every position in the
+        window is computed at once, as the lanes of a single large integer,
+        so that the work is done by integer arithmetic rather than by a loop
+        in Python:
+
+            h[i] = (h[i - 1] << 1) + gear[data[i]]
+                 = sum(gear[data[i - j]] << j for j in range(64))  (mod 2**64)
+
+        Lane i starts out holding gear[data[i]], and the sum is built up by
+        repeatedly adding the lanes to themselves, shifted by a doubling
+        number of lanes (and bits).
+        """
+        lane_bits = self._LANE_BITS
+        lane_bytes = self._LANE_BYTES
+
+        # The hash at the start of the window depends on the bytes before it.
+        first = max(begin, window - self._HISTORY)
+        section = data[first:end]
+
+        lanes = bytearray(len(section) * lane_bytes)
+        for n, table in enumerate(self._GEAR_BYTES):
+            lanes[n::lane_bytes] = section.translate(table)
+        h = int.from_bytes(lanes, 'little')
+
+        span = 1
+        while span <= self._HISTORY:
+            h += h << (span * (lane_bits + 1))
+            span *= 2
+
+        # Lanes whose cut bits are all 0 are the cuts. Adding all 1s to each
+        #   lane's cut bits carries out of them for every lane but those.
+        cut_ones, carry_bits = self._get_lane_masks(window - first, end - window)
+        carries = (((h >> (64 - self.cut_bits)) & cut_ones) + cut_ones) & carry_bits
+        cuts = carries ^ carry_bits
+        if not cuts:
+            return None
+        return first + ((cuts & -cuts).bit_length() - 1) // lane_bits + 1
+
+    def _get_lane_masks(self, skipped, count):
+        """Return masks of the cut bits of each lane, and of the bit each
+        carries into, for count lanes after the skipped ones.
+        """
+        key = (skipped, count)
+        masks = self._lane_masks.get(key)
+        if masks is None:
+            lane_bytes = self._LANE_BYTES
+            ones = int.from_bytes(bytes(skipped * lane_bytes) + (b'\x01' + bytes(lane_bytes - 1)) * count, 'little')
+            masks = (ones * ((1 << self.cut_bits) - 1), ones << self.cut_bits)
+            # Only full windows come up again and again.
+            if count == self.window_size:
+                self._lane_masks[key] = masks
+        return masks
+
+
+class ChunkStoreCopyManager(ICopyManager):
+    """
+    Stores items as deduplicated, content-addressed chunks, alongside a small
+    manifest per item describing how to reassemble its files.
+
+    Chunks are stored by their SHA-256 under the chunk store directory, so any
+    chunk that has been seen before, whether in an earlier save of the same
+    item or in a different item entirely, is never written again. Each item's
+    manifest is written to `<remote_path>/<local directory name>.manifest.json`.
+
+    The remote must be reachable as a path (local disk, mounted share), and
+    items must be directories. Symbolic links are stored as what they point
+    to, and broken ones are left out.
+
+    Keyword arguments:
+        store -- Directory that holds the chunks. Environment variables and
+            `~` are expanded when the store is first used (default
+            `<remote_path>/.chunks`)
+        min_size, avg_size, max_size -- Chunk size bounds, passed on to
+            ContentDefinedChunker
+    """
+    def __init__(self, store=None, **chunk_sizes):
+        self.store = store
+        self.chunker = ContentDefinedChunker(**chunk_sizes)
+
+    def save_item(self, backup_item, force=False):
+        src = backup_item.local_path
+        if not os.path.exists(src):
+            raise OSError(2, 'No such file or directory', src)
+        # Manifests describe the contents of a directory, which a file doesn't
+        #   have.
+        if not os.path.isdir(src):
+            raise OSError(errno.ENOTDIR, 'Not a directory', src)
+
+        manifest_path = self._manifest_path(backup_item)
+        if os.path.exists(manifest_path) and not force:
+            raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        store = self._store_path(backup_item)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'directories': [],
+            'files': []
+        }
+
+        for dirpath, dirnames, filenames in walk(src):
+            rel_dir = os.path.relpath(dirpath, src)
+            for dirname in sorted(dirnames):
+                manifest['directories'].append(self._to_manifest_path(os.path.join(rel_dir, dirname)))
+
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # A broken link, which has no contents to store.
+                    continue
+                with open(path, 'rb') as f:
+                    chunks = [self._store_chunk(store, c) for c in self.chunker.chunks(f)]
+
+                manifest['files'].append({
+                    'path': self._to_manifest_path(os.path.join(rel_dir, filename)),
+                    'size': stat.st_size,
+                    'mode': stat.st_mode & 0o7777,
+                    'mtime': stat.st_mtime,
+                    'chunks': chunks
+                })
+                self._notify_file_copied(backup_item, os.path.normpath(os.path.join(rel_dir, filename)), stat.st_size)
+
+        self._write_atomically(manifest_path, json.dumps(manifest, indent=1).encode())
+
+    def load_item(self, backup_item, force=False):
+        manifest_path = self._manifest_path(backup_item)
+        if not os.path.exists(manifest_path):
+            raise OSError(2, 'No such file or directory', manifest_path)
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        dst = backup_item.local_path
+        if not force:
+            for entry in manifest['files']:
+                if os.path.exists(self._from_manifest_path(dst, entry['path'])):
+                    raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        store = self._store_path(backup_item)
+        os.makedirs(dst, exist_ok=True)
+        for directory in manifest['directories']:
+            os.makedirs(self._from_manifest_path(dst, directory), exist_ok=True)
+
+        for entry in manifest['files']:
+            path = self._from_manifest_path(dst, entry['path'])
+            with open(path, 'wb') as f:
+                for digest in entry['chunks']:
+                    with open(self._chunk_path(store, digest), 'rb') as chunk:
+                        data = chunk.read()
+                    if self._throttle is not None:
+                        self._throttle.consume(len(data))
+                    f.write(data)
+
+            os.chmod(path, entry['mode'])
+            os.utime(path, (entry['mtime'], entry['mtime']))
+            self._notify_file_copied(backup_item, os.path.relpath(path, dst), entry['size'])
+
+    def _manifest_path(self, backup_item):
+        name = os.path.basename(os.path.normpath(backup_item.local_path))
+        return os.path.join(backup_item.remote_path, name + MANIFEST_SUFFIX)
+
+    def _store_path(self, backup_item):
+        if self.store is None:
+            return os.path.join(backup_item.remote_path, DEFAULT_STORE_DIRNAME)
+        return os.path.expanduser(os.path.expandvars(self.store))
+
+    def _store_chunk(self, store, chunk):
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self._chunk_path(store, digest)
+        if not os.path.exists(path):
+            # Only chunks that are actually written count against the
+            #   throttle.
+            if self._throttle is not None:
+                self._throttle.consume(len(chunk))
+            self._write_atomically(path, chunk)
+        return digest
+
+    @staticmethod
+    def _chunk_path(store, digest):
+        return os.path.join(store, digest[:2], digest[2:4], digest)
+
+    @staticmethod
+    def _write_atomically(path, data):
+        """Write data to path such that readers either see the whole file or
+        nothing at all, even if this process dies part way through.
+        """
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _to_manifest_path(rel_path):
+        # Manifests may be shared between platforms, so always use forward
+        #   slashes.
+        return os.path.normpath(rel_path).replace(os.sep, '/')
+
+    @staticmethod
+    def _from_manifest_path(root, manifest_path):
+        return os.path.join(root, *manifest_path.split('/'))
@@ -1,3 +1,10 @@
+import asyncio
+
+# Kept in a module of its own, so that listeners can be defined without
+#   loading any copy managers.
+from ..listeners import ICopyListener  # noqa: F401
+
+
 class DestinationAlreadyExistsError(Exception):
     pass
 
@@ -7,6 +14,31 @@ class ICopyManager(object):
     The copy manager interface is provided as a means of defining what each
     copy class must implement.
     """
+    _listeners = ()
+    _throttle = None
+
+    def add_listener(self, listener):
+        """Have an ICopyListener receive events about the copies made from now
+        on. Copy managers report each file they copy if they can.
+        """
+        self._listeners = self._listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """Stop an ICopyListener added with add_listener from receiving any
+        more events.
+        """
+        self._listeners = tuple(other for other in self._listeners if other is not listener)
+
+    def set_throttle(self, throttle):
+        """Have the copies made from now on keep to the bandwidth and priority
+        of a backup.core.throttle.Throttle, or to none if it's None.
+        """
+        self._throttle = throttle
+
+    def _notify_file_copied(self, backup_item, path, size):
+        for listener in self._listeners:
+            listener.file_copied(backup_item, path, size)
+
     def save_item(self, backup_item, force=False):
         """Copy an item to the remote.
 
@@ -20,6 +52,35 @@ class ICopyManager(object):
         """
         raise NotImplementedError
 
+    def save_items(self, backup_items, force=False):
+        """Copy several items to the remote. A failure to copy one item doesn't
+        prevent the rest from being copied.
+
+        Copy managers that can transfer many items more cheaply together than
+        one at a time should override this.
+
+        Positional arguments:
+            backup_items -- The backup.core.backup_item.BackupItems that will
+                be copied to their remote paths
+
+        Keyword arguments:
+            force -- Use this tool's force mechanism to overwrite files that
+                already exist on the remote (default False)
+
+        Returns a list with an entry for each item, in order: None if the item
+        was copied, or the exception that prevented it from being copied.
+        """
+        errors = []
+        for backup_item in backup_items:
+            try:
+                self.save_item(backup_item, force)
+            except (DestinationAlreadyExistsError, OSError) as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+
+        return errors
+
     def load_item(self, backup_item, force=False):
         """Load an item from the remote.
 
@@ -32,3 +93,141 @@ class ICopyManager(object):
                 already exist locally (default False)
         """
         raise NotImplementedError
+
+    def resume_item(self, backup_item, completed_files, force=False):
+        """Finish saving an item that an earlier, interrupted save had started
+        copying to the remote.
+
+        Copy managers that can continue a partial copy, rather than starting
+        it over, should override this.
+
+        Positional arguments:
+            backup_item -- The backup.core.backup_item.BackupItem that will be
+                copied to its remote path
+            completed_files -- The size of each file the earlier save finished
+                copying, by its path relative to the item's directory
+
+        Keyword arguments:
+            force -- Use this tool's force mechanism to overwrite files that
+                already exist on the remote (default False)
+        """
+        self.save_item(backup_item, force)
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        """Return where a copy of the item is read from and written to, as a
+        tuple of the source and destination directories, so that the copy can
+        be compared to its source.
+
+        Positional arguments:
+            backup_item -- The backup.core.backup_item.BackupItem that was
+                copied
+
+        Keyword arguments:
+            loading -- Whether the item was loaded, rather than saved (default
+                False)
+
+        Returns None if the copy isn't stored as a plain directory tree that
+        can be reached as a path.
+        """
+        return None
+
+    def get_snapshots(self, backup_item):
+        """Return the names of the snapshots saved of the item, oldest first,
+        or None if this copy manager doesn't keep snapshots.
+        """
+        return None
+
+    def get_run_summary(self):
+        """Return a short, human readable description of how the copies made
+        so far were carried out, or None if there's nothing worth reporting.
+        """
+        return None
+
+    def get_async_copy_manager(self):
+        """Return an IAsyncCopyManager that makes the same copies as this copy
+        manager, for use from an asyncio event loop.
+
+        Unless overridden, each copy is run on a thread of the event loop's
+        default executor, so that it doesn't block the loop.
+        """
+        return ThreadedAsyncCopyManager(self)
+
+    def close(self):
+        """Release anything the copy manager has held on to between copies,
+        such as connections to the remote. The copy manager shouldn't be used
+        afterwards.
+        """
+        pass
+
+
+class IAsyncCopyManager(object):
+    """
+    The asyncio counterpart of ICopyManager, whose copies are coroutines, so
+    many items can be copied at once from a single event loop.
+
+    Async copy managers are created from, and share their listeners and
+    resources with, an ICopyManager; see ICopyManager.get_async_copy_manager.
+    Closing that copy manager closes this one too.
+    """
+    async def save_item(self, backup_item, force=False):
+        """Copy an item to the remote, as ICopyManager.save_item."""
+        raise NotImplementedError
+
+    async def save_items(self, backup_items, force=False, limit=None):
+        """Copy several items to the remote concurrently, as
+        ICopyManager.save_items.
+
+        Keyword arguments:
+            force -- Use this tool's force mechanism to overwrite files that
+                already exist on the remote (default False)
+            limit -- The most items to copy at once (default all of them)
+        """
+        semaphore = asyncio.Semaphore(limit or max(len(backup_items), 1))
+
+        async def save(backup_item):
+            async with semaphore:
+                try:
+                    await self.save_item(backup_item, force)
+                except (DestinationAlreadyExistsError, OSError) as e:
+                    return e
+                return None
+
+        return list(await asyncio.gather(*[save(backup_item) for backup_item in backup_items]))
+
+    async def load_item(self, backup_item, force=False):
+        """Load an item from the remote, as ICopyManager.load_item."""
+        raise NotImplementedError
+
+    async def resume_item(self, backup_item, completed_files, force=False):
+        """Finish saving a partially saved item, as ICopyManager.resume_item."""
+        await self.save_item(backup_item, force)
+
+
+class ThreadedAsyncCopyManager(IAsyncCopyManager):
+    """
+    Runs the copies of a blocking copy manager on an executor's threads.
+
+    Positional arguments:
+        copy_manager -- The ICopyManager that performs the actual copies
+
+    Keyword arguments:
+        executor -- The concurrent.futures.Executor that copies run on
+            (default the event loop's default executor)
+    """
+    def __init__(self, copy_manager, executor=None):
+        self.copy_manager = copy_manager
+        self.executor = executor
+
+    async def save_item(self, backup_item, force=False):
+        await self._run(self.copy_manager.save_item, backup_item, force)
+
+    async def load_item(self, backup_item, force=False):
+        await self._run(self.copy_manager.load_item, backup_item, force)
+
+    async def resume_item(self, backup_item, completed_files, force=False):
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.copy_manager.resume_item, backup_item, completed_files, force
+        )
+
+    async def _run(self, copy, backup_item, force):
+        await asyncio.get_running_loop().run_in_executor(self.executor, copy, backup_item, force)
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import shutil
+
+from ..cache import read_json_cache, write_json_cache
+
+DELTA_BLOCK_SIZE = 1024 * 1024
+DELTA_MIN_SIZE = 16 * 1024 * 1024
+
+
+def delta_copy_file(src, dst, block_size=DELTA_BLOCK_SIZE, throttle=None):
+    """Bring the existing file dst up to date with src, in place, by writing
+    only the fixed size blocks of src that differ from dst, then copy src's
+    metadata like shutil.copystat.
+
+    Which blocks differ is decided from the signature of dst cached by the
+    last delta copy to it, so dst doesn't even have to be read. Without a
+    signature that's still valid for dst, each block of dst is read and
+    compared instead, which on most destinations is still far cheaper than
+    writing it.
+
+    Blocks are compared at the same offsets in both files, so data that's
+    inserted or removed, rather than changed, shifts every block after it.
+    Saves are almost always rewritten in place, or appended to, so that
+    rarely matters.
+
+    Positional arguments:
+        src -- source file path
+        dst -- destination file path, which must exist
+
+    Keyword arguments:
+        block_size -- The size of the blocks compared (default 1 MiB)
+        throttle -- A backup.core.throttle.Throttle that the bytes written are
+            drawn from (default None)
+
+    Returns the number of bytes written to dst.
+    """
+    signature = _read_signature(dst, block_size)
+    new_signature = []
+    written = 0
+
+    with open(src, 'rb') as fsrc, open(dst, 'r+b') as fdst:
+        offset = 0
+        while True:
+            block = fsrc.read(block_size)
+            if not block:
+                break
+
+            digest = hashlib.blake2b(block, digest_size=16).hexdigest()
+            new_signature.append(digest)
+
+            index = len(new_signature) - 1
+            if signature is not None:
+                unchanged = index < len(signature) and signature[index] == digest
+            else:
+                fdst.seek(offset)
+                unchanged = fdst.read(len(block)) == block
+
+            if not unchanged:
+                if throttle is not None:
+                    throttle.consume(len(block))
+                fdst.seek(offset)
+                fdst.write(block)
+                written += len(block)
+            offset += len(block)
+
+        fdst.truncate(offset)
+
+    shutil.copystat(src, dst)
+    _write_signature(dst, block_size, new_signature)
+    return written
+
+
+def _get_signature_cache_name(dst):
+    digest = hashlib.sha1(os.path.abspath(dst).encode()).hexdigest()
+    return os.path.join('signatures', '{}.json'.format(digest))
+
+
+def _read_signature(dst, block_size):
+    """Return the digest of each block of dst, as cached by the last delta
+    copy to it, or None if it has changed since.
+    """
+    cached = read_json_cache(_get_signature_cache_name(dst))
+    if not isinstance(cached, dict):
+        return None
+
+    try:
+        dst_stat = os.stat(dst)
+        if (cached['size'], cached['mtime_ns'], cached['block_size']) != (
+            dst_stat.st_size, dst_stat.st_mtime_ns, block_size
+        ):
+            return None
+        return list(cached['blocks'])
+    except (KeyError, TypeError):
+        return None
+
+
+def _write_signature(dst, block_size, blocks):
+    dst_stat = os.stat(dst)
+    write_json_cache(_get_signature_cache_name(dst), {
+        'size': dst_stat.st_size,
+        'mtime_ns': dst_stat.st_mtime_ns,
+        'block_size': block_size,
+        'blocks': blocks
+    })
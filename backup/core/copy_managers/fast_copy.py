@@ -0,0 +1,243 @@
+import ctypes
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None
+
+from ..throttle import ThrottledFile
+
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# From linux/fcntl.h and linux/fs.h
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+BUFFER_SIZE = 1024 * 1024
+SEEK_DATA = getattr(os, 'SEEK_DATA', None)
+SEEK_HOLE = getattr(os, 'SEEK_HOLE', None)
+
+# Errors that mean a strategy isn't supported for this pair of files, rather
+#   than that something went wrong with the copy itself.
+_UNSUPPORTED_ERRNOS = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV
+}
+
+
+class CopyStrategy(object):
+    REFLINK = 'reflink'
+    COPY_FILE_RANGE = 'copy_file_range'
+    SENDFILE = 'sendfile'
+    SPARSE = 'sparse'
+    BUFFERED = 'buffered'
+    # Only the blocks that changed were written, by delta_copy.
+    DELTA = 'delta'
+
+
+def copy_file(src, dst, throttle=None):
+    """Copy the contents of src to dst using the cheapest mechanism the
+    platform and filesystems support:
+
+      1. A reflink (FICLONE), which shares the source's blocks on
+         copy-on-write filesystems like btrfs and XFS, so no data is copied
+      2. For sparse files, a copy of only the regions holding data, found
+         with SEEK_DATA and SEEK_HOLE, so the holes between them are left as
+         holes in the copy rather than being filled with zeros
+      3. copy_file_range, which copies within the kernel, and can offload the
+         copy to the server on network filesystems
+      4. sendfile, which also copies within the kernel
+      5. A buffered copy through userspace
+
+    Positional arguments:
+        src -- source file path
+        dst -- destination file path
+
+    Keyword arguments:
+        throttle -- A backup.core.throttle.Throttle that the bytes copied are
+            drawn from. Reflinks don't copy anything, so aren't throttled
+            (default None)
+
+    Returns the CopyStrategy that was used.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        infd = fsrc.fileno()
+        outfd = fdst.fileno()
+
+        if fcntl is not None and _try_copy(fcntl.ioctl, outfd, FICLONE, infd):
+            return CopyStrategy.REFLINK
+
+        src_stat = os.fstat(infd)
+        size = src_stat.st_size
+        if _is_sparse(src_stat) and _copy_sparse(infd, outfd, size, throttle):
+            return CopyStrategy.SPARSE
+
+        copy_file_range = getattr(os, 'copy_file_range', None)
+        # copy_file_range advances both files' offsets itself.
+        if copy_file_range is not None and _copy_in_kernel(
+                lambda _: copy_file_range(infd, outfd, BUFFER_SIZE), size, throttle):
+            return CopyStrategy.COPY_FILE_RANGE
+
+        sendfile = getattr(os, 'sendfile', None)
+        if sendfile is not None and _copy_in_kernel(lambda o: sendfile(outfd, infd, o, BUFFER_SIZE), size, throttle):
+            return CopyStrategy.SENDFILE
+
+        shutil.copyfileobj(fsrc, fdst if throttle is None else ThrottledFile(fdst, throttle), BUFFER_SIZE)
+        return CopyStrategy.BUFFERED
+
+
+def copy_file_with_metadata(src, dst, throttle=None):
+    """Like shutil.copy2, but copies contents with copy_file. Returns the
+    CopyStrategy that was used.
+    """
+    strategy = copy_file(src, dst, throttle)
+    shutil.copystat(src, dst)
+    return strategy
+
+
+def _load_renameat2():
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError, TypeError):  # pragma: no cover (Depends on the platform)
+        return None
+
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def exchange_paths(a, b):
+    """Atomically swap whatever is at the paths a and b, which must both
+    exist, so that there's no moment where either path is missing.
+
+    Returns False, without changing anything, if the platform or filesystem
+    can't swap paths atomically.
+    """
+    if _renameat2 is None:  # pragma: no cover (Depends on the platform)
+        return False
+
+    if _renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+
+    e = ctypes.get_errno()
+    if e in _UNSUPPORTED_ERRNOS:
+        return False
+    raise OSError(e, os.strerror(e), a, None, b)
+
+
+def _try_copy(fn, *args):
+    try:
+        fn(*args)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+    return True
+
+
+def _is_sparse(stat):
+    # Fewer blocks being allocated than the size needs means there are holes.
+    return SEEK_DATA is not None and getattr(stat, 'st_blocks', None) is not None and \
+        stat.st_blocks * 512 < stat.st_size
+
+
+def _copy_sparse(infd, outfd, size, throttle=None):
+    """Copy only the regions of infd that hold data to the same offsets of
+    outfd, then extend outfd to size, leaving holes wherever infd has them.
+    Returns False, before anything is copied, if the filesystem can't report
+    where the holes are.
+    """
+    offset = 0
+    while offset < size:
+        try:
+            data_start = os.lseek(infd, offset, SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # There's no data left, only a hole up to the end.
+                break
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+
+        data_end = min(os.lseek(infd, data_start, SEEK_HOLE), size)
+        _copy_range(infd, outfd, data_start, data_end, throttle)
+        offset = data_end
+
+    os.ftruncate(outfd, size)
+    return True
+
+
+def _copy_range(infd, outfd, start, end, throttle=None):
+    """Copy the bytes from start to end of infd to the same offsets of outfd,
+    within the kernel where possible.
+    """
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    offset = start
+    while offset < end:
+        count = min(BUFFER_SIZE, end - offset)
+
+        copied = 0
+        if copy_file_range is not None:
+            try:
+                copied = copy_file_range(infd, outfd, count, offset, offset)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                copy_file_range = None
+
+        if not copied:
+            block = os.pread(infd, count, offset)
+            if not block:
+                # The file got shorter.
+                break
+            copied = os.pwrite(outfd, block, offset)
+        offset += copied
+
+        if throttle is not None:
+            throttle.consume(copied)
+
+
+def _copy_in_kernel(copy_chunk, size, throttle=None):
+    """Repeatedly call copy_chunk(offset) until size bytes have been copied,
+    returning False if the mechanism isn't supported for these files. Support
+    can only be determined by the first call, so a failure after that is a
+    real error.
+    """
+    if size == 0:
+        # Without anything to copy, there's no telling whether the mechanism
+        #   works. Files reported as empty may not be, either, so they're left
+        #   to be read until their end.
+        return False
+
+    offset = 0
+    while offset < size:
+        try:
+            copied = copy_chunk(offset)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+
+        if copied == 0:
+            # Some filesystems report that nothing could be copied rather than
+            #   failing outright. Later on, it means the file got shorter.
+            if offset == 0:
+                return False
+            break
+        offset += copied
+
+        if throttle is not None:
+            throttle.consume(copied)
+
+    return True
@@ -1,46 +1,406 @@
 import errno
 import os
 import shutil
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-from send2trash import send2trash
-
+from ..snapshots import RetentionPolicy, is_snapshot_name, new_snapshot_name, select_snapshot, sort_snapshot_names
 from .copy_manager import ICopyManager, DestinationAlreadyExistsError
+from .delta_copy import DELTA_BLOCK_SIZE, DELTA_MIN_SIZE, delta_copy_file
+from .fast_copy import CopyStrategy, copy_file_with_metadata, exchange_paths
+from .tree_sync import TreeSync, walk
+
+MIB = 1024 * 1024
 
 
 class NativeCopyManager(ICopyManager):
+    """
+    Copies files using Python's own file APIs, so it works anywhere the remote
+    is reachable as a path (local disks, mounted network shares).
+
+    Like rsync's -H and -S, files that are hard links to each other stay hard
+    links to each other, and sparse files keep their holes, so copies take up
+    no more space than their sources.
+
+    Keyword arguments:
+        incremental -- Only copy files whose size or modification time differs
+            from the destination, rather than copying whole trees (default
+            False)
+        delete -- When copying incrementally, remove destination files that
+            no longer exist in the source (default False)
+        snapshots -- Save each copy of an item as a new, timestamped snapshot
+            within its remote path, rather than replacing the last copy. Files
+            that haven't changed since the previous snapshot are hard linked
+            to it, rather than copied again (default False)
+        retention -- When saving snapshots, the keyword arguments of the
+            backup.core.snapshots.RetentionPolicy deciding which snapshots are
+            kept after each save (default None, keeping all of them)
+        delta -- When copying incrementally, update large files that have
+            changed by rewriting only the blocks of them that differ, rather
+            than the whole file (default False)
+        delta_min_size -- The size in bytes a file needs to be for it to be
+            updated block by block (default 16 MiB)
+        delta_block_size -- The size in bytes of the blocks compared when
+            updating a file block by block (default 1 MiB)
+    """
+    def __init__(
+        self, incremental=False, delete=False, snapshots=False, retention=None, delta=False,
+        delta_min_size=DELTA_MIN_SIZE, delta_block_size=DELTA_BLOCK_SIZE
+    ):
+        self.incremental = incremental
+        self.delete = delete
+        self.snapshots = snapshots
+        self.retention = RetentionPolicy.from_option(retention)
+        self.delta = delta
+        self.delta_min_size = delta_min_size
+        self.delta_block_size = delta_block_size
+
+        # How many files have been copied with each fast_copy.CopyStrategy,
+        #   and how many of the bytes of files updated block by block had to
+        #   be written.
+        self.copy_strategies = Counter()
+        self.delta_bytes_written = 0
+        self.delta_bytes_total = 0
+        self._copy_strategies_lock = threading.Lock()
+
+        # Trees replaced by forced copies are deleted in the background.
+        self._disposal_executor = None
+        self._disposal_lock = threading.Lock()
+
     def save_item(self, backup_item, force=False):
-        self._copy_directory_to_dest(backup_item.local_path, backup_item.remote_path, force)
+        if self.snapshots:
+            self._save_snapshot(backup_item)
+            return
+
+        self._copy_directory_to_dest(backup_item.local_path, backup_item.remote_path, force, backup_item)
+
+    def resume_item(self, backup_item, completed_files, force=False):
+        # Unchanged files are linked rather than copied into a new snapshot,
+        #   so there's little to be gained from finishing an interrupted one.
+        if self.snapshots:
+            self._save_snapshot(backup_item)
+            return
+
+        self._copy_directory_to_dest(
+            backup_item.local_path, backup_item.remote_path, force, backup_item, completed_files
+        )
 
     def load_item(self, backup_item, force=False):
-        self._copy_directory_to_dest(backup_item.remote_path, backup_item.local_path, force)
+        self._copy_directory_to_dest(self._get_remote_tree(backup_item), backup_item.local_path, force, backup_item)
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        if self.snapshots and not self.get_snapshots(backup_item):
+            return None
+
+        if loading:
+            return self._get_remote_tree(backup_item), backup_item.local_path
+        return backup_item.local_path, self._get_remote_tree(backup_item, latest=True)
+
+    def get_snapshots(self, backup_item):
+        if not self.snapshots:
+            return None
+
+        try:
+            return sort_snapshot_names(os.listdir(backup_item.remote_path))
+        except FileNotFoundError:
+            return []
+
+    def get_run_summary(self):
+        if not self.copy_strategies:
+            return None
+
+        summary = 'Copied {} files using {}'.format(
+            sum(self.copy_strategies.values()),
+            ', '.join('{} ({})'.format(k, v) for k, v in self.copy_strategies.most_common())
+        )
+        if self.delta_bytes_total:
+            summary += ', writing {:.1f} of {:.1f} MB of the files updated by delta'.format(
+                self.delta_bytes_written / MIB, self.delta_bytes_total / MIB
+            )
+        return summary
+
+    def close(self):
+        # Wait for replaced trees to finish being deleted.
+        with self._disposal_lock:
+            if self._disposal_executor is not None:
+                self._disposal_executor.shutdown()
+                self._disposal_executor = None
+
+    def _copy_file(self, src, dst):
+        if self._is_delta_candidate(src, dst):
+            written = delta_copy_file(src, dst, self.delta_block_size, self._throttle)
+            with self._copy_strategies_lock:
+                self.copy_strategies[CopyStrategy.DELTA] += 1
+                self.delta_bytes_written += written
+                self.delta_bytes_total += os.path.getsize(dst)
+            return
+
+        strategy = copy_file_with_metadata(src, dst, self._throttle)
+        with self._copy_strategies_lock:
+            self.copy_strategies[strategy] += 1
+
+    def _is_delta_candidate(self, src, dst):
+        # Only files being updated in place have blocks worth keeping; new
+        #   files, and the files of staged trees, are written from scratch.
+        if not (self.delta and self.incremental):
+            return False
+
+        try:
+            return os.path.getsize(src) >= self.delta_min_size and os.path.isfile(dst)
+        except OSError:
+            return False
+
+    def _get_copy_function(self, backup_item, src_root):
+        if not self._listeners:
+            return self._copy_file
+
+        def copy_function(src, dst):
+            self._copy_file(src, dst)
+            self._notify_file_copied(backup_item, os.path.relpath(src, src_root), os.path.getsize(dst))
+
+        return copy_function
+
+    def _get_remote_tree(self, backup_item, latest=False):
+        """The directory on the remote that holds the item's files: the
+        snapshot to load, or the latest if latest is True, when saving
+        snapshots.
+        """
+        if not self.snapshots:
+            return backup_item.remote_path
+
+        if not os.path.exists(backup_item.remote_path):
+            raise OSError(2, 'No such file or directory', backup_item.remote_path)
+
+        snapshot = select_snapshot(self.get_snapshots(backup_item), None if latest else backup_item.snapshot)
+        return os.path.join(backup_item.remote_path, snapshot)
+
+    def _save_snapshot(self, backup_item):
+        """Save the item as a new snapshot, hard linking the files that are
+        unchanged since the previous one, then remove any snapshots that the
+        retention policy doesn't keep.
+        """
+        src = backup_item.local_path
+        if not os.path.exists(src):
+            raise OSError(2, 'No such file or directory', src)
+
+        snapshots = self.get_snapshots(backup_item)
+        snapshot = new_snapshot_name(snapshots)
+        dst = os.path.join(backup_item.remote_path, snapshot)
+
+        copy_function = self._get_copy_function(backup_item, src)
+        if snapshots:
+            previous = os.path.join(backup_item.remote_path, snapshots[-1])
+            copy_function = self._link_unchanged_files(copy_function, src, previous)
+        copy_function = self._preserve_hard_links(copy_function)
+
+        os.makedirs(backup_item.remote_path, exist_ok=True)
+        self._remove_abandoned_snapshots(backup_item.remote_path)
+
+        staging = self._get_staging_path(dst)
+        self._copy_tree(src, staging, copy_function)
+        os.rename(staging, dst)
 
-    def _copy_directory_to_dest(self, src, dst, force):
+        if self.retention is not None:
+            for expired in self.retention.select_expired(snapshots + [snapshot]):
+                shutil.rmtree(os.path.join(backup_item.remote_path, expired))
+
+    @staticmethod
+    def _remove_abandoned_snapshots(remote_path):
+        # Snapshots are only ever left staged when saving them was interrupted.
+        for name in os.listdir(remote_path):
+            if name.startswith('.') and name.endswith('.partial') and is_snapshot_name(name[1:-len('.partial')]):
+                shutil.rmtree(os.path.join(remote_path, name))
+
+    @staticmethod
+    def _link_unchanged_files(copy_function, src_root, previous_root):
+        """Wrap copy_function so that files whose size and modification time
+        match their copy in previous_root are hard linked to that copy.
+        """
+        def link_or_copy(src, dst):
+            previous = os.path.join(previous_root, os.path.relpath(src, src_root))
+            try:
+                src_stat = os.stat(src)
+                previous_stat = os.stat(previous)
+                if src_stat.st_size == previous_stat.st_size and src_stat.st_mtime_ns == previous_stat.st_mtime_ns:
+                    os.link(previous, dst)
+                    return
+            except OSError:
+                # Not in the previous snapshot, or on a filesystem without
+                #   hard links.
+                pass
+            copy_function(src, dst)
+
+        return link_or_copy
+
+    @staticmethod
+    def _preserve_hard_links(copy_function):
+        """Wrap copy_function so that files that are hard links to each other
+        in the source are hard linked to each other in the copy too, rather
+        than being copied once for each of their names, like rsync's -H.
+        """
+        # Where the first of each group of links was copied to.
+        copies = {}
+
+        def link_or_copy(src, dst):
+            src_stat = os.stat(src)
+            if src_stat.st_nlink < 2:
+                copy_function(src, dst)
+                return
+
+            key = (src_stat.st_dev, src_stat.st_ino)
+            if key in copies:
+                try:
+                    if os.path.lexists(dst):
+                        # An incremental copy updating an older copy.
+                        os.unlink(dst)
+                    os.link(copies[key], dst)
+                    return
+                except OSError:
+                    # On a filesystem without hard links.
+                    pass
+
+            copy_function(src, dst)
+            copies.setdefault(key, dst)
+
+        return link_or_copy
+
+    @staticmethod
+    def _copy_tree(src, dst, copy_function):
+        """Copy the tree at src to dst like shutil.copytree, except that dst,
+        and any directory within it, may already exist, as they do when an
+        interrupted copy is resumed.
+        """
+        directories = []
+        for dirpath, dirnames, filenames in walk(src):
+            target = os.path.normpath(os.path.join(dst, os.path.relpath(dirpath, src)))
+            os.makedirs(target, exist_ok=True)
+            directories.append((dirpath, target))
+
+            for filename in filenames:
+                copy_function(os.path.join(dirpath, filename), os.path.join(target, filename))
+
+        # Directories' times are copied last, since creating anything within
+        #   them changes them.
+        for dirpath, target in reversed(directories):
+            shutil.copystat(dirpath, target)
+
+    @staticmethod
+    def _get_staging_path(dst):
+        """Where a copy to dst is written, until it's complete."""
+        dst = os.path.normpath(dst)
+        return os.path.join(os.path.dirname(dst), '.{}.partial'.format(os.path.basename(dst)))
+
+    def _copy_directory_to_dest(self, src, dst, force, backup_item=None, completed_files=None):
         """Copy a file using native Python APIs
 
         Positional arguments:
             src -- source file path
             dst -- destination file path
             force -- Overwrite existing files if present.
+
+        Keyword arguments:
+            backup_item -- The item being copied, which listeners are told
+                about (default None)
+            completed_files -- When resuming an interrupted copy, the sizes of
+                the files it finished, by their paths relative to src. Those
+                files are kept, rather than copied again (default None)
         """
         if not os.path.exists(src):
             raise OSError(2, 'No such file or directory', src)
 
-        if force and os.path.exists(dst):
-            send2trash(dst)
+        copy_function = self._get_copy_function(backup_item, src)
 
-        dst_dirname = os.path.dirname(dst)
+        if self.incremental:
+            # Files that were already copied are identical to their sources,
+            #   so an incremental copy picks up where it left off by itself.
+            self._sync_directory_to_dest(src, dst, force, self._preserve_hard_links(copy_function))
+            return
 
-        try:
-            os.makedirs(dst_dirname)
-        except OSError as e:
-            if e.errno == errno.EEXIST and os.path.isdir(dst_dirname):
-                pass
-            else:
-                raise  # pragma: no cover
+        if os.path.exists(dst) and not force:
+            raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        # The tree is copied to a staging directory, and only moved into place
+        #   once it's complete, so an interrupted copy can never be mistaken
+        #   for a complete one. A forced copy replaces the destination the
+        #   same way, and files that haven't changed are linked from the tree
+        #   being replaced, rather than written again.
+        staging = self._get_staging_path(dst)
+        if completed_files:
+            copy_function = self._skip_completed_files(copy_function, src, completed_files)
+        elif os.path.exists(staging):
+            shutil.rmtree(staging)
+
+        replacing = force and os.path.exists(dst)
+        if replacing:
+            copy_function = self._link_unchanged_files(copy_function, src, dst)
+        copy_function = self._preserve_hard_links(copy_function)
+
+        os.makedirs(os.path.dirname(staging), exist_ok=True)
+        self._copy_tree(src, staging, copy_function)
+
+        if replacing:
+            self._replace_directory(staging, dst)
+            return
 
         try:
-            shutil.copytree(src, dst)
+            os.rename(staging, dst)
         except OSError as e:
-            if e.errno == errno.EEXIST:
+            # Something else has written to dst since it was checked.
+            if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
                 raise DestinationAlreadyExistsError('Destination already contains colliding files')
             raise  # pragma: no cover
+
+    def _replace_directory(self, staging, dst):
+        """Move the tree at staging to dst, in place of the tree already there,
+        which is then deleted in the background.
+
+        Where the filesystem can swap the two atomically, dst is never
+        missing; otherwise it's only missing between two renames.
+        """
+        dst = os.path.normpath(dst)
+        retired = os.path.join(
+            os.path.dirname(dst), '.{}.{}.old'.format(os.path.basename(dst), uuid.uuid4().hex)
+        )
+
+        if exchange_paths(staging, dst):
+            os.rename(staging, retired)
+        else:
+            os.rename(dst, retired)
+            os.rename(staging, dst)
+
+        with self._disposal_lock:
+            if self._disposal_executor is None:
+                self._disposal_executor = ThreadPoolExecutor(max_workers=1)
+            self._disposal_executor.submit(shutil.rmtree, retired, ignore_errors=True)
+
+    @staticmethod
+    def _skip_completed_files(copy_function, src_root, completed_files):
+        def skipping_copy_function(src, dst):
+            size = completed_files.get(os.path.relpath(src, src_root))
+            try:
+                if size is not None and os.path.getsize(dst) == size:
+                    return
+            except OSError:
+                pass
+            copy_function(src, dst)
+
+        return skipping_copy_function
+
+    def _sync_directory_to_dest(self, src, dst, force, copy_function):
+        """Bring dst up to date with src, copying only the files that are new
+        or have changed.
+
+        Files that already exist at the destination and are identical to the
+        source aren't considered collisions. Without force, any file that
+        would have to be overwritten fails the whole copy before anything is
+        written.
+        """
+        tree_sync = TreeSync(src, dst, copy_function=copy_function, delete=self.delete)
+        plan = tree_sync.scan()
+
+        if (plan.changed_files or plan.replaced) and not force:
+            raise DestinationAlreadyExistsError('Destination already contains colliding files')
+
+        tree_sync.apply(plan)
@@ -1,7 +1,25 @@
+import asyncio
+import atexit
+import errno
 import os
+import shlex
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
 
-from .copy_manager import ICopyManager, DestinationAlreadyExistsError
+from ..snapshots import RetentionPolicy, is_snapshot_name, new_snapshot_name, select_snapshot, sort_snapshot_names
+from .copy_manager import ICopyManager, IAsyncCopyManager, DestinationAlreadyExistsError
+
+# Starts the line rsync prints for each file it transfers, when listeners need
+#   to be told about them, so that it can't be mistaken for other output.
+TRANSFER_LINE_PREFIX = b'>bkfile '
+
+# rsync exits with this status when source files vanished before they could be
+#   transferred, which only means they were deleted while the copy was running.
+RSYNC_VANISHED_FILES = 24
 
 
 class RsyncCopyManager(ICopyManager):
@@ -13,39 +31,590 @@ class RsyncCopyManager(ICopyManager):
       i.e. if using ssh, the ssh config has been set up for unsupervised
         connecting
       i.e. if using pure rsync, the appropriate credentials have been provided
+
+    Keyword arguments:
+        batch -- When saving several items, transfer all of the items that
+            share a remote path with a single rsync process, rather than one
+            process (and connection) per item (default False)
+        ssh_multiplex -- Open one ssh connection to each remote host, and
+            share it between every rsync process until the copy manager is
+            closed, rather than connecting and authenticating for every item
+            (default False)
+        ssh_command -- The ssh executable that rsync connects with (default
+            `ssh`)
+        snapshots -- Save each copy of an item as a new, timestamped snapshot
+            within its remote directory, rather than replacing the last copy.
+            Files that haven't changed since the previous snapshot are hard
+            linked to it with --link-dest, rather than transferred again.
+            Snapshots need a local remote, or one reached over ssh (default
+            False)
+        retention -- When saving snapshots, the keyword arguments of the
+            backup.core.snapshots.RetentionPolicy deciding which snapshots are
+            kept after each save (default None, keeping all of them)
     """
+    def __init__(self, batch=False, ssh_multiplex=False, ssh_command='ssh', snapshots=False, retention=None):
+        self.batch = batch
+        self.ssh_multiplex = ssh_multiplex
+        self.ssh_command = ssh_command
+        self.snapshots = snapshots
+        self.retention = RetentionPolicy.from_option(retention)
+
+        self._control_dir = None
+        self._control_hosts = set()
+        self._control_lock = threading.Lock()
+
     def save_item(self, backup_item, force=False):
-        self._rsync(backup_item.local_path, backup_item.remote_path, force)
+        if self.snapshots:
+            self._save_snapshot(backup_item)
+            return
+
+        self._rsync(backup_item.local_path, backup_item.remote_path, force, backup_item)
+
+    def save_items(self, backup_items, force=False):
+        if not self.batch or self.snapshots:
+            return super(RsyncCopyManager, self).save_items(backup_items, force)
+
+        errors = [None] * len(backup_items)
+        batches = OrderedDict()
+        singles = []
+        for i, backup_item in enumerate(backup_items):
+            if self._can_batch(backup_item):
+                batches.setdefault(backup_item.remote_path, []).append(i)
+            else:
+                singles.append(i)
+
+        for remote_path, indexes in batches.items():
+            # Every item is copied into the remote path under its own name,
+            #   so items that share a name can't be told apart.
+            names = [self._batch_name(backup_items[i]) for i in indexes]
+            if len(indexes) == 1 or len(set(names)) != len(names):
+                singles.extend(indexes)
+                continue
+
+            collisions, error = self._rsync_batch([backup_items[i] for i in indexes], names, remote_path, force)
+            for i, name in zip(indexes, names):
+                if name in collisions:
+                    errors[i] = DestinationAlreadyExistsError('Destination already contains colliding files')
+                else:
+                    errors[i] = error
+
+        for i in sorted(singles):
+            errors[i] = super(RsyncCopyManager, self).save_items([backup_items[i]], force)[0]
+
+        return errors
+
+    def resume_item(self, backup_item, completed_files, force=False):
+        # Unchanged files are linked rather than transferred into a new
+        #   snapshot, so there's little to be gained from finishing an
+        #   interrupted one.
+        if self.snapshots:
+            self._save_snapshot(backup_item)
+            return
+
+        # rsync already skips the files that were completed, so resuming only
+        #   keeps them from being taken for collisions. A file that was cut
+        #   off part way through was discarded by rsync, and is sent again in
+        #   full.
+        self._rsync(backup_item.local_path, backup_item.remote_path, force, backup_item, completed_files)
 
     def load_item(self, backup_item, force=False):
-        self._rsync(backup_item.remote_path, backup_item.local_path, force)
+        if self.snapshots:
+            src = self._get_snapshot_path(backup_item, backup_item.snapshot)
+            self._rsync(src + '/', backup_item.local_path, force, backup_item)
+            return
+
+        self._rsync(backup_item.remote_path, backup_item.local_path, force, backup_item)
+
+    def get_snapshots(self, backup_item):
+        if not self.snapshots:
+            return None
+        return sort_snapshot_names(self._list_directory(self._get_snapshot_root(backup_item)))
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        if self.snapshots:
+            root = self._get_snapshot_root(backup_item)
+            if not self._is_local(root) or not self.get_snapshots(backup_item):
+                return None
+
+            snapshot = self._get_snapshot_path(backup_item, backup_item.snapshot if loading else None)
+            return (snapshot, backup_item.local_path) if loading else (backup_item.local_path, snapshot)
+
+        src, dst = backup_item.local_path, backup_item.remote_path
+        if loading:
+            src, dst = dst, src
+
+        if not self._is_local(src) or not self._is_local(dst):
+            return None
+
+        # Without a trailing slash, rsync copies the source directory itself
+        #   into the destination, rather than just its contents.
+        return src, os.path.join(dst, os.path.basename(src))
+
+    def get_async_copy_manager(self):
+        return AsyncRsyncCopyManager(self)
+
+    def _get_snapshot_root(self, backup_item):
+        # Like any other copy, the item is kept in a directory named after its
+        #   local directory, which holds a directory for each snapshot.
+        return os.path.join(backup_item.remote_path, self._batch_name(backup_item))
 
-    def _rsync(self, src, dst, force):
-        if not os.path.exists(src):
+    def _get_snapshot_path(self, backup_item, snapshot=None):
+        """The path of the named snapshot of the item, or of the latest if
+        snapshot is None.
+        """
+        root = self._get_snapshot_root(backup_item)
+        return os.path.join(root, select_snapshot(self.get_snapshots(backup_item), snapshot))
+
+    def _save_snapshot(self, backup_item):
+        """Save the item as a new snapshot, linking files that are unchanged
+        since the previous one, then remove any snapshots that the retention
+        policy doesn't keep.
+
+        The snapshot is transferred to a hidden directory, and only renamed
+        once it's complete, so an interrupted transfer is never mistaken for
+        a snapshot. If the transfer fails, the hidden directory is removed,
+        and no snapshots are expired.
+        """
+        if not os.path.exists(backup_item.local_path):
+            raise OSError(2, 'No such file or directory', backup_item.local_path)
+
+        root = self._get_snapshot_root(backup_item)
+        names = self._list_directory(root)
+        snapshots = sort_snapshot_names(names)
+        snapshot = new_snapshot_name(snapshots)
+        staging = os.path.join(root, '.{}.partial'.format(snapshot))
+
+        self._make_directories(root)
+        # Relative to the destination, which is the staged snapshot.
+        link_dest = os.path.join('..', snapshots[-1]) if snapshots else None
+        try:
+            self._rsync(os.path.join(backup_item.local_path, ''), staging, True, backup_item, link_dest=link_dest)
+        except OSError:
+            # If even that fails, the staged snapshot is removed by the next
+            #   save instead.
+            try:
+                self._remove_trees([staging])
+            except (OSError, subprocess.CalledProcessError):
+                pass
+            raise
+        self._rename(staging, os.path.join(root, snapshot))
+
+        # Snapshots are only ever left staged when saving them was interrupted.
+        expired = [name for name in names if self._is_staged_snapshot(name)]
+        if self.retention is not None:
+            expired += self.retention.select_expired(snapshots + [snapshot])
+        if expired:
+            self._remove_trees([os.path.join(root, name) for name in expired])
+
+    def _list_directory(self, path):
+        """Return the names within the directory at the rsync path, which
+        are none if it doesn't exist.
+        """
+        if self._is_local(path):
+            try:
+                return os.listdir(path)
+            except FileNotFoundError:
+                return []
+
+        host_path = shlex.quote(self._get_host_path(path))
+        output = self._run_on_host(path, 'test -d {0} && ls -A1 -- {0} || true'.format(host_path))
+        return os.fsdecode(output).splitlines()
+
+    def _make_directories(self, path):
+        if self._is_local(path):
+            os.makedirs(path, exist_ok=True)
+        else:
+            self._run_on_host(path, 'mkdir -p -- {}'.format(shlex.quote(self._get_host_path(path))))
+
+    def _rename(self, src, dst):
+        if self._is_local(src):
+            os.rename(src, dst)
+        else:
+            self._run_on_host(src, 'mv -- {} {}'.format(
+                shlex.quote(self._get_host_path(src)), shlex.quote(self._get_host_path(dst))
+            ))
+
+    def _remove_trees(self, paths):
+        if self._is_local(paths[0]):
+            for path in paths:
+                shutil.rmtree(path)
+        else:
+            self._run_on_host(paths[0], 'rm -rf -- {}'.format(
+                ' '.join(shlex.quote(self._get_host_path(path)) for path in paths)
+            ))
+
+    def _run_on_host(self, path, command):
+        """Run a shell command over ssh on the host of the rsync path, and
+        return its output.
+        """
+        host = self._remote_host(path)
+        if host is None:
+            raise OSError(errno.EINVAL, 'Snapshots need a local remote, or one reached over ssh', path)
+
+        return subprocess.check_output(self._ssh_args(host) + [host, command])
+
+    @staticmethod
+    def _get_host_path(path):
+        """The path on its host of an rsync path that goes over ssh."""
+        return path.partition(':')[2]
+
+    @staticmethod
+    def _is_staged_snapshot(name):
+        return name.startswith('.') and name.endswith('.partial') and is_snapshot_name(name[1:-len('.partial')])
+
+    def _rsync(self, src, dst, force, backup_item=None, completed_files=(), link_dest=None):
+        # rsync reports a remote source that doesn't exist itself.
+        if self._is_local(src) and not os.path.exists(src):
             raise OSError(2, 'No such file or directory', src)
 
-        if not force:
-            rsync = subprocess.Popen(
-                ['rsync', '-ahuHs', '--dry-run', '--ignore-existing', '-vvv', src, dst],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            so, se = rsync.communicate()
-
-            # The block of output from the above function that tells whether or
-            #   not files already exist on the remote is during the
-            #   `recv_generator` phase. Grab all output around this block of
-            #   lines and check it any of the files we're planning on sending
-            #   already exist.
-            adding = False
-            for line in so.splitlines():
-                if line.startswith(b'recv_generator'):
-                    adding = True
+        items_by_name = self._items_by_name(src, backup_item)
+
+        if force:
+            args = self._rsync_args(src, dst, force, link_dest)
+            if not self._listeners:
+                rsync = subprocess.Popen(args)
+                rsync.wait()
+                self._check_exit_status(rsync.returncode)
+                return
+
+            rsync = subprocess.Popen(args, stdout=subprocess.PIPE)
+            try:
+                for line in rsync.stdout:
+                    if not self._report_transfer(line.rstrip(b'\r\n'), items_by_name):
+                        sys.stdout.write(os.fsdecode(line))
+            finally:
+                rsync.stdout.close()
+                rsync.wait()
+            self._check_exit_status(rsync.returncode)
+            return
+
+        # Rather than doing a dry run to look for collisions before the real
+        #   transfer, which has rsync build the remote file list twice, do a
+        #   single transfer that never replaces anything on the destination.
+        #   At the second level of verbosity, rsync reports each file it
+        #   skipped as `<name> exists`, so a collision is any such line.
+        #   Output is consumed as it's produced, since it's a line per file,
+        #   and the transfer is stopped at the first collision, so a failure
+        #   surfaces quickly. Files that don't collide and were transferred
+        #   before that point are left in place, and listed so that they
+        #   can be told apart from what was already there. Files that an
+        #   interrupted transfer of the item completed aren't collisions
+        #   either; rsync only ever moves complete files into place.
+        rsync = subprocess.Popen(self._rsync_args(src, dst, force), stdout=subprocess.PIPE)
+        written = []
+        try:
+            for line in rsync.stdout:
+                line = line.rstrip(b'\r\n')
+                if self._report_transfer(line, items_by_name):
+                    written.append(line)
                     continue
-                if line.startswith(b'generate_files'):
-                    break
-                if line.endswith(b'exists') and adding:
+                if self._is_collision(line, items_by_name, completed_files):
+                    rsync.terminate()
+                    self._print_written_files(written)
                     raise DestinationAlreadyExistsError('Destination already contains colliding files')
+        finally:
+            rsync.stdout.close()
+            rsync.wait()
+        self._check_exit_status(rsync.returncode)
+
+    def _rsync_batch(self, backup_items, names, dst, force):
+        """Copy each of the items into dst using a single rsync process, by
+        giving rsync the list of items to copy with --files-from. Each item is
+        copied into dst under the corresponding name in names.
+
+        Unlike a single item, a collision in one item can't stop the whole
+        transfer, so output is read to the end. Returns the names of all the
+        items that had collisions, and the OSError rsync failed with, if it
+        did. rsync doesn't say which items a failure belongs to, so it
+        applies to all of the items that didn't have collisions.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.files', delete=False) as f:
+            for backup_item in backup_items:
+                # Paths in the list are relative to the source, which is the
+                #   root of the filesystem.
+                f.write(os.path.abspath(backup_item.local_path).lstrip('/') + '\n')
+
+        # --files-from turns off recursion and turns on --relative, so restore
+        #   the usual behaviour of copying each item into dst by its name.
+        args = self._rsync_command('/', dst) + ['-ahuHs', '-r', '--no-R', '--no-g', '--no-o', '--files-from', f.name]
+        if not force:
+            args += ['--ignore-existing', '-vv']
+        args += self._transfer_args()
+
+        items_by_name = dict(zip(names, backup_items))
+        read_output = not force or self._listeners
+        collisions = set()
+        try:
+            rsync = subprocess.Popen(args + ['/', dst], stdout=subprocess.PIPE if read_output else None)
+            if read_output:
+                for line in rsync.stdout:
+                    line = line.rstrip(b'\r\n')
+                    if self._report_transfer(line, items_by_name):
+                        continue
+                    if not force and self._is_collision(line):
+                        collisions.add(os.fsdecode(line.split(b'/', 1)[0]))
+                rsync.stdout.close()
+            rsync.wait()
+        finally:
+            os.unlink(f.name)
+
+        try:
+            self._check_exit_status(rsync.returncode)
+        except OSError as e:
+            return collisions, e
+        return collisions, None
+
+    def _rsync_args(self, src, dst, force, link_dest=None):
+        """The full rsync command line that copies a single item from src to
+        dst. Without force, nothing on the destination is replaced, and each
+        file skipped because it exists, or transferred, is reported. Files
+        identical to those in link_dest are hard linked to them, rather than
+        transferred.
+        """
+        args = self._rsync_command(src, dst) + ['-ahuHs', '--no-g', '--no-o']
+        if not force:
+            args += ['--ignore-existing', '-vv']
+        if link_dest is not None:
+            args.append('--link-dest={}'.format(link_dest))
+        return args + self._transfer_args(report=not force) + [src, dst]
+
+    @staticmethod
+    def _items_by_name(src, backup_item):
+        # Names rsync reports start with the source directory's own name,
+        #   unless only its contents are being copied.
+        return {None if src.endswith(('/', os.sep)) else os.path.basename(src): backup_item}
+
+    def _transfer_args(self, report=False):
+        """The rsync arguments that have each transferred file reported, if
+        there are listeners to tell, or report is True.
+        """
+        if not self._listeners and not report:
+            return []
+        # --no-h has sizes printed as plain digits, exactly, rather than
+        #   rounded to units or split up by a separator that depends on the
+        #   locale.
+        return ['--no-h', '--out-format={}%l %n'.format(os.fsdecode(TRANSFER_LINE_PREFIX))]
+
+    def _report_transfer(self, line, items_by_name):
+        """If line is rsync reporting a transferred file, tell listeners about
+        it, and return True.
+
+        Positional arguments:
+            line -- A line of rsync's output
+            items_by_name -- The items being copied, by the directory name
+                that starts the names of their files, or None for an item
+                whose contents are copied without its directory
+        """
+        if not line.startswith(TRANSFER_LINE_PREFIX):
+            return False
+
+        size, _, name = os.fsdecode(line[len(TRANSFER_LINE_PREFIX):]).partition(' ')
+        # Directories are reported too, but only files are of interest.
+        if name.endswith('/'):
+            return True
+
+        if None in items_by_name:
+            backup_item, path = items_by_name[None], name
+        else:
+            item_name, _, path = name.partition('/')
+            backup_item = items_by_name.get(item_name)
+            path = path or item_name
+
+        self._notify_file_copied(backup_item, path, int(size))
+        return True
+
+    def close(self):
+        with self._control_lock:
+            if self._control_dir is None:
+                return
+
+            for host in self._control_hosts:
+                try:
+                    subprocess.call(
+                        [self.ssh_command, '-o', 'ControlPath={}'.format(self._control_path()), '-O', 'exit', host],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+                except OSError:  # pragma: no cover
+                    # Without ssh, there can't be a master connection left
+                    #   behind either.
+                    pass
+
+            shutil.rmtree(self._control_dir, ignore_errors=True)
+            self._control_dir = None
+            self._control_hosts = set()
+
+    def _rsync_command(self, src, dst):
+        """The start of an rsync command line that copies from src to dst,
+        routing any ssh connection through the shared master connection when
+        multiplexing, and keeping to the throttle if there is one.
+        """
+        command = ['rsync']
+        host = self._remote_host(src) or self._remote_host(dst)
+        if self.ssh_multiplex and host:
+            command += ['-e', ' '.join(shlex.quote(a) for a in self._ssh_args(host))]
+
+        if self._throttle is None:
+            return command
+
+        rate = self._throttle.get_transfer_rate()
+        if rate is not None:
+            # --bwlimit is in units of 1024 bytes per second.
+            command.append('--bwlimit={}'.format(max(int(rate // 1024), 1)))
+        return self._throttle.get_command_prefix() + command
+
+    def _ssh_args(self, host):
+        """The start of an ssh command line that connects to host, through
+        the shared master connection when multiplexing.
+        """
+        if not self.ssh_multiplex:
+            return [self.ssh_command]
+
+        with self._control_lock:
+            if self._control_dir is None:
+                # Socket paths are limited to around 100 characters, so keep
+                #   them in a short-named directory of their own.
+                self._control_dir = tempfile.mkdtemp(prefix='bkssh-')
+                atexit.register(self.close)
+            self._control_hosts.add(host)
+
+        return [
+            self.ssh_command,
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(self._control_path()),
+            '-o', 'ControlPersist=yes'
+        ]
+
+    def _control_path(self):
+        # %C is a hash of the connection's host, port and user, so each remote
+        #   gets its own master connection.
+        return os.path.join(self._control_dir, '%C')
+
+    @staticmethod
+    def _remote_host(path):
+        """Return the [user@]host part of an rsync path that goes over ssh, or
+        None for local paths and rsync daemon paths.
+        """
+        host, sep, rest = path.partition(':')
+        if not sep or not host or '/' in host or rest.startswith(':'):
+            return None
+        return host
+
+    @staticmethod
+    def _is_local(path):
+        host, sep, rest = path.partition(':')
+        return not sep or '/' in host
+
+    @staticmethod
+    def _can_batch(backup_item):
+        # Trailing slashes change what rsync copies, and missing sources have
+        #   to be reported individually.
+        return not backup_item.local_path.endswith(('/', os.sep)) and os.path.exists(backup_item.local_path)
+
+    @staticmethod
+    def _batch_name(backup_item):
+        return os.path.basename(os.path.abspath(backup_item.local_path))
+
+    @staticmethod
+    def _print_written_files(lines):
+        """Print the files that rsync reported transferring in lines, which
+        a save stopped by a collision leaves on the destination.
+        """
+        names = [os.fsdecode(line[len(TRANSFER_LINE_PREFIX):]).partition(' ')[2] for line in lines]
+        names = [name for name in names if not name.endswith('/')]
+        if names:
+            print('\n'.join(['Written before the collision was found:'] + names), file=sys.stderr)
+
+    @staticmethod
+    def _check_exit_status(returncode):
+        """Raise OSError if rsync exited with returncode because it failed."""
+        if returncode not in (0, RSYNC_VANISHED_FILES):
+            raise OSError('rsync failed with exit status {}'.format(returncode))
+
+    @staticmethod
+    def _is_collision(line, items_by_name=None, completed_files=()):
+        """Return whether line is rsync reporting a file it skipped because
+        it exists, other than one of the completed_files of the item in
+        items_by_name.
+        """
+        if not line.endswith(b' exists'):
+            return False
+        if not completed_files:
+            return True
+
+        name = os.fsdecode(line[:-len(b' exists')])
+        if None not in items_by_name:
+            name = name.partition('/')[2]
+        return name not in completed_files
+
+
+class AsyncRsyncCopyManager(IAsyncCopyManager):
+    """
+    Runs the same transfers as an RsyncCopyManager as asyncio subprocesses,
+    so that many transfers, and the parsing of their output, share a single
+    thread.
+
+    Positional arguments:
+        copy_manager -- The RsyncCopyManager whose options, listeners, and ssh
+            connections are used
+    """
+    def __init__(self, copy_manager):
+        self.copy_manager = copy_manager
+
+    async def save_item(self, backup_item, force=False):
+        if self.copy_manager.snapshots:
+            await self._run_in_executor(self.copy_manager.save_item, backup_item, force)
+            return
+
+        await self._rsync(backup_item.local_path, backup_item.remote_path, force, backup_item)
+
+    async def resume_item(self, backup_item, completed_files, force=False):
+        if self.copy_manager.snapshots:
+            await self._run_in_executor(self.copy_manager.save_item, backup_item, force)
+            return
+
+        await self._rsync(backup_item.local_path, backup_item.remote_path, force, backup_item, completed_files)
+
+    async def load_item(self, backup_item, force=False):
+        if self.copy_manager.snapshots:
+            await self._run_in_executor(self.copy_manager.load_item, backup_item, force)
+            return
+
+        await self._rsync(backup_item.remote_path, backup_item.local_path, force, backup_item)
+
+    @staticmethod
+    async def _run_in_executor(copy, backup_item, force):
+        # Snapshots take several steps, some over ssh, so they're taken on the
+        #   event loop's default executor instead.
+        await asyncio.get_running_loop().run_in_executor(None, copy, backup_item, force)
+
+    async def _rsync(self, src, dst, force, backup_item, completed_files=()):
+        """Copy src to dst as RsyncCopyManager._rsync does."""
+        if self.copy_manager._is_local(src) and not os.path.exists(src):
+            raise OSError(2, 'No such file or directory', src)
+
+        manager = self.copy_manager
+        items_by_name = manager._items_by_name(src, backup_item)
+        read_output = not force or manager._listeners
 
-        rsync = subprocess.Popen(['rsync', '-ahuHs', '--no-g', '--no-o', src, dst])
-        rsync.wait()
+        rsync = await asyncio.create_subprocess_exec(
+            *manager._rsync_args(src, dst, force),
+            stdout=asyncio.subprocess.PIPE if read_output else None
+        )
+        written = []
+        try:
+            if read_output:
+                async for line in rsync.stdout:
+                    line = line.rstrip(b'\r\n')
+                    if manager._report_transfer(line, items_by_name):
+                        written.append(line)
+                        continue
+                    if force:
+                        sys.stdout.write(os.fsdecode(line) + '\n')
+                    elif manager._is_collision(line, items_by_name, completed_files):
+                        rsync.terminate()
+                        manager._print_written_files(written)
+                        raise DestinationAlreadyExistsError('Destination already contains colliding files')
+        finally:
+            await rsync.wait()
+        manager._check_exit_status(rsync.returncode)
@@ -0,0 +1,156 @@
+import os
+import shutil
+
+
+def walk(top):
+    """Walk the tree at top like os.walk, following symbolic links, except
+    for links to directories that have already been walked, so that a link
+    back to a parent directory doesn't walk it forever.
+    """
+    top_stat = os.stat(top)
+    visited = {(top_stat.st_dev, top_stat.st_ino)}
+
+    for dirpath, dirnames, filenames in os.walk(top, followlinks=True):
+        walked = []
+        for dirname in dirnames:
+            try:
+                dir_stat = os.stat(os.path.join(dirpath, dirname))
+            except OSError:  # pragma: no cover (Removed while walking)
+                continue
+
+            key = (dir_stat.st_dev, dir_stat.st_ino)
+            if key not in visited:
+                visited.add(key)
+                walked.append(dirname)
+
+        dirnames[:] = walked
+        yield dirpath, dirnames, filenames
+
+
+class SyncPlan(object):
+    """The set of changes needed to bring a destination tree up to date with
+    its source. All paths are relative to the roots of the trees.
+    """
+    def __init__(self):
+        self.directories = []
+        self.new_files = []
+        self.changed_files = []
+        self.unchanged_files = []
+        self.extraneous = []
+        # Paths that are a file in one tree and a directory in the other, so
+        #   have to be removed from the destination before they're copied.
+        self.replaced = []
+
+    @property
+    def has_changes(self):
+        return bool(self.directories or self.new_files or self.changed_files or self.extraneous or self.replaced)
+
+
+class TreeSync(object):
+    """
+    Compares a source and destination tree by file size and modification time,
+    so that only new or changed files have to be copied.
+
+    Modification times are compared to the second, since that's all that many
+    of the filesystems saves end up on (SMB shares, FAT drives) preserve.
+    """
+    def __init__(self, src, dst, copy_function=shutil.copy2, delete=False):
+        self.src = src
+        self.dst = dst
+        self.copy_function = copy_function
+        self.delete = delete
+
+    def scan(self):
+        """Walk both trees and return the SyncPlan needed to update the
+        destination. Nothing is modified.
+        """
+        plan = SyncPlan()
+        seen = set()
+
+        for dirpath, dirnames, filenames in walk(self.src):
+            rel_dir = os.path.relpath(dirpath, self.src)
+            if rel_dir == os.curdir:
+                rel_dir = ''
+
+            for dirname in dirnames:
+                rel_path = os.path.join(rel_dir, dirname)
+                seen.add(rel_path)
+
+                dst_path = os.path.join(self.dst, rel_path)
+                if not os.path.isdir(dst_path):
+                    if os.path.lexists(dst_path):
+                        plan.replaced.append(rel_path)
+                    plan.directories.append(rel_path)
+
+            for filename in filenames:
+                rel_path = os.path.join(rel_dir, filename)
+                seen.add(rel_path)
+
+                dst_path = os.path.join(self.dst, rel_path)
+                try:
+                    dst_stat = os.stat(dst_path)
+                except (FileNotFoundError, NotADirectoryError):
+                    if os.path.lexists(dst_path):
+                        # A broken link, which is as good as a file.
+                        plan.replaced.append(rel_path)
+                    plan.new_files.append(rel_path)
+                    continue
+
+                if os.path.isdir(dst_path):
+                    plan.replaced.append(rel_path)
+                    plan.new_files.append(rel_path)
+                    continue
+
+                src_stat = os.stat(os.path.join(dirpath, filename))
+                if self._is_unchanged(src_stat, dst_stat):
+                    plan.unchanged_files.append(rel_path)
+                else:
+                    plan.changed_files.append(rel_path)
+
+        if self.delete and os.path.isdir(self.dst):
+            kept = seen.difference(plan.replaced)
+            for dirpath, dirnames, filenames in os.walk(self.dst):
+                rel_dir = os.path.relpath(dirpath, self.dst)
+                if rel_dir == os.curdir:
+                    rel_dir = ''
+
+                for name in dirnames + filenames:
+                    rel_path = os.path.join(rel_dir, name)
+                    if rel_path not in seen:
+                        plan.extraneous.append(rel_path)
+
+                # Anything beneath an extraneous or replaced directory goes
+                #   along with it.
+                dirnames[:] = [d for d in dirnames if os.path.join(rel_dir, d) in kept]
+
+        return plan
+
+    def apply(self, plan):
+        """Copy new and changed files, and remove extraneous ones if deletion
+        was requested.
+        """
+        if not os.path.isdir(self.dst):
+            os.makedirs(self.dst)
+
+        for rel_path in plan.replaced:
+            self._remove(os.path.join(self.dst, rel_path))
+
+        for rel_path in plan.directories:
+            os.makedirs(os.path.join(self.dst, rel_path), exist_ok=True)
+
+        for rel_path in plan.new_files + plan.changed_files:
+            self.copy_function(os.path.join(self.src, rel_path), os.path.join(self.dst, rel_path))
+
+        for rel_path in plan.extraneous:
+            self._remove(os.path.join(self.dst, rel_path))
+
+    @staticmethod
+    def _remove(path):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+
+    @staticmethod
+    def _is_unchanged(src_stat, dst_stat):
+        return src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime)
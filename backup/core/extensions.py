@@ -5,8 +5,12 @@ import platform
 import sys
 from inspect import getmembers
 
+from .cache import read_json_cache, write_json_cache
+
 
 EXTENSIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ext')
+EXTENSIONS_CACHE_FILENAME = 'extensions.json'
+EXTENSIONS_CACHE_VERSION = 1
 
 
 class PlatformNotFoundError(Exception):
@@ -28,6 +32,16 @@ class _SysPathTemp(object):
             sys.path.remove(self.path)
 
 
+class ExtensionMetadata(object):
+    """What the command line needs to know about an extension before deciding
+    whether to load it.
+    """
+    def __init__(self, name, help, module_dirname):
+        self.name = name
+        self.help = help
+        self.module_dirname = module_dirname
+
+
 class BackupExtension(object):
     class Platform(object):
         DARWIN = 'osx'
@@ -45,27 +59,77 @@ class BackupExtension(object):
         """
         extensions = []
         for maybe_dir in os.listdir(EXTENSIONS_DIR):
-            module_path = os.path.join(EXTENSIONS_DIR, maybe_dir)
-            if os.path.isdir(module_path):
-                try:
-                    module_init = os.path.join(module_path, '__init__.py')
-                    if not os.path.exists(module_init):
-                        continue
-
-                    with _SysPathTemp(module_path):
-                        mod_name = 'ext.{}'.format(maybe_dir)
-                        spec = importlib.util.spec_from_file_location(mod_name, module_init)
-                        module = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(module)
-                        for member_name, member in getmembers(module, lambda o: type(o) == type):
-                            if member_name == 'Extension':
-                                extensions.append(member)
-                except ImportError as e:  # pragma: no cover
-                    print(e)
-                    pass
+            if os.path.exists(os.path.join(EXTENSIONS_DIR, maybe_dir, '__init__.py')):
+                extension = cls.load_extension(maybe_dir)
+                if extension is not None:
+                    extensions.append(extension)
 
         return extensions
 
+    @classmethod
+    def get_extensions_metadata(cls):
+        """Return the ExtensionMetadata of every extension, without importing
+        any of them when possible.
+
+        Metadata is cached on disk, and an extension is only imported again
+        once its `__init__.py` has been modified.
+        """
+        cache = read_json_cache(EXTENSIONS_CACHE_FILENAME)
+        cached = {}
+        if cache and cache.get('version') == EXTENSIONS_CACHE_VERSION and cache.get('extensions_dir') == EXTENSIONS_DIR:
+            cached = cache['extensions']
+
+        entries = {}
+        for maybe_dir in sorted(os.listdir(EXTENSIONS_DIR)):
+            try:
+                mtime_ns = os.stat(os.path.join(EXTENSIONS_DIR, maybe_dir, '__init__.py')).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = cached.get(maybe_dir)
+            if entry is None or entry['mtime_ns'] != mtime_ns:
+                extension = cls.load_extension(maybe_dir)
+                if extension is None:  # pragma: no cover
+                    continue
+                entry = {
+                    'mtime_ns': mtime_ns,
+                    'name': extension.get_extension_name(),
+                    'help': extension.get_extension_help()
+                }
+
+            entries[maybe_dir] = entry
+
+        if entries != cached:
+            write_json_cache(EXTENSIONS_CACHE_FILENAME, {
+                'version': EXTENSIONS_CACHE_VERSION,
+                'extensions_dir': EXTENSIONS_DIR,
+                'extensions': entries
+            })
+
+        return [ExtensionMetadata(e['name'], e['help'], d) for d, e in sorted(entries.items())]
+
+    @classmethod
+    def load_extension(cls, module_dirname):
+        """Import the extension in the given directory of the extensions
+        directory, and return its Extension class, or None if it doesn't have
+        one.
+        """
+        module_path = os.path.join(EXTENSIONS_DIR, module_dirname)
+        module_init = os.path.join(module_path, '__init__.py')
+        try:
+            with _SysPathTemp(module_path):
+                mod_name = 'ext.{}'.format(module_dirname)
+                spec = importlib.util.spec_from_file_location(mod_name, module_init)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                for member_name, member in getmembers(module, lambda o: type(o) == type):
+                    if member_name == 'Extension':
+                        return member
+        except ImportError as e:  # pragma: no cover
+            print(e)
+
+        return None
+
     @classmethod
     def get_system_platform(cls):
         """Any extension that's implementing a task may have to do so on
@@ -91,5 +155,12 @@ class BackupExtension(object):
     def get_extension_name(cls):
         raise NotImplementedError
 
+    @classmethod
+    def get_extension_help(cls):
+        """A short description of the extension, shown in the command line's
+        help.
+        """
+        return None
+
     def run(self, args):
         raise NotImplementedError
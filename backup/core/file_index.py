@@ -0,0 +1,316 @@
+import asyncio
+import os
+import sqlite3
+import stat
+import threading
+
+from .copy_managers.copy_manager import ICopyManager, IAsyncCopyManager
+
+
+class FileState(object):
+    def __init__(self, size, mtime_ns, inode, hash=None):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.hash = hash
+
+    @classmethod
+    def from_stat(cls, stat):
+        return cls(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def __eq__(self, other):
+        if not isinstance(other, FileState):
+            return False
+
+        return (self.size, self.mtime_ns, self.inode) == (other.size, other.mtime_ns, other.inode)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def scan_tree(root):
+    """Stat every file beneath root, returning a dict mapping each file's path
+    relative to root to its FileState. A root that's a file rather than a
+    directory is mapped from the empty path.
+
+    Symbolic links are followed, except for broken links, whose own state is
+    recorded, and links to directories that have already been scanned, which
+    would otherwise be scanned forever if they link back to their parent.
+    """
+    root_stat = os.stat(root)
+    if not stat.S_ISDIR(root_stat.st_mode):
+        return {'': FileState.from_stat(root_stat)}
+
+    states = {}
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name)
+                try:
+                    entry_stat = entry.stat()
+                except OSError:
+                    # Either a broken link, or the file was removed since the
+                    #   directory was listed.
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    key = (entry_stat.st_dev, entry_stat.st_ino)
+                    if key not in visited:
+                        visited.add(key)
+                        pending.append(rel_path)
+                else:
+                    states[rel_path] = FileState.from_stat(entry_stat)
+
+    return states
+
+
+class FileStateIndex(object):
+    """
+    Records the state of every file in an item as of its last successful save,
+    so that a later save can tell whether anything changed using nothing more
+    than a walk of the local tree.
+
+    Positional arguments:
+        path -- Location of the SQLite database; created if it doesn't exist
+    """
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS items ('
+        '  local_path TEXT PRIMARY KEY,'
+        '  remote_path TEXT NOT NULL'
+        ')',
+        'CREATE TABLE IF NOT EXISTS files ('
+        '  local_path TEXT NOT NULL,'
+        '  path TEXT NOT NULL,'
+        '  size INTEGER NOT NULL,'
+        '  mtime_ns INTEGER NOT NULL,'
+        '  inode INTEGER NOT NULL,'
+        '  hash TEXT,'
+        '  PRIMARY KEY (local_path, path)'
+        ')'
+    )
+
+    def __init__(self, path):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        # Items may be saved from several threads at once.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            for statement in self._SCHEMA:
+                self._db.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_states(self, backup_item):
+        """Return the recorded FileStates of the item's files, or None if the
+        item hasn't been saved to its current remote.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT remote_path FROM items WHERE local_path = ?', (backup_item.local_path,)
+            ).fetchone()
+            if row is None or row[0] != backup_item.remote_path:
+                return None
+
+            rows = self._db.execute(
+                'SELECT path, size, mtime_ns, inode, hash FROM files WHERE local_path = ?',
+                (backup_item.local_path,)
+            ).fetchall()
+
+        return {path: FileState(size, mtime_ns, inode, hash) for path, size, mtime_ns, inode, hash in rows}
+
+    def record(self, backup_item, states):
+        """Replace the recorded state of the item's files. Hashes already
+        recorded for files whose state hasn't changed are kept.
+        """
+        previous = self.get_states(backup_item) or {}
+        rows = []
+        for path, state in states.items():
+            if state.hash is None and previous.get(path) == state:
+                state.hash = previous[path].hash
+            rows.append((backup_item.local_path, path, state.size, state.mtime_ns, state.inode, state.hash))
+
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM files WHERE local_path = ?', (backup_item.local_path,))
+            self._db.execute(
+                'INSERT OR REPLACE INTO items (local_path, remote_path) VALUES (?, ?)',
+                (backup_item.local_path, backup_item.remote_path)
+            )
+            self._db.executemany(
+                'INSERT INTO files (local_path, path, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+
+    def record_hashes(self, backup_item, states):
+        """Remember the hashes of the given files' contents, for files whose
+        recorded state is still the one given.
+
+        Positional arguments:
+            backup_item -- The item the files belong to
+            states -- A dict mapping each file's path to its FileState, with
+                its hash set
+        """
+        rows = [
+            (state.hash, backup_item.local_path, path, state.size, state.mtime_ns, state.inode)
+            for path, state in states.items()
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                'UPDATE files SET hash = ? '
+                'WHERE local_path = ? AND path = ? AND size = ? AND mtime_ns = ? AND inode = ?', rows
+            )
+
+    def forget(self, backup_item):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM files WHERE local_path = ?', (backup_item.local_path,))
+            self._db.execute('DELETE FROM items WHERE local_path = ?', (backup_item.local_path,))
+
+
+class IndexedCopyManager(ICopyManager):
+    """
+    Wraps another copy manager, skipping saves of items that haven't changed
+    since they were last saved successfully. This is answered entirely from
+    the local tree and the index, so the remote isn't touched at all.
+
+    Positional arguments:
+        copy_manager -- The ICopyManager that performs the actual copies
+        index -- The FileStateIndex used to remember previous saves
+    """
+    def __init__(self, copy_manager, index):
+        self.copy_manager = copy_manager
+        self.index = index
+
+    def add_listener(self, listener):
+        super(IndexedCopyManager, self).add_listener(listener)
+        self.copy_manager.add_listener(listener)
+
+    def remove_listener(self, listener):
+        super(IndexedCopyManager, self).remove_listener(listener)
+        self.copy_manager.remove_listener(listener)
+
+    def set_throttle(self, throttle):
+        super(IndexedCopyManager, self).set_throttle(throttle)
+        self.copy_manager.set_throttle(throttle)
+
+    def save_item(self, backup_item, force=False):
+        states = self._changed_states(backup_item, force)
+        if states is None:
+            return
+
+        self.copy_manager.save_item(backup_item, force)
+        self.index.record(backup_item, states)
+
+    def resume_item(self, backup_item, completed_files, force=False):
+        states = self._changed_states(backup_item, force)
+        if states is None:
+            return
+
+        self.copy_manager.resume_item(backup_item, completed_files, force)
+        self.index.record(backup_item, states)
+
+    def save_items(self, backup_items, force=False):
+        errors = [None] * len(backup_items)
+        changed = []
+        for i, backup_item in enumerate(backup_items):
+            try:
+                states = self._changed_states(backup_item, force)
+            except OSError as e:
+                errors[i] = e
+                continue
+
+            if states is not None:
+                changed.append((i, states))
+
+        # Hand everything that did change over together, so the wrapped copy
+        #   manager can still batch them.
+        results = self.copy_manager.save_items([backup_items[i] for i, _ in changed], force)
+        for (i, states), error in zip(changed, results):
+            errors[i] = error
+            if error is None:
+                self.index.record(backup_items[i], states)
+
+        return errors
+
+    def _changed_states(self, backup_item, force=False):
+        """Return the current states of the item's files, or None if they're
+        the same as when the item was last saved. Forced saves are never
+        skipped, so that they can repair a remote copy that the index wrongly
+        describes.
+        """
+        if not os.path.exists(backup_item.local_path):
+            raise OSError(2, 'No such file or directory', backup_item.local_path)
+
+        # Take the snapshot before copying, so that anything written while the
+        #   copy is running is picked up by the next save.
+        states = scan_tree(backup_item.local_path)
+        if not force and states == self.index.get_states(backup_item):
+            return None
+
+        return states
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        return self.copy_manager.get_transfer_paths(backup_item, loading)
+
+    def get_snapshots(self, backup_item):
+        return self.copy_manager.get_snapshots(backup_item)
+
+    def get_async_copy_manager(self):
+        return AsyncIndexedCopyManager(self, self.copy_manager.get_async_copy_manager())
+
+    def get_run_summary(self):
+        return self.copy_manager.get_run_summary()
+
+    def close(self):
+        self.copy_manager.close()
+        self.index.close()
+
+    def load_item(self, backup_item, force=False):
+        # Loading rewrites the local tree, so whatever was recorded for it no
+        #   longer describes what's there.
+        self.index.forget(backup_item)
+        self.copy_manager.load_item(backup_item, force)
+
+
+class AsyncIndexedCopyManager(IAsyncCopyManager):
+    """
+    The asyncio counterpart of IndexedCopyManager. Local trees are scanned on
+    the event loop's default executor, so scans don't block other copies.
+
+    Positional arguments:
+        indexed_copy_manager -- The IndexedCopyManager whose index is used
+        copy_manager -- The IAsyncCopyManager that performs the actual copies
+    """
+    def __init__(self, indexed_copy_manager, copy_manager):
+        self.indexed_copy_manager = indexed_copy_manager
+        self.copy_manager = copy_manager
+
+    async def save_item(self, backup_item, force=False):
+        await self._save(backup_item, force, lambda: self.copy_manager.save_item(backup_item, force))
+
+    async def resume_item(self, backup_item, completed_files, force=False):
+        await self._save(
+            backup_item, force, lambda: self.copy_manager.resume_item(backup_item, completed_files, force)
+        )
+
+    async def _save(self, backup_item, force, copy):
+        states = await asyncio.get_running_loop().run_in_executor(
+            None, self.indexed_copy_manager._changed_states, backup_item, force
+        )
+        if states is None:
+            return
+
+        await copy()
+        self.indexed_copy_manager.index.record(backup_item, states)
+
+    async def load_item(self, backup_item, force=False):
+        self.indexed_copy_manager.index.forget(backup_item)
+        await self.copy_manager.load_item(backup_item, force)
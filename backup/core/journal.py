@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+
+from .copy_managers.copy_manager import ICopyListener, ICopyManager, IAsyncCopyManager
+
+
+class TransferJournal(ICopyListener):
+    """
+    Records the items, and the files within items, that a run has finished
+    copying, so that a run that was interrupted can be continued rather than
+    started over.
+
+    Entries are appended to the journal as a line each, so an interruption
+    can only ever lose the last entry, and losing it only means that one file
+    gets copied again.
+
+    A journal that isn't resumed replaces the one at path, but only once its
+    first entry is written, so a run that fails before copying anything
+    leaves the last run's journal to be resumed.
+
+    Positional arguments:
+        path -- The file the journal is kept in
+
+    Keyword arguments:
+        resume -- Continue the journal already at path, rather than starting a
+            new one (default False)
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._completed_items = set()
+        self._completed_files = {}
+
+        self._resume = resume
+        self._file = None
+        self._closed = False
+
+        if resume:
+            self._load()
+
+    def is_complete(self, backup_item):
+        with self._lock:
+            return self._key(backup_item) in self._completed_items
+
+    def get_completed_files(self, backup_item):
+        """Return the size of each file of the item that has been copied, by
+        its path relative to the item's directory.
+        """
+        with self._lock:
+            return dict(self._completed_files.get(self._key(backup_item), {}))
+
+    def file_copied(self, backup_item, path, size):
+        self._append(backup_item, {'path': path, 'size': size})
+
+    def item_completed(self, backup_item):
+        self._append(backup_item, {'complete': True})
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+
+    def discard(self):
+        """Close the journal, and remove it, once there's nothing left to
+        continue.
+        """
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:  # pragma: no cover
+            pass
+
+    def _append(self, backup_item, entry):
+        entry.update(local=backup_item.local_path, remote=backup_item.remote_path)
+        with self._lock:
+            if self._closed:
+                raise ValueError('Cannot write to a closed TransferJournal')
+            if self._file is None:
+                self._file = self._open()
+            self._apply(entry)
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def _open(self):
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        return open(self.path, 'a' if self._resume else 'w')
+
+    def _apply(self, entry):
+        key = (entry['local'], entry['remote'])
+        if entry.get('complete'):
+            self._completed_items.add(key)
+        else:
+            self._completed_files.setdefault(key, {})[entry['path']] = entry['size']
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        # Most likely the last line, cut short.
+                        continue
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _key(backup_item):
+        return backup_item.local_path, backup_item.remote_path
+
+
+class ResumableCopyManager(ICopyManager):
+    """
+    Wraps another copy manager, recording everything it copies in a
+    TransferJournal. Items the journal has already completed are skipped, and
+    items it has partially copied are resumed.
+
+    The wrapper lasts for a single run: closing it stops the journal from
+    hearing about any later copies made by the copy manager it wraps, and
+    closes the journal, but leaves the wrapped copy manager open.
+
+    Positional arguments:
+        copy_manager -- The ICopyManager that performs the actual copies
+        journal -- The TransferJournal of the run
+    """
+    def __init__(self, copy_manager, journal):
+        self.copy_manager = copy_manager
+        self.journal = journal
+        self.copy_manager.add_listener(journal)
+
+    def add_listener(self, listener):
+        super(ResumableCopyManager, self).add_listener(listener)
+        self.copy_manager.add_listener(listener)
+
+    def remove_listener(self, listener):
+        super(ResumableCopyManager, self).remove_listener(listener)
+        self.copy_manager.remove_listener(listener)
+
+    def set_throttle(self, throttle):
+        super(ResumableCopyManager, self).set_throttle(throttle)
+        self.copy_manager.set_throttle(throttle)
+
+    def save_item(self, backup_item, force=False):
+        if self.journal.is_complete(backup_item):
+            return
+
+        completed = self.journal.get_completed_files(backup_item)
+        if completed:
+            self.copy_manager.resume_item(backup_item, completed, force)
+        else:
+            self.copy_manager.save_item(backup_item, force)
+        self.journal.item_completed(backup_item)
+
+    def save_items(self, backup_items, force=False):
+        errors = [None] * len(backup_items)
+        fresh = []
+        for i, backup_item in enumerate(backup_items):
+            if self.journal.is_complete(backup_item):
+                continue
+            if self.journal.get_completed_files(backup_item):
+                errors[i] = super(ResumableCopyManager, self).save_items([backup_item], force)[0]
+            else:
+                fresh.append(i)
+
+        # Items that weren't started last time are handed over together, so
+        #   the wrapped copy manager can still batch them.
+        results = self.copy_manager.save_items([backup_items[i] for i in fresh], force)
+        for i, error in zip(fresh, results):
+            errors[i] = error
+            if error is None:
+                self.journal.item_completed(backup_items[i])
+
+        return errors
+
+    def load_item(self, backup_item, force=False):
+        self.copy_manager.load_item(backup_item, force)
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        return self.copy_manager.get_transfer_paths(backup_item, loading)
+
+    def get_snapshots(self, backup_item):
+        return self.copy_manager.get_snapshots(backup_item)
+
+    def get_async_copy_manager(self):
+        return AsyncResumableCopyManager(self, self.copy_manager.get_async_copy_manager())
+
+    def get_run_summary(self):
+        return self.copy_manager.get_run_summary()
+
+    def close(self):
+        self.copy_manager.remove_listener(self.journal)
+        self.journal.close()
+
+
+class AsyncResumableCopyManager(IAsyncCopyManager):
+    """
+    The asyncio counterpart of ResumableCopyManager.
+
+    Positional arguments:
+        resumable_copy_manager -- The ResumableCopyManager whose journal is
+            used
+        copy_manager -- The IAsyncCopyManager that performs the actual copies
+    """
+    def __init__(self, resumable_copy_manager, copy_manager):
+        self.journal = resumable_copy_manager.journal
+        self.copy_manager = copy_manager
+
+    async def save_item(self, backup_item, force=False):
+        if self.journal.is_complete(backup_item):
+            return
+
+        completed = self.journal.get_completed_files(backup_item)
+        if completed:
+            await self.copy_manager.resume_item(backup_item, completed, force)
+        else:
+            await self.copy_manager.save_item(backup_item, force)
+        self.journal.item_completed(backup_item)
+
+    async def load_item(self, backup_item, force=False):
+        await self.copy_manager.load_item(backup_item, force)
@@ -0,0 +1,27 @@
+class ICopyListener(object):
+    """
+    Receives events about the copies a copy manager makes, as they happen.
+    Every event is ignored unless overridden.
+
+    Items may be copied from several threads at once, so events can be
+    delivered concurrently.
+    """
+    def item_started(self, backup_item, loading):
+        """An item has started being saved, or loaded if loading is True."""
+        pass
+
+    def file_copied(self, backup_item, path, size):
+        """A file of an item has been copied.
+
+        Positional arguments:
+            backup_item -- The item the file belongs to
+            path -- The file's path, relative to the item's directory
+            size -- The size of the file, in bytes
+        """
+        pass
+
+    def item_finished(self, backup_item, loading, duration, error):
+        """An item has finished being copied, after duration seconds. error is
+        the exception that stopped it from being copied, or None.
+        """
+        pass
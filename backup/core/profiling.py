@@ -0,0 +1,92 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from .listeners import ICopyListener
+
+
+class Span(object):
+    def __init__(self, name, start, duration, depth):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.depth = depth
+
+
+class PhaseProfiler(ICopyListener):
+    """
+    Records how long each phase of a run takes, as spans that may be nested
+    within each other. Added as a listener to a copy manager, it also records
+    a span for every item copied.
+    """
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            self._record(name, start, time.perf_counter() - start, depth)
+
+    def item_finished(self, backup_item, loading, duration, error):
+        name = getattr(backup_item, 'name', None) or backup_item.local_path
+        self._record(
+            '{} {}'.format('load' if loading else 'save', name),
+            time.perf_counter() - duration,
+            duration,
+            getattr(self._local, 'depth', 0)
+        )
+
+    def report(self):
+        """Return a line for every span, in the order they started, indented
+        by how deeply they were nested.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+
+        return ['{:10.1f} ms  {}{}'.format(s.duration * 1000, '  ' * s.depth, s.name) for s in spans]
+
+    def _record(self, name, start, duration, depth):
+        with self._lock:
+            self.spans.append(Span(name, start, duration, depth))
+
+
+# Phases are only recorded once profiling has been enabled for the run.
+_profiler = None
+
+
+def enable():
+    """Start recording phases, and return the PhaseProfiler they're recorded
+    by.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = PhaseProfiler()
+    return _profiler
+
+
+def get_profiler():
+    """Return the PhaseProfiler recording this run, or None if profiling
+    hasn't been enabled.
+    """
+    return _profiler
+
+
+@contextmanager
+def span(name):
+    """Record how long the body of the with statement takes as a phase named
+    name, if profiling is enabled.
+    """
+    if _profiler is None:
+        yield
+        return
+
+    with _profiler.span(name):
+        yield
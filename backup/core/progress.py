@@ -0,0 +1,265 @@
+import os
+import sys
+import threading
+import time
+
+from .copy_managers.copy_manager import ICopyListener, ICopyManager, IAsyncCopyManager
+
+MIB = 1024 * 1024
+
+
+class ObservedCopyManager(ICopyManager):
+    """
+    Wraps another copy manager, telling listeners when each item starts and
+    finishes being copied, and how long it took. Listeners are also added to
+    the wrapped copy manager, so they hear about each file it copies.
+
+    Items that the wrapped copy manager saves together in a single batch all
+    report the duration of the whole batch.
+
+    Positional arguments:
+        copy_manager -- The ICopyManager that performs the actual copies
+    """
+    def __init__(self, copy_manager):
+        self.copy_manager = copy_manager
+
+    def add_listener(self, listener):
+        super(ObservedCopyManager, self).add_listener(listener)
+        self.copy_manager.add_listener(listener)
+
+    def remove_listener(self, listener):
+        super(ObservedCopyManager, self).remove_listener(listener)
+        self.copy_manager.remove_listener(listener)
+
+    def set_throttle(self, throttle):
+        super(ObservedCopyManager, self).set_throttle(throttle)
+        self.copy_manager.set_throttle(throttle)
+
+    def save_item(self, backup_item, force=False):
+        self._observe(backup_item, False, self.copy_manager.save_item, force)
+
+    def save_items(self, backup_items, force=False):
+        for backup_item in backup_items:
+            self._notify_item_started(backup_item, False)
+
+        start = time.monotonic()
+        errors = self.copy_manager.save_items(backup_items, force)
+        duration = time.monotonic() - start
+
+        for backup_item, error in zip(backup_items, errors):
+            self._notify_item_finished(backup_item, False, duration, error)
+
+        return errors
+
+    def load_item(self, backup_item, force=False):
+        self._observe(backup_item, True, self.copy_manager.load_item, force)
+
+    def resume_item(self, backup_item, completed_files, force=False):
+        def resume(backup_item, force):
+            self.copy_manager.resume_item(backup_item, completed_files, force)
+
+        self._observe(backup_item, False, resume, force)
+
+    def get_transfer_paths(self, backup_item, loading=False):
+        return self.copy_manager.get_transfer_paths(backup_item, loading)
+
+    def get_snapshots(self, backup_item):
+        return self.copy_manager.get_snapshots(backup_item)
+
+    def get_async_copy_manager(self):
+        return AsyncObservedCopyManager(self, self.copy_manager.get_async_copy_manager())
+
+    def get_run_summary(self):
+        return self.copy_manager.get_run_summary()
+
+    def close(self):
+        self.copy_manager.close()
+
+    def _observe(self, backup_item, loading, copy, force):
+        self._notify_item_started(backup_item, loading)
+        start = time.monotonic()
+        error = None
+        try:
+            copy(backup_item, force)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._notify_item_finished(backup_item, loading, time.monotonic() - start, error)
+
+    def _notify_item_started(self, backup_item, loading):
+        for listener in self._listeners:
+            listener.item_started(backup_item, loading)
+
+    def _notify_item_finished(self, backup_item, loading, duration, error):
+        for listener in self._listeners:
+            listener.item_finished(backup_item, loading, duration, error)
+
+
+class AsyncObservedCopyManager(IAsyncCopyManager):
+    """
+    The asyncio counterpart of ObservedCopyManager.
+
+    Positional arguments:
+        observed_copy_manager -- The ObservedCopyManager whose listeners are
+            told about each item
+        copy_manager -- The IAsyncCopyManager that performs the actual copies
+    """
+    def __init__(self, observed_copy_manager, copy_manager):
+        self.observed_copy_manager = observed_copy_manager
+        self.copy_manager = copy_manager
+
+    async def save_item(self, backup_item, force=False):
+        await self._observe(backup_item, False, self.copy_manager.save_item, force)
+
+    async def load_item(self, backup_item, force=False):
+        await self._observe(backup_item, True, self.copy_manager.load_item, force)
+
+    async def resume_item(self, backup_item, completed_files, force=False):
+        async def resume(backup_item, force):
+            await self.copy_manager.resume_item(backup_item, completed_files, force)
+
+        await self._observe(backup_item, False, resume, force)
+
+    async def _observe(self, backup_item, loading, copy, force):
+        observed = self.observed_copy_manager
+        observed._notify_item_started(backup_item, loading)
+        start = time.monotonic()
+        error = None
+        try:
+            await copy(backup_item, force)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observed._notify_item_finished(backup_item, loading, time.monotonic() - start, error)
+
+
+class ItemMetrics(object):
+    def __init__(self, backup_item):
+        self.backup_item = backup_item
+        self.files = 0
+        self.bytes = 0
+        self.duration = None
+        self.error = None
+
+    @property
+    def mb_per_second(self):
+        if not self.duration:
+            return None
+        return self.bytes / MIB / self.duration
+
+
+class TransferMetrics(ICopyListener):
+    """Totals up the files and bytes copied for each item."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def get_item_metrics(self):
+        """Return the ItemMetrics of every item, in the order they started."""
+        with self._lock:
+            return list(self._items.values())
+
+    def item_started(self, backup_item, loading):
+        with self._lock:
+            self._items[id(backup_item)] = ItemMetrics(backup_item)
+
+    def file_copied(self, backup_item, path, size):
+        with self._lock:
+            metrics = self._items.get(id(backup_item))
+            if metrics is not None:
+                metrics.files += 1
+                metrics.bytes += size
+
+    def item_finished(self, backup_item, loading, duration, error):
+        with self._lock:
+            metrics = self._items.get(id(backup_item))
+            if metrics is not None:
+                metrics.duration = duration
+                metrics.error = error
+
+
+class ProgressRenderer(ICopyListener):
+    """
+    Keeps a single line on a terminal up to date with how many items have
+    been copied, how much data, and how quickly.
+
+    Keyword arguments:
+        stream -- Where to draw the line (default stderr)
+        total_items -- How many items are going to be copied, if known
+            (default None)
+        describe_item -- A function returning the name to show for an item
+            (default the name of its local directory)
+        interval -- The fewest seconds between redraws (default 0.1)
+    """
+    def __init__(self, stream=None, total_items=None, describe_item=None, interval=0.1):
+        self.stream = stream if stream is not None else sys.stderr
+        self.total_items = total_items
+        self.describe_item = describe_item or (lambda item: os.path.basename(os.path.normpath(item.local_path)))
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_draw = None
+        self._last_width = 0
+        self._finished_drawing = False
+        self._active = []
+        self._finished = 0
+        self._files = 0
+        self._bytes = 0
+
+    def item_started(self, backup_item, loading):
+        with self._lock:
+            self._active.append(backup_item)
+            self._draw(force=True)
+
+    def file_copied(self, backup_item, path, size):
+        with self._lock:
+            self._files += 1
+            self._bytes += size
+            self._draw()
+
+    def item_finished(self, backup_item, loading, duration, error):
+        with self._lock:
+            if backup_item in self._active:
+                self._active.remove(backup_item)
+            self._finished += 1
+            self._draw(force=True)
+
+    def finish(self):
+        """Draw the final state of the line, and move past it. Nothing is
+        drawn afterwards.
+        """
+        with self._lock:
+            if self._finished_drawing:
+                return
+            self._draw(force=True)
+            self._finished_drawing = True
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def _draw(self, force=False):
+        if self._finished_drawing:
+            return
+
+        now = time.monotonic()
+        if not force and self._last_draw is not None and now - self._last_draw < self.interval:
+            return
+        self._last_draw = now
+
+        items = str(self._finished)
+        if self.total_items is not None:
+            items += '/{}'.format(self.total_items)
+
+        elapsed = max(now - self._start, 1e-9)
+        line = '{} done, {} files, {:.1f} MB, {:.1f} MB/s'.format(
+            items, self._files, self._bytes / MIB, self._bytes / MIB / elapsed
+        )
+        if self._active:
+            line += ' - {}'.format(', '.join(self.describe_item(item) for item in self._active))
+
+        # Blank out whatever's left of a longer line drawn before this one.
+        self.stream.write('\r' + line.ljust(self._last_width))
+        self.stream.flush()
+        self._last_width = len(line)
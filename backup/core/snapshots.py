@@ -0,0 +1,115 @@
+import re
+from datetime import datetime, timezone
+
+SNAPSHOT_TIME_FORMAT = '%Y-%m-%dT%H%M%SZ'
+SNAPSHOT_NAME_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{6}Z)(?:-(\d+))?$')
+
+
+class SnapshotNotFoundError(Exception):
+    pass
+
+
+def is_snapshot_name(name):
+    return SNAPSHOT_NAME_PATTERN.match(name) is not None
+
+
+def parse_snapshot_time(name):
+    """Return the UTC datetime that the snapshot named name was taken at."""
+    timestamp = SNAPSHOT_NAME_PATTERN.match(name).group(1)
+    return datetime.strptime(timestamp, SNAPSHOT_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def sort_snapshot_names(names):
+    """Return the snapshot names among names, oldest first."""
+    def key(name):
+        match = SNAPSHOT_NAME_PATTERN.match(name)
+        return match.group(1), int(match.group(2) or 0)
+
+    return sorted((name for name in names if is_snapshot_name(name)), key=key)
+
+
+def new_snapshot_name(existing_names=(), now=None):
+    """Return the name for a snapshot taken now, which sorts after, and
+    differs from, every name in existing_names taken in the same second.
+    """
+    now = now or datetime.now(timezone.utc)
+    base = now.astimezone(timezone.utc).strftime(SNAPSHOT_TIME_FORMAT)
+
+    existing_names = set(existing_names)
+    name = base
+    suffix = 0
+    while name in existing_names:
+        suffix += 1
+        name = '{}-{}'.format(base, suffix)
+
+    return name
+
+
+def select_snapshot(names, snapshot=None):
+    """Return the name of the snapshot to load from names: snapshot itself, or
+    the latest if it's None.
+    """
+    names = sort_snapshot_names(names)
+    if snapshot is None and names:
+        return names[-1]
+    if snapshot in names:
+        return snapshot
+
+    if not names:
+        raise SnapshotNotFoundError('No snapshots have been saved')
+    raise SnapshotNotFoundError(
+        'No snapshot named {}. Try one of the following:\n{}'.format(
+            snapshot, '\n'.join('  {}'.format(n) for n in reversed(names))
+        )
+    )
+
+
+class RetentionPolicy(object):
+    """
+    Decides which snapshots to keep, like rsnapshot and borg's prune: the
+    newest snapshot in each of the most recent hours, days, and weeks that
+    have one, along with the very latest snapshots.
+
+    Keyword arguments:
+        last -- How many of the latest snapshots to keep. The latest is always
+            kept, since the next snapshot is linked against it (default 1)
+        hourly -- How many hours to keep a snapshot from (default 0)
+        daily -- How many days to keep a snapshot from (default 0)
+        weekly -- How many weeks to keep a snapshot from (default 0)
+    """
+    def __init__(self, last=1, hourly=0, daily=0, weekly=0):
+        self.last = max(last, 1)
+        self.hourly = hourly
+        self.daily = daily
+        self.weekly = weekly
+
+    @classmethod
+    def from_option(cls, option):
+        """Create the policy described by a copy manager's retention option,
+        a mapping of the keyword arguments, or return None if it's None.
+        """
+        if option is None:
+            return None
+        return cls(**option)
+
+    def select_expired(self, names):
+        """Return the snapshot names among names that shouldn't be kept."""
+        newest_first = list(reversed(sort_snapshot_names(names)))
+        keep = set(newest_first[:self.last])
+
+        periods = (
+            (self.hourly, lambda t: (t.date(), t.hour)),
+            (self.daily, lambda t: t.date()),
+            (self.weekly, lambda t: t.isocalendar()[:2])
+        )
+        for count, get_period in periods:
+            periods_seen = set()
+            for name in newest_first:
+                if len(periods_seen) >= count:
+                    break
+                period = get_period(parse_snapshot_time(name))
+                if period not in periods_seen:
+                    periods_seen.add(period)
+                    keep.add(name)
+
+        return [name for name in reversed(newest_first) if name not in keep]
@@ -0,0 +1,178 @@
+import re
+import shutil
+import threading
+import time
+
+RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$', re.IGNORECASE)
+RATE_MULTIPLIERS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+# The scheduling classes of ionice's -c.
+IONICE_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+
+
+class InvalidThrottleError(Exception):
+    pass
+
+
+def parse_rate(value):
+    """Return the bytes per second described by value, either a number of
+    bytes, or a string like `512K` or `10MB/s` with a binary multiplier.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        rate = value
+    else:
+        match = RATE_PATTERN.match(str(value))
+        if match is None:
+            raise InvalidThrottleError('Invalid bandwidth: {}'.format(value))
+        rate = float(match.group(1)) * RATE_MULTIPLIERS[match.group(2).lower()]
+
+    if rate <= 0:
+        raise InvalidThrottleError('Bandwidth must be greater than 0: {}'.format(value))
+    return rate
+
+
+class TokenBucket(object):
+    """
+    Limits the bytes passed through it, by any number of threads together, to
+    rate per second on average, while still letting through bursts of up to
+    burst bytes at once.
+
+    A thread that takes more than is available goes into debt, and waits for
+    it to be repaid, so the threads that come after it wait their turn too.
+
+    Positional arguments:
+        rate -- The bytes per second let through on average
+
+    Keyword arguments:
+        burst -- The most bytes let through at once (default a second's worth)
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def consume(self, count):
+        """Take count bytes from the bucket, waiting until they're available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= count
+            wait = -self._tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Throttle(object):
+    """
+    Keeps copies from saturating the disk and network, so that a backup can
+    run alongside a game without it stuttering. A single throttle is shared
+    by every copy a run makes.
+
+    Copies made in-process draw from a shared TokenBucket. Tools run as child
+    processes, like rsync, limit each transfer themselves, so the bandwidth
+    is divided between the transfers running at once, and the tools are run
+    at a lower CPU and I/O priority with nice and ionice where available.
+
+    Keyword arguments:
+        bandwidth -- The most bytes per second to copy, as accepted by
+            parse_rate (default None, unlimited)
+        nice -- The niceness to run child processes with (default None)
+        ionice -- The I/O scheduling class to run child processes with, one
+            of idle, best-effort, or realtime (default None)
+        max_transfers -- The most transfers to run at once (default None,
+            unlimited)
+    """
+    def __init__(self, bandwidth=None, nice=None, ionice=None, max_transfers=None):
+        if ionice is not None and ionice not in IONICE_CLASSES:
+            raise InvalidThrottleError('Invalid ionice class: {}. Use one of: {}'.format(
+                ionice, ', '.join(sorted(IONICE_CLASSES))
+            ))
+        if max_transfers is not None and max_transfers < 1:
+            raise InvalidThrottleError('max_transfers must be at least 1')
+
+        self.bandwidth = parse_rate(bandwidth) if bandwidth is not None else None
+        self.nice = nice
+        self.ionice = ionice
+        self.max_transfers = max_transfers
+
+        self.bucket = TokenBucket(self.bandwidth) if self.bandwidth is not None else None
+        self._concurrency = 1
+
+    @classmethod
+    def from_option(cls, option):
+        """Create the throttle described by the config's throttle option, a
+        mapping of the keyword arguments, or return None if it's None.
+        """
+        if option is None:
+            return None
+        if not isinstance(option, dict):
+            raise InvalidThrottleError('throttle must be a mapping of options')
+
+        try:
+            return cls(**option)
+        except TypeError as e:
+            raise InvalidThrottleError('Invalid throttle: {}'.format(e)) from e
+
+    def limit_concurrency(self, jobs):
+        """Return how many of jobs transfers can run at once, and divide the
+        bandwidth between that many transfers from now on.
+        """
+        if self.max_transfers is not None:
+            jobs = min(jobs, self.max_transfers)
+        self._concurrency = max(jobs, 1)
+        return jobs
+
+    def consume(self, count):
+        """Wait until count more bytes can be copied."""
+        if self.bucket is not None:
+            self.bucket.consume(count)
+
+    def get_transfer_rate(self):
+        """Return the bytes per second each transfer can copy, or None if
+        bandwidth isn't limited.
+        """
+        if self.bandwidth is None:
+            return None
+        return self.bandwidth / self._concurrency
+
+    def get_command_prefix(self):
+        """Return the arguments to run a child process's command line with,
+        so that it's run at the configured priority.
+        """
+        prefix = []
+        if self.nice is not None and shutil.which('nice'):
+            prefix += ['nice', '-n', str(self.nice)]
+        if self.ionice is not None and shutil.which('ionice'):
+            prefix += ['ionice', '-c', str(IONICE_CLASSES[self.ionice])]
+        return prefix
+
+
+class ThrottledFile(object):
+    """
+    Wraps a file object so that everything read from or written to it is
+    drawn from a Throttle.
+
+    Positional arguments:
+        fileobj -- The file object to wrap
+        throttle -- The Throttle to draw from
+    """
+    def __init__(self, fileobj, throttle):
+        self._fileobj = fileobj
+        self._throttle = throttle
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._throttle.consume(len(data))
+        return data
+
+    def write(self, data):
+        self._throttle.consume(len(data))
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
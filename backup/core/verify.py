@@ -0,0 +1,120 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .file_index import scan_tree
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the hex BLAKE2b digest of the file at path.
+
+    hashlib releases the GIL while hashing large blocks, so files hashed from
+    several threads at once are hashed in parallel.
+    """
+    digest = hashlib.blake2b()
+    buf = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buf)
+            if not read:
+                break
+            digest.update(view[:read])
+
+    return digest.hexdigest()
+
+
+class VerificationResult(object):
+    """The outcome of comparing a copy of an item to its source.
+
+    Positional arguments:
+        backup_item -- The item that was copied
+        files -- The number of files in the source
+
+    Keyword arguments:
+        missing -- Paths of source files that aren't in the copy
+        mismatched -- Paths of files whose contents differ in the copy
+    """
+    def __init__(self, backup_item, files, missing=(), mismatched=()):
+        self.backup_item = backup_item
+        self.files = files
+        self.missing = list(missing)
+        self.mismatched = list(mismatched)
+
+    @property
+    def succeeded(self):
+        return not self.missing and not self.mismatched
+
+
+class TreeVerifier(object):
+    """
+    Confirms that copies made by a copy manager match their sources, by
+    hashing the files on both sides.
+
+    Keyword arguments:
+        index -- A backup.core.file_index.FileStateIndex. Hashes of local files
+            that haven't changed since they were last hashed are taken from
+            it, rather than reading the files again (default None)
+        jobs -- The number of files to hash concurrently (default one more
+            than the number of CPUs, since hashing also waits on disks)
+    """
+    def __init__(self, index=None, jobs=None):
+        self.index = index
+        self._executor = ThreadPoolExecutor(max_workers=jobs or (os.cpu_count() or 1) + 1)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def verify(self, copy_manager, backup_item, loading=False):
+        """Compare the copy that copy_manager made of backup_item to its
+        source.
+
+        Files in the copy that aren't in the source are ignored, since some
+        copy managers deliberately leave them in place.
+
+        Returns a VerificationResult, or None if copy_manager doesn't store
+        its copies in a way that can be compared.
+        """
+        paths = copy_manager.get_transfer_paths(backup_item, loading)
+        if paths is None:
+            return None
+
+        src, dst = paths
+        src_states = scan_tree(src)
+        try:
+            dst_states = scan_tree(dst)
+        except FileNotFoundError:
+            dst_states = {}
+
+        missing = sorted(p for p in src_states if p not in dst_states)
+        mismatched = sorted(p for p in src_states if p in dst_states and src_states[p].size != dst_states[p].size)
+        compared = [p for p in src_states if p in dst_states and src_states[p].size == dst_states[p].size]
+
+        # Only the local side of the copy is in the index.
+        local_root, local_states = (dst, dst_states) if loading else (src, src_states)
+        known_states = (self.index.get_states(backup_item) if self.index is not None else None) or {}
+
+        futures = {}
+        for path in compared:
+            for root, states in ((src, src_states), (dst, dst_states)):
+                known = known_states.get(path) if states is local_states else None
+                if known is not None and known.hash is not None and known == states[path]:
+                    states[path].hash = known.hash
+                else:
+                    # A file's own state is mapped from the empty path.
+                    file_path = os.path.join(root, path) if path else root
+                    futures[(root, path)] = self._executor.submit(hash_file, file_path)
+
+        for (root, path), future in futures.items():
+            (src_states if root == src else dst_states)[path].hash = future.result()
+
+        mismatched = sorted(mismatched + [p for p in compared if src_states[p].hash != dst_states[p].hash])
+
+        if self.index is not None:
+            self.index.record_hashes(
+                backup_item, {p: local_states[p] for p in compared if (local_root, p) in futures}
+            )
+
+        return VerificationResult(backup_item, len(src_states), missing, mismatched)
@@ -0,0 +1,309 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from .file_index import scan_tree
+
+# From sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+    IN_DELETE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+class WatcherUnavailableError(Exception):
+    pass
+
+
+def _load_inotify():
+    if not hasattr(os, 'O_NONBLOCK'):  # pragma: no cover (Windows)
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):  # pragma: no cover (Depends on the platform)
+        return None
+
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+_libc = _load_inotify()
+
+
+class InotifyWatcher(object):
+    """
+    Watches directory trees for changes with Linux's inotify, so nothing is
+    read from disk until something actually changes.
+
+    Every directory within a tree needs a watch of its own, so directories
+    created later on are watched as they appear. A tree that doesn't exist,
+    or stops existing, is waited for by watching the nearest directory above
+    it that does, which is also how a tree that's a single file is watched.
+    """
+    def __init__(self):
+        if _libc is None:
+            raise WatcherUnavailableError('inotify is not available on this platform')
+
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise WatcherUnavailableError('Cannot use inotify: {}'.format(os.strerror(e)))
+
+        # The key and directory of each watch descriptor.
+        self._watches = {}
+        # The trees waited for by each watch on a directory above them.
+        self._waiting = {}
+        self._roots = set()
+
+    def add(self, key, path):
+        """Watch the tree at path, reporting changes to it as key."""
+        path = os.path.abspath(path)
+        self._roots.add((key, path))
+        if not os.path.isdir(path):
+            self._wait_for(key, path)
+            return
+
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            if not self._add_watch(key, directory):
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    pending.extend(e.path for e in it if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def wait(self, timeout=None):
+        """Wait up to timeout seconds for something to change, returning the
+        keys of the trees that changed, which is empty if nothing did.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            changed.update(self._handle_events(data))
+
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watch(self, key, directory):
+        wd = self._inotify_add_watch(directory)
+        if wd is None:
+            return False
+
+        self._watches[wd] = (key, directory)
+        return True
+
+    def _wait_for(self, key, path):
+        """Watch the nearest existing directory above path, so that path is
+        watched once it's created.
+        """
+        parent = os.path.dirname(path)
+        while parent != os.path.dirname(parent) and not os.path.isdir(parent):
+            parent = os.path.dirname(parent)
+
+        wd = self._inotify_add_watch(parent)
+        if wd is not None:
+            self._waiting.setdefault(wd, []).append((key, path))
+
+    def _inotify_add_watch(self, directory):
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return None
+            raise OSError(e, os.strerror(e), directory)
+        return wd
+
+    def _handle_waiting(self, wd, mask, name):
+        """Return the keys of the trees waited for by wd that changed, and
+        start watching any of them that are now directories.
+        """
+        waiting = self._waiting[wd]
+        # A tree that's a single file is only ever watched from above.
+        changed = {key for key, path in waiting if os.path.basename(path) == name}
+
+        if mask & IN_IGNORED or (mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)):
+            # Each is watched again from scratch: either the tree itself now
+            #   exists, or a directory nearer to it does.
+            del self._waiting[wd]
+            for key, path in waiting:
+                self.add(key, path)
+                if os.path.isdir(path):
+                    changed.add(key)
+
+        return changed
+
+    def _handle_events(self, data):
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so anything could have changed.
+                changed.update(key for key, _ in self._watches.values())
+                continue
+
+            if wd in self._waiting:
+                changed.update(self._handle_waiting(wd, mask, os.fsdecode(name)))
+
+            if wd not in self._watches:
+                continue
+            key, directory = self._watches[wd]
+            if mask & IN_IGNORED:
+                del self._watches[wd]
+                # The whole tree was removed, so wait for it to come back.
+                if (key, directory) in self._roots:
+                    self._wait_for(key, directory)
+                    changed.add(key)
+                continue
+
+            changed.add(key)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add(key, os.path.join(directory, os.fsdecode(name)))
+
+        return changed
+
+
+class PollingWatcher(object):
+    """
+    Watches directory trees for changes by comparing the state of every file
+    in them every interval seconds. Works anywhere, at the cost of a walk of
+    every tree each interval.
+
+    Keyword arguments:
+        interval -- Seconds between walks of the trees (default 2)
+    """
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._trees = {}
+        self._states = {}
+        self._next_poll = time.monotonic() + interval
+
+    def add(self, key, path):
+        self._trees.setdefault(key, []).append(path)
+        self._states[(key, path)] = self._scan(path)
+
+    def wait(self, timeout=None):
+        now = time.monotonic()
+        if timeout is not None and now + timeout < self._next_poll:
+            time.sleep(timeout)
+            return set()
+
+        time.sleep(max(0, self._next_poll - now))
+        self._next_poll = time.monotonic() + self.interval
+
+        changed = set()
+        for key, paths in self._trees.items():
+            for path in paths:
+                states = self._scan(path)
+                if states != self._states[(key, path)]:
+                    self._states[(key, path)] = states
+                    changed.add(key)
+
+        return changed
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _scan(path):
+        try:
+            return scan_tree(path)
+        except OSError:
+            return None
+
+
+def create_watcher(poll=False, poll_interval=2.0):
+    """Return an InotifyWatcher where inotify is available, and a
+    PollingWatcher otherwise, or if poll is True.
+    """
+    if not poll:
+        try:
+            return InotifyWatcher()
+        except WatcherUnavailableError:
+            pass
+
+    return PollingWatcher(poll_interval)
+
+
+class Debouncer(object):
+    """
+    Holds back keys that keep changing until they've settled, so that a burst
+    of writes, like a game autosaving, is handled once it's over rather than
+    as each write happens.
+
+    Positional arguments:
+        quiet_period -- Seconds a key has to go without changing to be ready
+
+    Keyword arguments:
+        max_delay -- The most seconds a key that never stops changing is held
+            back for (default ten times quiet_period)
+    """
+    def __init__(self, quiet_period, max_delay=None):
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay if max_delay is not None else quiet_period * 10
+
+        # The time each pending key first changed, and last changed.
+        self._pending = {}
+
+    def changed(self, keys, now):
+        for key in keys:
+            first, _ = self._pending.get(key, (now, now))
+            self._pending[key] = (first, now)
+
+    def next_deadline(self):
+        """Return the earliest time a pending key could become ready, or None
+        if there are no pending keys.
+        """
+        if not self._pending:
+            return None
+        return min(self._deadline(first, last) for first, last in self._pending.values())
+
+    def pop_ready(self, now):
+        """Return the keys that are ready, which are no longer pending."""
+        ready = [key for key, (first, last) in self._pending.items() if now >= self._deadline(first, last)]
+        for key in ready:
+            del self._pending[key]
+        return ready
+
+    def _deadline(self, first, last):
+        return min(last + self.quiet_period, first + self.max_delay)
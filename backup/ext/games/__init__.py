@@ -1,26 +1,14 @@
-import os
+import json
 import sys
 
-import yaml
-from core.copy_managers import DestinationAlreadyExistsError, CopyManagerFactory, UnknownCopyManagerError
-from core.extensions import BackupExtension, PlatformNotFoundError
-
-from .games_manager import GamesManager, GameNotFoundError
-
-DEFAULT_CONFIG_YAML_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
-
-
-class InvalidConfigError(Exception):
-    pass
-
-
-class NoGamesDefinedError(Exception):
-    pass
+from core import profiling
+from core.extensions import BackupExtension
 
 
 class GameSavesCliOptions(object):
     SAVE = 'save'
     LOAD = 'load'
+    WATCH = 'watch'
 
 
 class Extension(BackupExtension):
@@ -37,19 +25,63 @@ class Extension(BackupExtension):
                                           help='save the selected game to the remote backup location')
         slp = saves_subparsers.add_parser(GameSavesCliOptions.LOAD,
                                           help='load the selected game to this machine')
+        swp = saves_subparsers.add_parser(GameSavesCliOptions.WATCH,
+                                          help='save games to the remote backup location whenever they change')
 
         ssp.add_argument('--all', '-a', action='store_true', help='Copy all local games to the remote')
         ssp.add_argument('--game', '-g', help='select the game, or an alias to run the command against')
         ssp.add_argument('--force', '-f', action='store_true', help='replace existing destination files if present')
+        ssp.add_argument('--jobs', '-j', type=int, default=1,
+                         help='number of games to save concurrently when using --all (default 1)')
+        ssp.add_argument('--resume', action='store_true',
+                         help='continue an interrupted --all, skipping the games and files it finished')
+        ssp.add_argument('--verify', action='store_true', help='check that saved files match the local files')
+        self._add_reporting_arguments(ssp)
 
         slp.add_argument('--game', '-g', help='select the game, or an alias to run the command against')
         slp.add_argument('--force', '-f', action='store_true', help='replace existing destination files if present')
+        slp.add_argument('--verify', action='store_true', help='check that loaded files match the remote files')
+        slp.add_argument('--snapshot', metavar='NAME',
+                         help='load the named snapshot, rather than the latest, when the remote keeps snapshots')
+        slp.add_argument('--list-snapshots', action='store_true',
+                         help='list the snapshots kept of the game, newest first, instead of loading it')
+        self._add_reporting_arguments(slp)
+
+        swp.add_argument('--game', '-g', action='append',
+                         help='select a game, or an alias, to watch; may be repeated (default every game)')
+        swp.add_argument('--quiet-period', type=float, default=5.0,
+                         help='seconds a game\'s files must go unchanged before it\'s saved (default 5)')
+        swp.add_argument('--poll', action='store_true',
+                         help='look for changes by periodically checking every file, instead of using inotify')
+        swp.add_argument('--poll-interval', type=float, default=2.0,
+                         help='seconds between checks when polling (default 2)')
+
+    @staticmethod
+    def _add_reporting_arguments(parser):
+        parser.add_argument('--progress', action='store_true', help='show progress while copying')
+        parser.add_argument('--metrics-json', metavar='PATH',
+                            help='write the files, bytes and throughput of each game as JSON to PATH')
 
     @classmethod
     def get_extension_name(cls):
         return cls.GAMES_BACKUP_SUBCOMMAND_NAME
 
+    @classmethod
+    def get_extension_help(cls):
+        return 'save and load game saves'
+
     def run(self, args):
+        # Everything needed to actually run is imported here, rather than with
+        #   the extension, so that just discovering it stays cheap.
+        with profiling.span('imports'):
+            from core.copy_managers import DestinationAlreadyExistsError
+            from core.extensions import PlatformNotFoundError
+            from core.snapshots import SnapshotNotFoundError
+
+            from .games_manager import GameNotFoundError
+            from .config_loader import InvalidConfigError, NoGamesDefinedError
+            from .save_game_cli import SaveGameCli
+
         try:
             save_game_cli = SaveGameCli(args.config)
         except (PlatformNotFoundError, NoGamesDefinedError, InvalidConfigError) as e:
@@ -57,119 +89,170 @@ class Extension(BackupExtension):
             self.parser.print_usage(sys.stderr)
             sys.exit(1)
 
+        metrics, progress = self._add_reporting(save_game_cli, args)
+
         try:
+            verified = True
             if args.operation == GameSavesCliOptions.SAVE:
                 if args.all:
-                    save_game_cli.save_all_games(args.force)
+                    results = save_game_cli.save_all_games(args.force, args.jobs, args.resume)
+                    self._finish_progress(progress)
+                    self._print_summary(results)
+                    if args.verify:
+                        verified = self._verify(save_game_cli, [r.name for r in results if r.succeeded])
+                    self._exit_for_failures(results)
                 else:
                     save_game_cli.save_game(args.game, args.force)
+                    self._finish_progress(progress)
+                    if args.verify:
+                        verified = self._verify(save_game_cli, [args.game])
+            elif args.operation == GameSavesCliOptions.LOAD and args.list_snapshots:
+                for snapshot in reversed(save_game_cli.get_snapshots(args.game)):
+                    print(snapshot)
             elif args.operation == GameSavesCliOptions.LOAD:
-                save_game_cli.load_game(args.game, args.force)
+                save_game_cli.load_game(args.game, args.force, args.snapshot)
+                self._finish_progress(progress)
+                if args.verify:
+                    verified = self._verify(save_game_cli, [args.game], loading=True)
+            elif args.operation == GameSavesCliOptions.WATCH:
+                self._watch(save_game_cli, args)
             else:  # pragma: no cover
                 # Shouldn't actually be reachable, but a good failsafe in case commands are added to the list without
                 # actually being implemented.
                 self.parser.print_usage(sys.stderr)
                 sys.exit(2)
-        except GameNotFoundError as e:
+        except (GameNotFoundError, SnapshotNotFoundError) as e:
             print(str(e), file=sys.stderr)
             self.parser.print_usage(sys.stderr)
             sys.exit(3)
         except OSError as e:  # pragma: no cover (Difficult to manually summon)
-            action_name = 'backup' if args.operation == GameSavesCliOptions.SAVE else 'restore'
+            action_name = 'restore' if args.operation == GameSavesCliOptions.LOAD else 'backup'
             print('Cannot {} save games because: {}'.format(action_name, e), file=sys.stderr)
             sys.exit(4)
         except DestinationAlreadyExistsError as e:
-            action_name = 'backup' if args.operation == GameSavesCliOptions.SAVE else 'restore'
+            action_name = 'restore' if args.operation == GameSavesCliOptions.LOAD else 'backup'
             print('Cannot {} save games because: {}'.format(action_name, e), file=sys.stderr)
             sys.exit(5)
         except (KeyboardInterrupt, EOFError):  # pragma: no cover (Difficult to manually summon)
             print('', file=sys.stderr)
             sys.exit(6)
+        finally:
+            save_game_cli.close()
+            self._finish_progress(progress)
+            # Even a run that fails, or is interrupted, copied what it could.
+            summary = save_game_cli.copy_manager.get_run_summary()
+            if summary:
+                print(summary)
+            if metrics is not None:
+                self._write_metrics(metrics, args)
+
+        if not verified:
+            sys.exit(7)
+
+    def _watch(self, save_game_cli, args):
+        def on_saved(result):
+            if result.succeeded:
+                print('Saved {}'.format(result.name))
+            else:
+                print('Cannot backup {} because: {}'.format(result.name, result.error), file=sys.stderr)
+            sys.stdout.flush()
+
+        def on_started(names, missing):
+            print('Watching {} games'.format(len(names)))
+            for name in missing:
+                print('{} has no save files yet, so waiting for them to be created'.format(name), file=sys.stderr)
+            sys.stdout.flush()
 
+        try:
+            save_game_cli.watch_games(
+                on_saved, args.game, args.quiet_period, args.poll, args.poll_interval, on_started=on_started
+            )
+        except KeyboardInterrupt:
+            # Interrupting is how a watch is meant to end.
+            print('', file=sys.stderr)
 
-class SaveGameCli(object):
-    def __init__(self, config_filepath=None):
-        """
-        Construct the CLI facade, proxying whatever it needs to the appropriate
-        game and copy managers.
+    def _print_summary(self, results):
+        failures = [r for r in results if not r.succeeded]
+
+        print('Saved {} of {} games'.format(len(results) - len(failures), len(results)))
+        for result in failures:
+            print('  {}: {}'.format(result.name, result.error), file=sys.stderr)
+        if failures:
+            print('Rerun with --resume to save the rest without starting over', file=sys.stderr)
+
+    def _add_reporting(self, save_game_cli, args):
+        from core.progress import ProgressRenderer, TransferMetrics
+
+        # Neither option exists until an operation has been chosen.
+        metrics = None
+        if getattr(args, 'metrics_json', None):
+            metrics = TransferMetrics()
+            save_game_cli.add_listener(metrics)
+
+        progress = None
+        if getattr(args, 'progress', False):
+            total_games = len(save_game_cli.game_definitions) if getattr(args, 'all', False) else 1
+            progress = ProgressRenderer(total_items=total_games, describe_item=lambda game: game.name)
+            save_game_cli.add_listener(progress)
+
+        return metrics, progress
+
+    @staticmethod
+    def _finish_progress(progress):
+        # The progress line has to be finished before anything else is
+        #   printed, or it'll be printed over.
+        if progress is not None:
+            progress.finish()
+
+    @staticmethod
+    def _write_metrics(metrics, args):
+        games = []
+        for item in metrics.get_item_metrics():
+            games.append({
+                'name': item.backup_item.name,
+                'operation': args.operation,
+                'files': item.files,
+                'bytes': item.bytes,
+                'seconds': item.duration,
+                'mb_per_second': item.mb_per_second,
+                'error': str(item.error) if item.error is not None else None
+            })
+
+        with open(args.metrics_json, 'w') as f:
+            json.dump({'games': games}, f, indent=2)
+
+    def _verify(self, save_game_cli, names, loading=False):
+        """Verify the copies of the named games, reporting the outcome of each,
+        and return whether they all matched.
         """
-        if config_filepath is None:
-            config_filepath = DEFAULT_CONFIG_YAML_FILEPATH
-
-        with open(config_filepath) as f:
-            config = yaml.load(f.read())
-
-        self.game_definitions = config.get('games')
-        if not self.game_definitions:
-            raise NoGamesDefinedError('No game definitions found in {}'.format(config_filepath))
-
-        plat_key = BackupExtension.get_system_platform()
-
-        # Set up a `REMOTE_ROOT` environment variable so that the remote can
-        #   be added by just evaluating the environment, rather than needing
-        #   to pass around variables everywhere. If this is already present in
-        #   the environment, use it as is.
-        if 'REMOTE_ROOT' not in os.environ and 'remotes' in config and plat_key in config['remotes']:
-            os.environ['REMOTE_ROOT'] = config['remotes'][plat_key]
-        elif 'REMOTE_ROOT' not in os.environ:
-            raise InvalidConfigError('Cannot set up remote for this platform')
-
-        # Prepare variables for use by expanding out existing environment
-        #   variables into them, then set them into the environment, but like
-        #   above, skip ones that already exist, so the user can set them
-        #   themselves if they want them.
-        for k, v in config.get('variables', {}).items():
-            if k in os.environ:
-                continue
-
-            os.environ[k] = os.path.expandvars(v)
-
-        self.games_manager = GamesManager(plat_key, self.game_definitions)
-
-        if not self.games_manager.has_games:
-            raise NoGamesDefinedError('There are no games configured for this platform')
-
-        try:
-            self.copy_manager = CopyManagerFactory.get(config['manager'])
-        except UnknownCopyManagerError as e:
-            raise InvalidConfigError(str(e)) from e
-
-    def save_game(self, alias=None, force=False):
-        game = self._get_game(alias)
-        self.copy_manager.save_item(game, force)
-
-    def load_game(self, alias=None, force=False):
-        game = self._get_game(alias)
-        self.copy_manager.load_item(game, force)
-
-    def save_all_games(self, force=False):
-        for game in self.game_definitions:
-            try:
-                self.copy_manager.save_item(self._get_game(game['name']), force)
-            except GameNotFoundError:
-                pass
-
-    def _get_game(self, alias=None):
-        try:
-            return self.games_manager.resolve_alias(alias)
-        except GameNotFoundError as e:
-            raise GameNotFoundError(str(e) + self._error_help_text()) from e
-
-    def _format_game_name(self, game):
-        if 'aliases' in game:
-            return '{} ({})'.format(game['name'], ', '.join(game['aliases']))
-        return game['name']
-
-    def _error_help_text(self):
-        game_names = []
-        for g in self.game_definitions:
-            try:
-                self.games_manager.resolve_alias(g['name'])
-                game_names.append(self._format_game_name(g))
-            except GameNotFoundError:
-                pass
-
-        return '\nTry one of the following:\n{}'.format('\n'.join(['  {}'.format(g) for g in game_names]))
+        verified = True
+        for name, result in zip(names, save_game_cli.verify_games(names, loading)):
+            if result is None:
+                print('Cannot verify {}: copies made by this copy manager can\'t be compared'.format(name),
+                      file=sys.stderr)
+            elif result.succeeded:
+                print('Verified {} ({} files)'.format(name, result.files))
+            else:
+                verified = False
+                print('Verification of {} failed:'.format(name), file=sys.stderr)
+                for path in result.missing:
+                    print('  missing: {}'.format(path), file=sys.stderr)
+                for path in result.mismatched:
+                    print('  differs: {}'.format(path), file=sys.stderr)
+
+        return verified
+
+    def _exit_for_failures(self, results):
+        from core.copy_managers import DestinationAlreadyExistsError
+
+        # Use the same exit codes that a single failed save would have
+        #   produced, preferring collisions, since those are the failures that
+        #   the user is expected to resolve by hand.
+        errors = [r.error for r in results if not r.succeeded]
+        if any(isinstance(e, DestinationAlreadyExistsError) for e in errors):
+            sys.exit(5)
+        if errors:
+            sys.exit(4)
 
 
 __all__ = ['Extension']
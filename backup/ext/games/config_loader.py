@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+
+from core import profiling
+from core.cache import read_json_cache, write_json_cache
+
+from .games_manager import GamesManager
+
+CONFIG_CACHE_VERSION = 2
+
+# Variables that `~` can be expanded from, depending on the platform.
+HOME_VARIABLES = ('HOME', 'USERPROFILE', 'HOMEDRIVE', 'HOMEPATH')
+VARIABLE_REFERENCE_RE = re.compile(r'\$\{?(\w+)|%(\w+)%')
+
+
+class InvalidConfigError(Exception):
+    pass
+
+
+class NoGamesDefinedError(Exception):
+    pass
+
+
+class ResolvedConfig(object):
+    """A config file as it applies to one platform, with every variable and
+    path already expanded.
+
+    Keyword arguments:
+        manager -- Name of the copy manager to use
+        manager_options -- Options to create the copy manager with
+        index -- Path of the file state index, if one is configured
+        throttle -- Options to create the core.throttle.Throttle shared by
+            every copy with, if one is configured
+        environment -- Environment variables the config sets
+        game_definitions -- Definitions of the games on this platform, whose
+            paths have been expanded
+    """
+    def __init__(self, manager, manager_options, index, throttle, environment, game_definitions):
+        self.manager = manager
+        self.manager_options = manager_options
+        self.index = index
+        self.throttle = throttle
+        self.environment = environment
+        self.game_definitions = game_definitions
+
+    def to_dict(self):
+        return {
+            'manager': self.manager,
+            'manager_options': self.manager_options,
+            'index': self.index,
+            'throttle': self.throttle,
+            'environment': self.environment,
+            'game_definitions': self.game_definitions
+        }
+
+
+def load_config(config_filepath, platform):
+    """Read the config file at config_filepath and resolve it for platform.
+
+    Resolving a large config is slow, so the result is cached. The cache is
+    used for as long as neither the contents of the file, nor any environment
+    variable that could affect how it's resolved, change.
+
+    The variables the config defines are set in the environment either way.
+    """
+    with profiling.span('config cache lookup'):
+        with open(config_filepath, 'rb') as f:
+            contents = f.read()
+
+        digest = hashlib.sha256(contents).hexdigest()
+        path_digest = hashlib.sha1(os.path.abspath(config_filepath).encode()).hexdigest()
+        cache_filename = os.path.join('configs', '{}-{}.json'.format(path_digest, platform))
+
+        cache = read_json_cache(cache_filename)
+
+    if cache and cache.get('version') == CONFIG_CACHE_VERSION and cache.get('digest') == digest and \
+            all(os.environ.get(k) == v for k, v in cache['inputs'].items()):
+        config = ResolvedConfig(**cache['config'])
+        for k, v in config.environment.items():
+            os.environ[k] = v
+        return config
+
+    with profiling.span('yaml load'):
+        # Importing PyYAML is a noticeable part of startup, so a config that's
+        #   been cached is never parsed, or even imported.
+        import yaml
+
+        # libyaml's loader is an order of magnitude faster than the pure
+        #   Python one, but PyYAML isn't always built with it.
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        raw_config = yaml.load(contents, Loader=loader) or {}
+
+    # Everything that was read from the environment while resolving the
+    #   config, before the config added anything to it.
+    input_names = set(HOME_VARIABLES) | {'REMOTE_ROOT'} | set(raw_config.get('variables') or {})
+    for match in VARIABLE_REFERENCE_RE.finditer(contents.decode('utf-8', 'replace')):
+        input_names.add(match.group(1) or match.group(2))
+    inputs = {k: os.environ.get(k) for k in sorted(input_names)}
+
+    config = _resolve_config(raw_config, config_filepath, platform)
+
+    write_json_cache(cache_filename, {
+        'version': CONFIG_CACHE_VERSION,
+        'digest': digest,
+        'inputs': inputs,
+        'config': config.to_dict()
+    })
+
+    return config
+
+
+def _resolve_config(config, config_filepath, platform):
+    game_definitions = config.get('games')
+    if not game_definitions:
+        raise NoGamesDefinedError('No game definitions found in {}'.format(config_filepath))
+
+    with profiling.span('variable expansion'):
+        environment = _resolve_environment(config, platform)
+
+    # Expands the paths of the platform's games in place.
+    with profiling.span('GamesManager resolution'):
+        games_manager = GamesManager(platform, game_definitions)
+    if not games_manager.has_games:
+        raise NoGamesDefinedError('There are no games configured for this platform')
+
+    index = config.get('index')
+    if index is not None:
+        index = os.path.expanduser(os.path.expandvars(index))
+
+    return ResolvedConfig(
+        manager=config.get('manager'),
+        manager_options=config.get('manager_options', {}),
+        index=index,
+        throttle=config.get('throttle'),
+        environment=environment,
+        game_definitions=[_platform_definition(g, platform) for g in game_definitions if platform in g]
+    )
+
+
+def _resolve_environment(config, platform):
+    environment = {}
+
+    # Set up a `REMOTE_ROOT` environment variable so that the remote can
+    #   be added by just evaluating the environment, rather than needing
+    #   to pass around variables everywhere. If this is already present in
+    #   the environment, use it as is.
+    if 'REMOTE_ROOT' not in os.environ and 'remotes' in config and platform in config['remotes']:
+        environment['REMOTE_ROOT'] = os.environ['REMOTE_ROOT'] = config['remotes'][platform]
+    elif 'REMOTE_ROOT' not in os.environ:
+        raise InvalidConfigError('Cannot set up remote for this platform')
+
+    # Prepare variables for use by expanding out existing environment
+    #   variables into them, then set them into the environment, but like
+    #   above, skip ones that already exist, so the user can set them
+    #   themselves if they want them.
+    for k, v in config.get('variables', {}).items():
+        if k in os.environ:
+            continue
+
+        environment[k] = os.environ[k] = os.path.expandvars(v)
+
+    return environment
+
+
+def _platform_definition(game, platform):
+    definition = {'name': game['name'], platform: game[platform]}
+    if 'aliases' in game:
+        definition['aliases'] = game['aliases']
+    return definition
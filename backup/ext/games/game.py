@@ -2,4 +2,6 @@ from core.backup_item import BackupItem
 
 
 class Game(BackupItem):
-    pass
+    def __init__(self, local_path, remote_path, name=None):
+        super(Game, self).__init__(local_path, remote_path)
+        self.name = name
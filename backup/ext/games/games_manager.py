@@ -1,21 +1,46 @@
+import bisect
+import difflib
 import os
+from collections import Counter, defaultdict
 
 from .game import Game
 
+# Fuzzy suggestions are ranked by how similar they are to what was typed, but
+#   only the aliases that share the most trigrams with it are worth ranking.
+SUGGESTION_CANDIDATES = 50
+SUGGESTION_CUTOFF = 0.6
+
 
 class GameNotFoundError(Exception):
     pass
 
 
 class GamesManager(object):
-    def __init__(self, platform, game_definitions=()):
+    def __init__(self, platform, game_definitions=(), expand_paths=True):
+        """
+        Positional arguments:
+            platform -- The platform key games' paths are read from
+        Keyword arguments:
+            game_definitions -- Game definitions from the config (default ())
+            expand_paths -- Whether game paths still need variables and `~`
+                expanded. Definitions are updated with their expanded paths,
+                so they can be passed in again later without expanding them
+                (default True)
+        """
         self.platform = platform
         self._game_aliases = {}
 
+        # Everything below is an index over the aliases, so that looking up
+        #   partial or misspelled names never needs to visit every game.
+        self._game_names = {}
+        self._game_display_names = []
+        self._sorted_aliases = []
+        self._trigram_aliases = defaultdict(set)
+
         self.has_games = False
-        self._resolve_definitions(game_definitions)
+        self._resolve_definitions(game_definitions, expand_paths)
 
-    def _resolve_definitions(self, game_definitions):
+    def _resolve_definitions(self, game_definitions, expand_paths):
         for game in game_definitions:
             # If this game hasn't been configured for this platform, or just
             #   plain old doesn't exist on this platform, skip it.
@@ -26,17 +51,24 @@ class GamesManager(object):
             # Get the appropriate paths for this platform
             paths = game[self.platform]
 
-            # Allow for the remote path to be fully excluded. If that's the
-            #   case, just use the remote root.
-            if 'remote' not in paths:
-                paths['remote'] = '$REMOTE_ROOT'
+            if expand_paths:
+                # Allow for the remote path to be fully excluded. If that's the
+                #   case, just use the remote root.
+                if 'remote' not in paths:
+                    paths['remote'] = '$REMOTE_ROOT'
+
+                paths['remote'] = os.path.expanduser(os.path.expandvars(paths['remote']))
+                paths['local'] = os.path.expanduser(os.path.expandvars(paths['local']))
 
-            paths['remote'] = os.path.expanduser(os.path.expandvars(paths['remote']))
-            paths['local'] = os.path.expanduser(os.path.expandvars(paths['local']))
+            self._game_display_names.append(self._format_game_name(game))
+            for alias in [game['name']] + game.get('aliases', []):
+                alias = alias.lower()
+                self._game_aliases[alias] = paths
+                self._game_names[alias] = game['name']
+                for trigram in self._trigrams(alias):
+                    self._trigram_aliases[trigram].add(alias)
 
-            self._game_aliases[game['name'].lower()] = paths
-            for alias in game.get('aliases', []):
-                self._game_aliases[alias.lower()] = paths
+        self._sorted_aliases = sorted(self._game_aliases)
 
     def resolve_alias(self, alias):
         if not alias:
@@ -47,4 +79,77 @@ class GamesManager(object):
         if alias not in self._game_aliases:
             raise GameNotFoundError('No game found with that name')
 
-        return Game(local_path=self._game_aliases[alias]['local'], remote_path=self._game_aliases[alias]['remote'])
+        return Game(
+            local_path=self._game_aliases[alias]['local'],
+            remote_path=self._game_aliases[alias]['remote'],
+            name=self._game_names[alias]
+        )
+
+    def get_game_names(self):
+        """The names of all of this platform's games, along with their
+        aliases, in the order they were defined.
+        """
+        return list(self._game_display_names)
+
+    def find_games(self, prefix, limit=None):
+        """The names of the games with a name or alias that starts with prefix,
+        ordered by alias.
+
+        Keyword arguments:
+            limit -- The most names to return (default all of them)
+        """
+        prefix = prefix.lower()
+        names = []
+        i = bisect.bisect_left(self._sorted_aliases, prefix)
+        while i < len(self._sorted_aliases) and self._sorted_aliases[i].startswith(prefix):
+            if limit is not None and len(names) >= limit:
+                break
+            name = self._game_names[self._sorted_aliases[i]]
+            if name not in names:
+                names.append(name)
+            i += 1
+
+        return names
+
+    def suggest_games(self, alias, limit=5):
+        """The names of up to limit games that alias may have been meant to
+        refer to. Games that alias is a prefix of come first, followed by the
+        ones with the most similar names.
+        """
+        if not alias:
+            return []
+
+        alias = alias.lower()
+        names = self.find_games(alias, limit)
+
+        shared_trigrams = Counter()
+        for trigram in self._trigrams(alias):
+            shared_trigrams.update(self._trigram_aliases.get(trigram, ()))
+
+        matcher = difflib.SequenceMatcher(b=alias)
+        scored = []
+        for candidate, _ in shared_trigrams.most_common(SUGGESTION_CANDIDATES):
+            matcher.set_seq1(candidate)
+            score = matcher.ratio()
+            if score >= SUGGESTION_CUTOFF:
+                scored.append((-score, candidate))
+
+        for _, candidate in sorted(scored):
+            if len(names) >= limit:
+                break
+            name = self._game_names[candidate]
+            if name not in names:
+                names.append(name)
+
+        return names
+
+    @staticmethod
+    def _trigrams(alias):
+        padded = '  {} '.format(alias)
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def _format_game_name(game):
+        if 'aliases' in game:
+            return '{} ({})'.format(game['name'], ', '.join(game['aliases']))
+        return game['name']
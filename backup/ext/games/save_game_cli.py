@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import profiling
+from core.cache import get_cache_dir
+from core.copy_managers import DestinationAlreadyExistsError, CopyManagerFactory, UnknownCopyManagerError
+from core.copy_managers import UnavailableCompressionError
+from core.extensions import BackupExtension
+from core.file_index import FileStateIndex, IndexedCopyManager
+from core.journal import ResumableCopyManager, TransferJournal
+from core.progress import ObservedCopyManager
+from core.snapshots import SnapshotNotFoundError
+from core.throttle import InvalidThrottleError, Throttle
+from core.verify import TreeVerifier
+from core.watcher import Debouncer, create_watcher
+
+from .config_loader import InvalidConfigError, load_config
+from .games_manager import GamesManager, GameNotFoundError
+
+DEFAULT_CONFIG_YAML_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+
+# The longest a watch waits before checking whether it's been stopped.
+WATCH_STOP_CHECK_INTERVAL = 1.0
+
+
+class GameSaveResult(object):
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+
+class SaveGameCli(object):
+    def __init__(self, config_filepath=None):
+        """
+        Construct the CLI facade, proxying whatever it needs to the appropriate
+        game and copy managers.
+        """
+        if config_filepath is None:
+            config_filepath = DEFAULT_CONFIG_YAML_FILEPATH
+        self.config_filepath = config_filepath
+
+        plat_key = BackupExtension.get_system_platform()
+        with profiling.span('config load'):
+            config = load_config(config_filepath, plat_key)
+
+        self.game_definitions = config.game_definitions
+        with profiling.span('GamesManager resolution'):
+            self.games_manager = GamesManager(plat_key, self.game_definitions, expand_paths=False)
+
+        try:
+            with profiling.span('copy manager setup'):
+                self.copy_manager = CopyManagerFactory.get(config.manager, **config.manager_options)
+        except (UnknownCopyManagerError, UnavailableCompressionError) as e:
+            raise InvalidConfigError(str(e)) from e
+        except TypeError as e:
+            raise InvalidConfigError('Invalid manager_options for {}: {}'.format(config.manager, e)) from e
+
+        # An index of what was last saved lets unchanged games be skipped
+        #   without touching the remote.
+        self.index = None
+        if config.index is not None:
+            self.index = FileStateIndex(config.index)
+            self.copy_manager = IndexedCopyManager(self.copy_manager, self.index)
+
+        # Lets listeners follow each game as it's copied.
+        self.copy_manager = ObservedCopyManager(self.copy_manager)
+        self._verifier = None
+
+        # Every copy shares the one throttle, so that backing up doesn't get
+        #   in the way of playing.
+        try:
+            self.throttle = Throttle.from_option(config.throttle)
+        except InvalidThrottleError as e:
+            raise InvalidConfigError(str(e)) from e
+        self.copy_manager.set_throttle(self.throttle)
+
+        # Time each game's copy when the run is being profiled.
+        if profiling.get_profiler() is not None:
+            self.add_listener(profiling.get_profiler())
+
+    def add_listener(self, listener):
+        """Have a core.copy_managers.ICopyListener receive events about every
+        game saved or loaded from now on.
+        """
+        self.copy_manager.add_listener(listener)
+
+    def close(self):
+        if self._verifier is not None:
+            self._verifier.close()
+        self.copy_manager.close()
+
+    def save_game(self, alias=None, force=False):
+        game = self._get_game(alias)
+        self.copy_manager.save_item(game, force)
+
+    def load_game(self, alias=None, force=False, snapshot=None):
+        """Load a game from the remote.
+
+        Keyword arguments:
+            alias -- The name or alias of the game (default None)
+            force -- Overwrite existing local files (default False)
+            snapshot -- The name of the snapshot to load, when the copy
+                manager saves snapshots (default the latest)
+        """
+        game = self._get_game(alias)
+        if snapshot is not None:
+            self.get_snapshots(alias)
+            game.snapshot = snapshot
+        self.copy_manager.load_item(game, force)
+
+    def get_snapshots(self, alias=None):
+        """Return the names of the snapshots saved of a game, oldest first."""
+        snapshots = self.copy_manager.get_snapshots(self._get_game(alias))
+        if snapshots is None:
+            raise SnapshotNotFoundError('The copy manager isn\'t configured to save snapshots')
+        return snapshots
+
+    def verify_games(self, aliases, loading=False):
+        """Compare the copies of the given games to their sources.
+
+        Positional arguments:
+            aliases -- Names or aliases of the games to verify
+
+        Keyword arguments:
+            loading -- Whether the games were loaded, rather than saved
+                (default False)
+
+        Returns a list of core.verify.VerificationResult, in the same order as
+        aliases, with None for each game whose copy can't be verified.
+        """
+        if self._verifier is None:
+            self._verifier = TreeVerifier(self.index)
+
+        return [self._verifier.verify(self.copy_manager, self._get_game(alias), loading) for alias in aliases]
+
+    def save_all_games(self, force=False, jobs=1, resume=False):
+        """Save every game configured for this platform.
+
+        A failure to save one game doesn't prevent the others from being
+        saved; the outcome of each is returned as a list of GameSaveResult in
+        the order the games are defined in the config.
+
+        Everything saved is recorded in a journal until every game has been
+        saved, so that a run that fails or is interrupted can be resumed. A
+        run that isn't resuming only replaces the last run's journal once it
+        has copied something.
+
+        Keyword arguments:
+            force -- Overwrite existing files on the remote (default False)
+            jobs -- The number of games to save concurrently, which is capped
+                by the throttle's max_transfers (default 1)
+            resume -- Continue the last run that didn't save every game,
+                skipping the games and files it finished (default False)
+        """
+        games = []
+        for game in self.game_definitions:
+            try:
+                games.append((game['name'], self._get_game(game['name'])))
+            except GameNotFoundError:
+                pass
+
+        if self.throttle is not None:
+            jobs = self.throttle.limit_concurrency(jobs)
+
+        journal = TransferJournal(self._get_journal_path(), resume)
+        copy_manager = ResumableCopyManager(self.copy_manager, journal)
+        try:
+            if jobs <= 1:
+                errors = copy_manager.save_items([game for _, game in games], force)
+            else:
+                errors = asyncio.run(self._save_games_concurrently(copy_manager, games, force, jobs))
+        finally:
+            # The journal only follows this run, not later saves and loads.
+            copy_manager.close()
+
+        if not any(errors):
+            journal.discard()
+
+        return [GameSaveResult(name, error) for (name, _), error in zip(games, errors)]
+
+    async def _save_games_concurrently(self, copy_manager, games, force, jobs):
+        # Copy managers that can copy asynchronously, like rsync, share this
+        #   thread between all of their transfers; the rest are given a thread
+        #   for each game that's being saved at once.
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=jobs))
+
+        copy_manager = copy_manager.get_async_copy_manager()
+        return await copy_manager.save_items([game for _, game in games], force, limit=jobs)
+
+    def _get_journal_path(self):
+        # Each config has a journal of its own.
+        key = hashlib.sha1(os.path.abspath(self.config_filepath).encode()).hexdigest()
+        return os.path.join(get_cache_dir(), 'journals', '{}.jsonl'.format(key))
+
+    def watch_games(self, on_saved, aliases=None, quiet_period=5.0, poll=False, poll_interval=2.0, stop=None,
+                    on_started=None):
+        """Save each game whenever its local files change, until stop is set.
+
+        Games are only saved once their files have stopped changing for
+        quiet_period seconds, so a game writing a save in several steps is
+        saved once it's done. Only the game that changed is saved, replacing
+        its previous copy on the remote as save --force would.
+
+        What each save costs depends on the copy manager. With an index, a
+        game whose files turn out to be unchanged isn't copied at all, and an
+        incremental native copy only writes the files that changed, or with
+        delta only their changed blocks. Otherwise every save stages a whole
+        new copy of the game, although a native copy links the files that
+        haven't changed from the copy it replaces rather than rewriting them.
+
+        A game whose local files don't exist yet is still watched, and saved
+        once they're created.
+
+        Positional arguments:
+            on_saved -- Called with a GameSaveResult after each save
+
+        Keyword arguments:
+            aliases -- Names or aliases of the games to watch (default every
+                game configured for this platform)
+            quiet_period -- Seconds a game's files have to go unchanged
+                before it's saved (default 5)
+            poll -- Look for changes by walking the games' files every
+                poll_interval seconds, even where inotify is available
+                (default False)
+            poll_interval -- Seconds between walks when polling (default 2)
+            stop -- A threading.Event that ends the watch once set (default
+                None, watching until interrupted)
+            on_started -- Called with the names of the games being watched,
+                and the names of those whose local files don't exist yet,
+                once changes to them are being watched for (default None)
+        """
+        games = {}
+        for alias in aliases if aliases is not None else [game['name'] for game in self.game_definitions]:
+            try:
+                game = self._get_game(alias)
+            except GameNotFoundError:
+                # Only games that were asked for by name have to exist.
+                if aliases is not None:
+                    raise
+                continue
+            games[game.name] = game
+
+        watcher = create_watcher(poll, poll_interval)
+        debouncer = Debouncer(quiet_period)
+        try:
+            for name, game in games.items():
+                watcher.add(name, game.local_path)
+            if on_started is not None:
+                missing = [name for name, game in games.items() if not os.path.exists(game.local_path)]
+                on_started(list(games), missing)
+
+            while stop is None or not stop.is_set():
+                deadline = debouncer.next_deadline()
+                timeout = WATCH_STOP_CHECK_INTERVAL
+                if deadline is not None:
+                    timeout = min(timeout, max(0, deadline - time.monotonic()))
+
+                debouncer.changed(watcher.wait(timeout), time.monotonic())
+                for name in debouncer.pop_ready(time.monotonic()):
+                    on_saved(self._save_game_result(name, games[name], True))
+        finally:
+            watcher.close()
+
+    def _save_game_result(self, name, game, force):
+        try:
+            self.copy_manager.save_item(game, force)
+        except (DestinationAlreadyExistsError, OSError) as e:
+            return GameSaveResult(name, e)
+        return GameSaveResult(name)
+
+    def _get_game(self, alias=None):
+        try:
+            return self.games_manager.resolve_alias(alias)
+        except GameNotFoundError as e:
+            raise GameNotFoundError(str(e) + self._error_help_text(alias)) from e
+
+    def _error_help_text(self, alias=None):
+        suggestions = self.games_manager.suggest_games(alias)
+        if suggestions:
+            return '\nDid you mean one of the following:\n{}'.format('\n'.join(['  {}'.format(g) for g in suggestions]))
+
+        game_names = self.games_manager.get_game_names()
+        return '\nTry one of the following:\n{}'.format('\n'.join(['  {}'.format(g) for g in game_names]))
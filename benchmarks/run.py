@@ -0,0 +1,205 @@
+"""Measure the throughput of every copy manager on synthetic save trees.
+
+Each copy manager is run through three scenarios:
+  save -- copy the tree to an empty remote
+  resave -- save the same, unchanged tree again, with force
+  load -- copy the saved tree back to an empty local directory
+
+Every scenario runs in its own process, so that peak memory use can be
+attributed to it. That process's home, cache and trash directories are all
+within the working directory, so nothing is left behind in the user's.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import CopyManagerFactory
+
+from .tree_generator import PROFILES, generate_tree
+
+
+SCENARIOS = ('save', 'resave', 'load')
+REGRESSION_THRESHOLD = 0.1
+
+
+def _peak_rss_mb():
+    # Includes any processes the copy manager spawned, like rsync.
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _isolate_user_directories(home):
+    """Point everything a copy manager might write to on the user's behalf,
+    like a trash or a cache, into home, so that benchmarks never leave
+    anything behind outside of their working directory.
+    """
+    os.makedirs(home, exist_ok=True)
+    os.environ.update({
+        'HOME': home,
+        'XDG_DATA_HOME': os.path.join(home, '.local', 'share'),
+        'XDG_CACHE_HOME': os.path.join(home, '.cache'),
+        'BACKUP_CACHE_DIR': os.path.join(home, '.cache', 'backup')
+    })
+
+
+def _run_scenario(queue, manager_name, scenario, source_dir, remote_dir, load_dir, home):
+    try:
+        # Scenarios run in processes of their own, so this only affects the
+        #   one running the scenario.
+        _isolate_user_directories(home)
+        copy_manager = CopyManagerFactory.get(manager_name)
+        start = time.perf_counter()
+        if scenario == 'load':
+            copy_manager.load_item(BackupItem(load_dir, remote_dir))
+        else:
+            copy_manager.save_item(BackupItem(source_dir, remote_dir), force=scenario == 'resave')
+        copy_manager.close()
+        queue.put({'wall_seconds': time.perf_counter() - start, 'peak_rss_mb': _peak_rss_mb()})
+    except Exception as e:
+        queue.put({'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+def run_benchmarks(profile_name, manager_names, workdir):
+    source_dir = os.path.join(workdir, 'source')
+    print('Generating {} tree in {}'.format(profile_name, source_dir), file=sys.stderr)
+    stats = generate_tree(source_dir, PROFILES[profile_name])
+
+    results = []
+    for manager_name in manager_names:
+        remote_dir = os.path.join(workdir, 'remote')
+        # Some copy managers name what they store after the local directory,
+        #   so the tree has to be loaded into a directory of the same name.
+        load_dir = os.path.join(workdir, 'load', os.path.basename(source_dir))
+
+        for scenario in SCENARIOS:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_run_scenario,
+                args=(queue, manager_name, scenario, source_dir, remote_dir, load_dir, os.path.join(workdir, 'home'))
+            )
+            process.start()
+            outcome = _wait_for_outcome(process, queue)
+            process.join()
+
+            result = {
+                'manager': manager_name,
+                'scenario': scenario,
+                'files': stats.files,
+                'bytes': stats.bytes
+            }
+            result.update(outcome)
+            if 'wall_seconds' in outcome:
+                wall_seconds = max(outcome['wall_seconds'], 1e-9)
+                result['files_per_second'] = stats.files / wall_seconds
+                result['mb_per_second'] = stats.bytes / (1024 * 1024) / wall_seconds
+
+            results.append(result)
+            print(_format_result(result), file=sys.stderr)
+
+            # Later scenarios depend on the earlier ones for this manager.
+            if 'error' in outcome:
+                break
+
+        for path in (remote_dir, os.path.dirname(load_dir), os.path.join(workdir, 'home')):
+            shutil.rmtree(path, ignore_errors=True)
+
+    return {
+        'profile': profile_name,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+
+def _wait_for_outcome(process, queue):
+    # A process that dies outright (e.g. killed for running out of memory)
+    #   never reports anything.
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            if not process.is_alive():
+                return {'error': 'Benchmark process exited with code {}'.format(process.exitcode)}
+
+
+def compare(report, baseline):
+    """Return a line describing the change in wall time of each result that
+    also appears in baseline, and whether any of them regressed.
+    """
+    previous = {(r['manager'], r['scenario']): r for r in baseline['results'] if 'wall_seconds' in r}
+    lines = []
+    regressed = False
+    for result in report['results']:
+        before = previous.get((result['manager'], result['scenario']))
+        if before is None or 'wall_seconds' not in result:
+            continue
+
+        change = result['wall_seconds'] / max(before['wall_seconds'], 1e-9) - 1
+        flag = ''
+        if change > REGRESSION_THRESHOLD:
+            flag = '  REGRESSION'
+            regressed = True
+        lines.append('{:<24} {:<8} {:+7.1%}{}'.format(result['manager'], result['scenario'], change, flag))
+
+    return lines, regressed
+
+
+def _format_result(result):
+    if 'error' in result:
+        return '{:<24} {:<8} failed: {}'.format(result['manager'], result['scenario'], result['error'])
+
+    return '{:<24} {:<8} {:8.2f}s {:10.0f} files/s {:8.1f} MB/s {:8.1f} MB peak RSS'.format(
+        result['manager'],
+        result['scenario'],
+        result['wall_seconds'],
+        result['files_per_second'],
+        result['mb_per_second'],
+        result['peak_rss_mb']
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark copy managers')
+    parser.add_argument('--profile', '-p', choices=sorted(PROFILES), default='small', help='size of tree to generate')
+    parser.add_argument('--manager', '-m', action='append', dest='managers',
+                        help='copy manager to benchmark, may be repeated (default all)')
+    parser.add_argument('--output', '-o', help='write results as JSON to this path')
+    parser.add_argument('--baseline', '-b', help='compare against results previously written with --output')
+    parser.add_argument('--workdir', '-w', help='directory to generate trees in (default a temporary directory)')
+    args = parser.parse_args(argv)
+
+    manager_names = args.managers or CopyManagerFactory.get_manager_names()
+
+    workdir = tempfile.mkdtemp(prefix='backup-bench-', dir=args.workdir)
+    try:
+        report = run_benchmarks(args.profile, manager_names, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, regressed = compare(report, json.load(f))
+        print('\n'.join(['Change in wall time from baseline:'] + lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import random
+
+
+class TreeProfile(object):
+    """Describes the shape of a synthetic save tree.
+
+    Keyword arguments:
+        tiny_files -- Number of small files, spread over several directories
+        tiny_file_size -- Largest size of each small file, in bytes
+        large_files -- Number of large blobs
+        large_file_size -- Size of each large blob, in bytes
+        depth -- How deeply nested the deepest directory is
+        hardlinks -- Number of extra hardlinks to files already in the tree
+    """
+    def __init__(self, tiny_files, tiny_file_size, large_files, large_file_size, depth, hardlinks):
+        self.tiny_files = tiny_files
+        self.tiny_file_size = tiny_file_size
+        self.large_files = large_files
+        self.large_file_size = large_file_size
+        self.depth = depth
+        self.hardlinks = hardlinks
+
+
+MIB = 1024 * 1024
+
+PROFILES = {
+    # Quick enough to run on every change.
+    'small': TreeProfile(
+        tiny_files=2000, tiny_file_size=4096, large_files=2, large_file_size=16 * MIB, depth=32, hardlinks=50
+    ),
+    # Roughly what a well-played Steam userdata directory looks like.
+    'medium': TreeProfile(
+        tiny_files=20000, tiny_file_size=8192, large_files=3, large_file_size=256 * MIB, depth=64, hardlinks=500
+    ),
+    'large': TreeProfile(
+        tiny_files=100000, tiny_file_size=8192, large_files=3, large_file_size=2048 * MIB, depth=128, hardlinks=2000
+    )
+}
+
+
+class TreeStats(object):
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+
+
+def generate_tree(root, profile, seed=0):
+    """Fill root with files matching profile. Contents are random, so they
+    neither compress nor deduplicate unrealistically well. The same seed always
+    produces the same tree.
+
+    Returns the TreeStats of the tree, where each hardlink counts as a file.
+    """
+    rng = random.Random(seed)
+    stats = TreeStats()
+    files = []
+
+    def write_file(path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                block = min(remaining, MIB)
+                f.write(rng.getrandbits(8 * block).to_bytes(block, 'little'))
+                remaining -= block
+
+        files.append(path)
+        stats.files += 1
+        stats.bytes += size
+
+    # Saves usually group many small files into a handful of directories.
+    for i in range(profile.tiny_files):
+        directory = os.path.join(root, 'slots', 'profile{:02d}'.format(i % 16))
+        write_file(os.path.join(directory, 'save{:06d}.dat'.format(i)), rng.randint(1, profile.tiny_file_size))
+
+    for i in range(profile.large_files):
+        write_file(os.path.join(root, 'blobs', 'blob{}.bin'.format(i)), profile.large_file_size)
+
+    nested = os.path.join(root, 'nested', *('d{:03d}'.format(i) for i in range(profile.depth)))
+    write_file(os.path.join(nested, 'deep.dat'), profile.tiny_file_size)
+
+    for i in range(profile.hardlinks):
+        target = files[rng.randrange(len(files))]
+        link = os.path.join(root, 'links', 'link{:06d}'.format(i))
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        os.link(target, link)
+        stats.files += 1
+        stats.bytes += os.path.getsize(target)
+
+    return stats
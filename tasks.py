@@ -69,6 +69,37 @@ def coverage(c):
         sys.exit(result.return_code)
 
 
+@task
+def bench(c, profile='small', output=None, baseline=None, manager=None):
+    """Benchmark every copy manager against a generated save tree. Results can
+    be written to a JSON file with --output, and compared to a previous run's
+    results with --baseline.
+    """
+    setup(c, quiet=True)
+
+    args = ['--profile', profile]
+    if output:
+        args += ['--output', output]
+    if baseline:
+        args += ['--baseline', baseline]
+    if manager:
+        args += ['--manager', manager]
+
+    with c.cd(ROOT_DIR):
+        c.run('python3 -m benchmarks.run {}'.format(' '.join(args)))
+
+
+@task
+def bench_chunker(c, size=32):
+    """Benchmark how many MB/s the chunk store's content defined chunker can
+    split into chunks.
+    """
+    setup(c, quiet=True)
+
+    with c.cd(ROOT_DIR):
+        c.run('python3 -m benchmarks.chunker --size {}'.format(size))
+
+
 @task
 def install(c):
     c.run('pip3 install --upgrade -v {}'.format(ROOT_DIR))
@@ -1,10 +1,20 @@
+import asyncio
+import copy
 import os
 import tempfile
 import shutil
 from unittest import TestCase
 
 from backup.core.backup_item import BackupItem
-from backup.core.copy_managers.copy_manager import DestinationAlreadyExistsError
+from backup.core.copy_managers.copy_manager import DestinationAlreadyExistsError, ICopyListener
+
+
+class RecordingCopyListener(ICopyListener):
+    def __init__(self):
+        self.files = []
+
+    def file_copied(self, backup_item, path, size):
+        self.files.append((backup_item, path, size))
 
 
 def skip_if_base_class(fn):
@@ -97,6 +107,52 @@ class CopyManagerTestCase(TestCase):
         self.assertEqual(exc.exception.args, (2, 'No such file or directory'))
         self.assertEqual(exc.exception.filename, self.source_dir)
 
+    @skip_if_base_class
+    def test_save_items_reports_each_item(self):
+        shutil.rmtree(self.dest_dir)
+
+        missing_dir = os.path.join(self.source_dir, 'missing')
+        backup_items = [BackupItem(missing_dir, self.dest_dir), BackupItem(self.source_dir, self.dest_dir)]
+
+        errors = self.copy_manager.save_items(backup_items)
+
+        self.assertEqual(len(errors), 2)
+        self.assertIsInstance(errors[0], OSError)
+        self.assertEqual(errors[0].filename, missing_dir)
+        self.assertIsNone(errors[1])
+
+    @skip_if_base_class
+    def test_async_save_items_reports_each_item(self):
+        shutil.rmtree(self.dest_dir)
+
+        missing_dir = os.path.join(self.source_dir, 'missing')
+        backup_items = [BackupItem(missing_dir, self.dest_dir), BackupItem(self.source_dir, self.dest_dir)]
+
+        errors = asyncio.run(self.copy_manager.get_async_copy_manager().save_items(backup_items, limit=1))
+
+        self.assertEqual(len(errors), 2)
+        self.assertIsInstance(errors[0], OSError)
+        self.assertEqual(errors[0].filename, missing_dir)
+        self.assertIsNone(errors[1])
+
+    @skip_if_base_class
+    def test_save_item_reports_files(self):
+        shutil.rmtree(self.dest_dir)
+
+        # Listeners stay with a copy manager, so don't leave one behind on the
+        #   one shared by every test.
+        copy_manager = copy.copy(self.copy_manager)
+        listener = RecordingCopyListener()
+        copy_manager.add_listener(listener)
+
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        copy_manager.save_item(backup_item)
+
+        self.assertEqual(listener.files, [
+            (backup_item, os.path.basename(self.source_file.name), len(self.expected_content))
+        ])
+        self.assertEqual(self.copy_manager._listeners, ())
+
     @skip_if_base_class
     def test_load_item(self):
         shutil.rmtree(self.dest_dir)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import DestinationAlreadyExistsError
+from backup.core.copy_managers import archive_copy_manager
+from backup.core.copy_managers.archive_copy_manager import ArchiveCopyManager, UnavailableCompressionError
+
+from .copy_manager_test_case import CopyManagerTestCase
+
+
+class ArchiveCopyManagerTestCase(CopyManagerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ArchiveCopyManagerTestCase, cls).setUpClass()
+
+        cls.copy_manager = ArchiveCopyManager(compression='gzip', threads=1)
+
+    def archive_path(self, extension='.tar.gz'):
+        return os.path.join(self.dest_dir, os.path.basename(self.source_dir) + extension)
+
+    def test_save_item_directory_success(self):
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        self.copy_manager.save_item(backup_item)
+
+        self.assertEqual(os.listdir(self.dest_dir), [os.path.basename(self.archive_path())])
+
+    def test_save_item_directory_dest_exists(self):
+        # Only an archive of the item counts as a collision.
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        self.copy_manager.save_item(backup_item)
+
+        with self.assertRaises(DestinationAlreadyExistsError) as exc:
+            self.copy_manager.save_item(backup_item)
+
+        self.assertEqual(exc.exception.args, ('Destination already contains colliding files',))
+
+    def test_load_item(self):
+        os.makedirs(os.path.join(self.source_dir, 'slot1'))
+        with open(os.path.join(self.source_dir, 'slot1', 'save.dat'), 'w') as f:
+            f.write(self.expected_content)
+
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+
+        load_dir = os.path.join(tempfile.mkdtemp(), os.path.basename(self.source_dir))
+        self.addCleanup(shutil.rmtree, os.path.dirname(load_dir))
+
+        self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir))
+
+        for filename in (os.path.basename(self.source_file.name), os.path.join('slot1', 'save.dat')):
+            with open(os.path.join(load_dir, filename)) as f:
+                self.assertEqual(f.read(), self.expected_content)
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir))
+
+        self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir), force=True)
+
+    def test_save_item_failure_leaves_nothing(self):
+        with mock.patch.object(ArchiveCopyManager, '_archive', side_effect=OSError(28, 'No space left on device')):
+            with self.assertRaises(OSError):
+                self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+
+        self.assertEqual(os.listdir(self.dest_dir), [])
+
+    def test_save_item_replaces_other_compression(self):
+        with open(self.archive_path('.tar.zst'), 'w') as f:
+            f.write('')
+
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir), force=True)
+
+        self.assertEqual(os.listdir(self.dest_dir), [os.path.basename(self.archive_path())])
+
+    def test_unavailable_compression(self):
+        with self.assertRaises(UnavailableCompressionError):
+            ArchiveCopyManager(compression='lzma')
+
+        with mock.patch.object(archive_copy_manager, 'zstandard', None):
+            with self.assertRaises(UnavailableCompressionError):
+                ArchiveCopyManager(compression='zstd')
+
+            self.assertEqual(ArchiveCopyManager().compression, 'gzip')
+
+
+class ZstdArchiveCopyManagerTestCase(TestCase):
+    def test_save_and_load(self):
+        if archive_copy_manager.zstandard is None:  # pragma: no cover
+            self.skipTest('zstandard is not installed')
+
+        source_dir = tempfile.mkdtemp()
+        dest_dir = tempfile.mkdtemp()
+        load_dir = os.path.join(tempfile.mkdtemp(), 'loaded')
+        self.addCleanup(shutil.rmtree, source_dir)
+        self.addCleanup(shutil.rmtree, dest_dir)
+        self.addCleanup(shutil.rmtree, os.path.dirname(load_dir))
+
+        with open(os.path.join(source_dir, 'save.dat'), 'w') as f:
+            f.write('Some save data.\n')
+
+        copy_manager = ArchiveCopyManager(compression='zstd')
+        copy_manager.save_item(BackupItem(source_dir, dest_dir))
+        copy_manager.load_item(BackupItem(load_dir, dest_dir))
+
+        self.assertTrue(os.path.exists(os.path.join(dest_dir, os.path.basename(source_dir) + '.tar.zst')))
+        with open(os.path.join(load_dir, 'save.dat')) as f:
+            self.assertEqual(f.read(), 'Some save data.\n')
@@ -0,0 +1,133 @@
+import errno
+import io
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import DestinationAlreadyExistsError
+from backup.core.copy_managers.chunk_store_copy_manager import ChunkStoreCopyManager, ContentDefinedChunker
+
+from .copy_manager_test_case import CopyManagerTestCase
+
+
+class ContentDefinedChunkerTestCase(TestCase):
+    def setUp(self):
+        super(ContentDefinedChunkerTestCase, self).setUp()
+
+        self.chunker = ContentDefinedChunker(min_size=256, avg_size=1024, max_size=4096)
+        self.data = random.Random(1).getrandbits(8 * 64 * 1024).to_bytes(64 * 1024, 'little')
+
+    def test_chunks_reassemble(self):
+        chunks = list(self.chunker.chunks(io.BytesIO(self.data)))
+
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertTrue(all(len(c) <= 4096 for c in chunks))
+        self.assertTrue(all(len(c) >= 256 for c in chunks[:-1]))
+
+    def test_chunks_resynchronize_after_insertion(self):
+        original = set(self.chunker.chunks(io.BytesIO(self.data)))
+        edited = list(self.chunker.chunks(io.BytesIO(self.data[:1000] + b'inserted' + self.data[1000:])))
+
+        # Only the chunks around the edit should differ.
+        self.assertLessEqual(len([c for c in edited if c not in original]), 2)
+
+    def test_chunks_cut_by_rolling_hash(self):
+        # The hash is computed for many bytes at once, but must cut exactly
+        #   where hashing byte by byte would.
+        def rolling_cuts(chunker, data):
+            cuts = []
+            start = 0
+            while start < len(data):
+                h = 0
+                cut = min(start + chunker.max_size, len(data))
+                for i in range(start + chunker.min_size, cut):
+                    h = ((h << 1) + chunker._GEAR[data[i]]) & ((1 << 64) - 1)
+                    if not h >> (64 - chunker.cut_bits):
+                        cut = i + 1
+                        break
+                cuts.append(cut)
+                start = cut
+            return cuts
+
+        for chunker in (self.chunker, ContentDefinedChunker(min_size=0, avg_size=2, max_size=128)):
+            for data in (self.data, bytes(10000) + self.data[:10000]):
+                cuts = list(itertools.accumulate(len(c) for c in chunker.chunks(io.BytesIO(data))))
+                self.assertEqual(cuts, rolling_cuts(chunker, data))
+
+    def test_chunks_empty(self):
+        self.assertEqual(list(self.chunker.chunks(io.BytesIO(b''))), [])
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            ContentDefinedChunker(avg_size=1000)
+
+
+class ChunkStoreCopyManagerTestCase(CopyManagerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ChunkStoreCopyManagerTestCase, cls).setUpClass()
+
+        cls.copy_manager = ChunkStoreCopyManager()
+
+    def test_save_item_directory_dest_exists(self):
+        # Only a manifest for the item counts as a collision.
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        self.copy_manager.save_item(backup_item)
+
+        with self.assertRaises(DestinationAlreadyExistsError) as exc:
+            self.copy_manager.save_item(backup_item)
+
+        self.assertEqual(exc.exception.args, ('Destination already contains colliding files',))
+
+    def test_load_item(self):
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+
+        load_dir = os.path.join(tempfile.mkdtemp(), os.path.basename(self.source_dir))
+        self.addCleanup(shutil.rmtree, os.path.dirname(load_dir))
+
+        self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir))
+
+        with open(os.path.join(load_dir, os.path.basename(self.source_file.name))) as f:
+            self.assertEqual(f.read(), self.expected_content)
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir))
+
+    def test_save_item_links(self):
+        os.symlink(os.path.join(self.source_dir, 'missing.sav'), os.path.join(self.source_dir, 'broken.sav'))
+        os.makedirs(os.path.join(self.source_dir, 'slot'))
+        os.symlink(self.source_dir, os.path.join(self.source_dir, 'slot', 'loop'))
+
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+
+        load_dir = os.path.join(tempfile.mkdtemp(), os.path.basename(self.source_dir))
+        self.addCleanup(shutil.rmtree, os.path.dirname(load_dir))
+        self.copy_manager.load_item(BackupItem(load_dir, self.dest_dir))
+
+        # The link back to the item, which was already walked, is left out.
+        self.assertEqual(sorted(os.listdir(load_dir)), sorted([os.path.basename(self.source_file.name), 'slot']))
+        self.assertEqual(os.listdir(os.path.join(load_dir, 'slot')), [])
+
+    def test_save_item_file(self):
+        with self.assertRaises(OSError) as exc:
+            self.copy_manager.save_item(BackupItem(self.source_file.name, self.dest_dir))
+
+        self.assertEqual(exc.exception.errno, errno.ENOTDIR)
+        self.assertEqual(os.listdir(self.dest_dir), [])
+
+    def test_save_item_deduplicates(self):
+        with open(os.path.join(self.source_dir, 'copy.sav'), 'w') as f:
+            f.write(self.expected_content)
+
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+        self.copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir), force=True)
+
+        chunks = []
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.dest_dir, '.chunks')):
+            chunks.extend(filenames)
+
+        self.assertEqual(len(chunks), 1)
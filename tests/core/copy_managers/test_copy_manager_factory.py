@@ -10,6 +10,19 @@ class CopyManagerFactoryTestCase(TestCase):
 
         self.assertNotEqual(native, rsync)
 
+    def test_get_with_options(self):
+        native = CopyManagerFactory.get('NativeCopyManager', incremental=True)
+
+        self.assertTrue(native.incremental)
+
+    def test_get_manager_names(self):
+        self.assertEqual(CopyManagerFactory.get_manager_names(), [
+            'ArchiveCopyManager',
+            'ChunkStoreCopyManager',
+            'NativeCopyManager',
+            'RsyncCopyManager'
+        ])
+
     def test_get_does_not_exist(self):
         with self.assertRaises(UnknownCopyManagerError) as exc:
             CopyManagerFactory.get('RaisesExceptionCopyManager')
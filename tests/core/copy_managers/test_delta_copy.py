@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core.copy_managers.delta_copy import delta_copy_file
+
+BLOCK_SIZE = 4096
+
+
+class DeltaCopyTestCase(TestCase):
+    def setUp(self):
+        super(DeltaCopyTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        patcher = patch.dict(os.environ, {'BACKUP_CACHE_DIR': os.path.join(self.temp_dir, 'cache')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.src = os.path.join(self.temp_dir, 'src.sav')
+        self.dst = os.path.join(self.temp_dir, 'dst.sav')
+        self.content = os.urandom(8 * BLOCK_SIZE + 100)
+
+        self._write(self.src, self.content)
+        shutil.copy2(self.src, self.dst)
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _change_block(self, index):
+        content = bytearray(self.content)
+        content[index * BLOCK_SIZE] ^= 0xff
+        self.content = bytes(content)
+        self._write(self.src, self.content)
+
+    def assertCopied(self):
+        with open(self.dst, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.stat(self.dst).st_mtime_ns, os.stat(self.src).st_mtime_ns)
+
+    def test_delta_copy_file_without_signature(self):
+        self._change_block(3)
+
+        self.assertEqual(delta_copy_file(self.src, self.dst, BLOCK_SIZE), BLOCK_SIZE)
+        self.assertCopied()
+
+    def test_delta_copy_file_uses_signature(self):
+        delta_copy_file(self.src, self.dst, BLOCK_SIZE)
+
+        # Blocks are compared against the signature, not the destination
+        #   itself, so a change to it that keeps its size and modification
+        #   time goes unnoticed.
+        stat = os.stat(self.dst)
+        with open(self.dst, 'r+b') as f:
+            f.seek(BLOCK_SIZE)
+            f.write(b'\0' * BLOCK_SIZE)
+        os.utime(self.dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self._change_block(5)
+
+        self.assertEqual(delta_copy_file(self.src, self.dst, BLOCK_SIZE), BLOCK_SIZE)
+        with open(self.dst, 'rb') as f:
+            content = f.read()
+        self.assertEqual(content[BLOCK_SIZE:2 * BLOCK_SIZE], b'\0' * BLOCK_SIZE)
+        self.assertEqual(content[5 * BLOCK_SIZE:], self.content[5 * BLOCK_SIZE:])
+
+    def test_delta_copy_file_ignores_stale_signature(self):
+        delta_copy_file(self.src, self.dst, BLOCK_SIZE)
+
+        # Something other than a delta copy changed the destination.
+        self._write(self.dst, b'\0' * len(self.content))
+
+        self.assertEqual(delta_copy_file(self.src, self.dst, BLOCK_SIZE), len(self.content))
+        self.assertCopied()
+
+    def test_delta_copy_file_resizes(self):
+        self.content = self.content[:2 * BLOCK_SIZE + 10]
+        self._write(self.src, self.content)
+
+        # Nothing that's left has changed, so the copy is only truncated.
+        self.assertEqual(delta_copy_file(self.src, self.dst, BLOCK_SIZE), 0)
+        self.assertCopied()
+
+        self.content += os.urandom(BLOCK_SIZE)
+        self._write(self.src, self.content)
+
+        self.assertEqual(delta_copy_file(self.src, self.dst, BLOCK_SIZE), BLOCK_SIZE + 10)
+        self.assertCopied()
@@ -0,0 +1,127 @@
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from backup.core.copy_managers import fast_copy
+from backup.core.copy_managers.fast_copy import CopyStrategy, copy_file, copy_file_with_metadata
+
+
+def unsupported(*args, **kwargs):
+    raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+
+class FastCopyTestCase(TestCase):
+    def setUp(self):
+        super(FastCopyTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.temp_dir, 'src.sav')
+        self.dst = os.path.join(self.temp_dir, 'dst.sav')
+        self.expected_content = os.urandom(3 * fast_copy.BUFFER_SIZE + 17)
+
+        with open(self.src, 'wb') as f:
+            f.write(self.expected_content)
+
+    def tearDown(self):
+        super(FastCopyTestCase, self).tearDown()
+
+        shutil.rmtree(self.temp_dir)
+
+    def assertCopied(self):
+        with open(self.dst, 'rb') as f:
+            self.assertEqual(f.read(), self.expected_content)
+
+    def test_copy_file(self):
+        strategy = copy_file(self.src, self.dst)
+
+        self.assertIn(strategy, (
+            CopyStrategy.REFLINK, CopyStrategy.COPY_FILE_RANGE, CopyStrategy.SENDFILE, CopyStrategy.BUFFERED
+        ))
+        self.assertCopied()
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    @mock.patch('os.copy_file_range', unsupported, create=True)
+    def test_copy_file_falls_back_to_sendfile(self):
+        if not hasattr(os, 'sendfile'):  # pragma: no cover
+            self.skipTest('sendfile is not available on this platform')
+
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.SENDFILE)
+        self.assertCopied()
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    @mock.patch('os.copy_file_range', unsupported, create=True)
+    @mock.patch('os.sendfile', unsupported, create=True)
+    def test_copy_file_falls_back_to_buffered(self):
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.BUFFERED)
+        self.assertCopied()
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    @mock.patch('os.copy_file_range', lambda *args: 0, create=True)
+    @mock.patch('os.sendfile', unsupported, create=True)
+    def test_copy_file_nothing_copied_falls_back(self):
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.BUFFERED)
+        self.assertCopied()
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    def test_copy_file_empty(self):
+        self.expected_content = b''
+        with open(self.src, 'wb'):
+            pass
+
+        # No copy in the kernel was made, so none is counted.
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.BUFFERED)
+        self.assertCopied()
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    @mock.patch('os.copy_file_range', unsupported, create=True)
+    @mock.patch('os.sendfile', unsupported, create=True)
+    def test_copy_file_throttled(self):
+        throttle = mock.Mock()
+
+        self.assertEqual(copy_file(self.src, self.dst, throttle), CopyStrategy.BUFFERED)
+        self.assertCopied()
+        self.assertEqual(sum(c[0][0] for c in throttle.consume.call_args_list), len(self.expected_content))
+
+    def test_copy_file_with_metadata(self):
+        os.utime(self.src, (1000000000, 1000000000))
+
+        copy_file_with_metadata(self.src, self.dst)
+
+        self.assertCopied()
+        self.assertEqual(os.stat(self.dst).st_mtime, 1000000000)
+
+    def _make_sparse_source(self):
+        # Data at the start and in the middle, with holes around it.
+        size = 16 * fast_copy.BUFFER_SIZE
+        with open(self.src, 'wb') as f:
+            f.write(b'start')
+            f.seek(size // 2)
+            f.write(b'middle')
+            f.truncate(size)
+
+        with open(self.src, 'rb') as f:
+            self.expected_content = f.read()
+
+        src_stat = os.stat(self.src)
+        if not fast_copy._is_sparse(src_stat):  # pragma: no cover
+            self.skipTest('The temporary directory does not support sparse files')
+        return src_stat
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    def test_copy_file_sparse(self):
+        src_stat = self._make_sparse_source()
+
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.SPARSE)
+        self.assertCopied()
+        self.assertLessEqual(os.stat(self.dst).st_blocks, src_stat.st_blocks)
+
+    @mock.patch('fcntl.ioctl', unsupported)
+    @mock.patch('os.copy_file_range', unsupported, create=True)
+    def test_copy_file_sparse_without_copy_file_range(self):
+        src_stat = self._make_sparse_source()
+
+        self.assertEqual(copy_file(self.src, self.dst), CopyStrategy.SPARSE)
+        self.assertCopied()
+        self.assertLessEqual(os.stat(self.dst).st_blocks, src_stat.st_blocks)
@@ -1,4 +1,13 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import DestinationAlreadyExistsError
 from backup.core.copy_managers.native_copy_manager import NativeCopyManager
+from backup.core.snapshots import SnapshotNotFoundError
 
 from .copy_manager_test_case import CopyManagerTestCase
 
@@ -9,3 +18,261 @@ class NativeCopyManagerTestCase(CopyManagerTestCase):
         super(NativeCopyManagerTestCase, cls).setUpClass()
 
         cls.copy_manager = NativeCopyManager()
+
+    def test_get_run_summary(self):
+        copy_manager = NativeCopyManager()
+        self.assertIsNone(copy_manager.get_run_summary())
+
+        shutil.rmtree(self.dest_dir)
+        copy_manager.save_item(BackupItem(self.source_dir, self.dest_dir))
+
+        self.assertEqual(sum(copy_manager.copy_strategies.values()), 1)
+        self.assertTrue(copy_manager.get_run_summary().startswith('Copied 1 files using '))
+
+    def _save_force_replacing(self):
+        copy_manager = NativeCopyManager()
+        dest_dir = os.path.join(self.dest_dir, 'copy')
+        backup_item = BackupItem(self.source_dir, dest_dir)
+        other_path = os.path.join(self.source_dir, 'other.sav')
+        with open(other_path, 'w') as f:
+            f.write('Unchanged.\n')
+
+        copy_manager.save_item(backup_item)
+        unchanged = os.stat(os.path.join(dest_dir, 'other.sav'))
+
+        with open(self.source_file.name, 'a') as f:
+            f.write('More content.\n')
+
+        copy_manager.save_item(backup_item, force=True)
+        copy_manager.close()
+
+        # Unchanged files are linked from the replaced tree, which is then
+        #   deleted.
+        self.assertEqual(os.stat(os.path.join(dest_dir, 'other.sav')).st_ino, unchanged.st_ino)
+        with open(os.path.join(dest_dir, os.path.basename(self.source_file.name))) as f:
+            self.assertEqual(f.read(), self.expected_content + 'More content.\n')
+        self.assertEqual(os.listdir(self.dest_dir), ['copy'])
+
+    def test_save_item_preserves_hard_links(self):
+        linked_path = os.path.join(self.source_dir, 'linked.sav')
+        os.link(self.source_file.name, linked_path)
+
+        dest_dir = os.path.join(self.dest_dir, 'copy')
+        self.copy_manager.save_item(BackupItem(self.source_dir, dest_dir))
+
+        copied = os.stat(os.path.join(dest_dir, os.path.basename(self.source_file.name)))
+        self.assertEqual(os.stat(os.path.join(dest_dir, 'linked.sav')).st_ino, copied.st_ino)
+        self.assertEqual(copied.st_nlink, 2)
+
+    def test_save_item_force_replaces_destination(self):
+        self._save_force_replacing()
+
+    def test_save_item_force_replaces_destination_without_exchange(self):
+        with patch('backup.core.copy_managers.native_copy_manager.exchange_paths', return_value=False):
+            self._save_force_replacing()
+
+
+class IncrementalNativeCopyManagerTestCase(CopyManagerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(IncrementalNativeCopyManagerTestCase, cls).setUpClass()
+
+        cls.copy_manager = NativeCopyManager(incremental=True)
+
+    def test_save_item_directory_dest_exists(self):
+        # Identical files aren't collisions when copying incrementally, so the
+        #   destination's copy has to actually differ from the source.
+        dest_filename = os.path.join(self.dest_dir, os.path.basename(self.source_file.name))
+        with open(dest_filename, 'w') as f:
+            f.write('Some other content.\n')
+
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        with self.assertRaises(DestinationAlreadyExistsError) as exc:
+            self.copy_manager.save_item(backup_item)
+
+        self.assertEqual(exc.exception.args, ('Destination already contains colliding files',))
+
+    def test_save_item_skips_unchanged_files(self):
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        dest_filename = os.path.join(self.dest_dir, os.path.basename(self.source_file.name))
+
+        self.copy_manager.save_item(backup_item)
+
+        # Mark the copy so that it's possible to tell if it gets rewritten.
+        stat = os.stat(dest_filename)
+        with open(dest_filename, 'w') as f:
+            f.write(self.expected_content.upper())
+        os.utime(dest_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.copy_manager.save_item(backup_item)
+
+        with open(dest_filename) as f:
+            self.assertEqual(f.read(), self.expected_content.upper())
+
+    def test_save_item_copies_changed_files_force(self):
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        dest_filename = os.path.join(self.dest_dir, os.path.basename(self.source_file.name))
+
+        self.copy_manager.save_item(backup_item)
+
+        with open(self.source_file.name, 'a') as f:
+            f.write('More content.\n')
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            self.copy_manager.save_item(backup_item)
+
+        self.copy_manager.save_item(backup_item, force=True)
+
+        with open(dest_filename) as f:
+            self.assertEqual(f.read(), self.expected_content + 'More content.\n')
+
+    def test_save_item_type_conflict(self):
+        # A file in the source where the destination has a directory.
+        conflict = os.path.join(self.dest_dir, os.path.basename(self.source_file.name))
+        os.makedirs(conflict)
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            self.copy_manager.save_item(backup_item)
+
+        self.copy_manager.save_item(backup_item, force=True)
+
+        with open(conflict) as f:
+            self.assertEqual(f.read(), self.expected_content)
+
+    def test_save_item_delete(self):
+        extra_dir = os.path.join(self.dest_dir, 'old')
+        os.makedirs(extra_dir)
+        with open(os.path.join(extra_dir, 'old.sav'), 'w') as f:
+            f.write(self.expected_content)
+
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        self.copy_manager.save_item(backup_item)
+        self.assertTrue(os.path.exists(extra_dir))
+
+        NativeCopyManager(incremental=True, delete=True).save_item(backup_item)
+        self.assertFalse(os.path.exists(extra_dir))
+        self.assertEqual(os.listdir(self.dest_dir), [os.path.basename(self.source_file.name)])
+
+    def test_save_item_preserves_hard_links_of_changed_files(self):
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        linked_path = os.path.join(self.source_dir, 'linked.sav')
+        shutil.copy2(self.source_file.name, linked_path)
+
+        self.copy_manager.save_item(backup_item)
+
+        # The two files become links to each other, and change.
+        os.unlink(linked_path)
+        os.link(self.source_file.name, linked_path)
+        with open(self.source_file.name, 'a') as f:
+            f.write('More content.\n')
+
+        self.copy_manager.save_item(backup_item, force=True)
+
+        copied = os.stat(os.path.join(self.dest_dir, os.path.basename(self.source_file.name)))
+        self.assertEqual(os.stat(os.path.join(self.dest_dir, 'linked.sav')).st_ino, copied.st_ino)
+        with open(os.path.join(self.dest_dir, 'linked.sav')) as f:
+            self.assertEqual(f.read(), self.expected_content + 'More content.\n')
+
+    def test_save_item_delta(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with patch.dict(os.environ, {'BACKUP_CACHE_DIR': cache_dir}):
+            copy_manager = NativeCopyManager(incremental=True, delta=True, delta_min_size=0, delta_block_size=8)
+            backup_item = BackupItem(self.source_dir, self.dest_dir)
+            dest_filename = os.path.join(self.dest_dir, os.path.basename(self.source_file.name))
+
+            copy_manager.save_item(backup_item)
+
+            with open(self.source_file.name, 'r+') as f:
+                f.write('THIS')
+            stat = os.stat(self.source_file.name)
+            os.utime(self.source_file.name, (stat.st_atime, stat.st_mtime + 10))
+
+            copy_manager.save_item(backup_item, force=True)
+
+        with open(dest_filename) as f:
+            self.assertEqual(f.read(), 'THIS' + self.expected_content[4:])
+        self.assertEqual(copy_manager.copy_strategies['delta'], 1)
+        self.assertEqual(copy_manager.delta_bytes_written, 8)
+        self.assertIn('delta (1)', copy_manager.get_run_summary())
+
+
+class SnapshotNativeCopyManagerTestCase(TestCase):
+    def setUp(self):
+        super(SnapshotNativeCopyManagerTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        os.makedirs(os.path.join(self.source_dir, 'slot'))
+        for name in ('a.sav', os.path.join('slot', 'b.sav')):
+            with open(os.path.join(self.source_dir, name), 'w') as f:
+                f.write('Save data for {}.\n'.format(name))
+
+        self.backup_item = BackupItem(self.source_dir, os.path.join(self.temp_dir, 'dest'))
+        self.copy_manager = NativeCopyManager(snapshots=True)
+
+    def _snapshot_path(self, snapshot, *path):
+        return os.path.join(self.backup_item.remote_path, snapshot, *path)
+
+    def test_save_item_links_unchanged_files(self):
+        self.assertEqual(self.copy_manager.get_snapshots(self.backup_item), [])
+        self.copy_manager.save_item(self.backup_item)
+
+        with open(os.path.join(self.source_dir, 'a.sav'), 'a') as f:
+            f.write('More progress.\n')
+
+        self.copy_manager.save_item(self.backup_item)
+
+        first, second = self.copy_manager.get_snapshots(self.backup_item)
+        b_sav = os.path.join('slot', 'b.sav')
+        self.assertTrue(os.path.samefile(self._snapshot_path(first, b_sav), self._snapshot_path(second, b_sav)))
+        self.assertFalse(os.path.samefile(self._snapshot_path(first, 'a.sav'), self._snapshot_path(second, 'a.sav')))
+
+        with open(self._snapshot_path(first, 'a.sav')) as f:
+            self.assertEqual(f.read(), 'Save data for a.sav.\n')
+        with open(self._snapshot_path(second, 'a.sav')) as f:
+            self.assertEqual(f.read(), 'Save data for a.sav.\nMore progress.\n')
+
+        self.assertEqual(self.copy_manager.get_transfer_paths(self.backup_item), (
+            self.source_dir, self._snapshot_path(second)
+        ))
+
+    def test_save_item_retention(self):
+        copy_manager = NativeCopyManager(snapshots=True, retention={'last': 2})
+
+        # An interrupted save leaves its snapshot staged, to be cleaned up.
+        abandoned = self._snapshot_path('.2026-01-01T000000Z.partial')
+        os.makedirs(abandoned)
+
+        for _ in range(3):
+            copy_manager.save_item(self.backup_item)
+
+        snapshots = copy_manager.get_snapshots(self.backup_item)
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(sorted(os.listdir(self.backup_item.remote_path)), snapshots)
+
+    def test_load_item(self):
+        self.copy_manager.save_item(self.backup_item)
+        with open(os.path.join(self.source_dir, 'a.sav'), 'w') as f:
+            f.write('Corrupted.\n')
+        self.copy_manager.save_item(self.backup_item)
+
+        first, second = self.copy_manager.get_snapshots(self.backup_item)
+
+        latest_dir = os.path.join(self.temp_dir, 'latest')
+        self.copy_manager.load_item(BackupItem(latest_dir, self.backup_item.remote_path))
+        with open(os.path.join(latest_dir, 'a.sav')) as f:
+            self.assertEqual(f.read(), 'Corrupted.\n')
+
+        first_dir = os.path.join(self.temp_dir, 'first')
+        self.copy_manager.load_item(BackupItem(first_dir, self.backup_item.remote_path, snapshot=first))
+        with open(os.path.join(first_dir, 'a.sav')) as f:
+            self.assertEqual(f.read(), 'Save data for a.sav.\n')
+
+        with self.assertRaises(SnapshotNotFoundError):
+            self.copy_manager.load_item(BackupItem(first_dir, self.backup_item.remote_path, snapshot='missing'))
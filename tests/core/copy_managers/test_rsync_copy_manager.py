@@ -1,11 +1,37 @@
+import asyncio
+import io
 import os
+import re
 import shutil
+import stat
+import sys
+import tempfile
+from unittest.mock import patch
 
 from backup.core.backup_item import BackupItem
 from backup.core.copy_managers import DestinationAlreadyExistsError
 from backup.core.copy_managers.rsync_copy_manager import RsyncCopyManager
+from backup.core.throttle import Throttle
 
-from .copy_manager_test_case import CopyManagerTestCase
+from .copy_manager_test_case import CopyManagerTestCase, RecordingCopyListener
+
+
+# Stands in for ssh by running the remote command locally, logging each
+#   invocation so tests can see how connections were made.
+FAKE_SSH_SCRIPT = """#!{python}
+import os
+import sys
+
+args = sys.argv[1:]
+with open({log!r}, 'a') as f:
+    f.write(' '.join(args) + '\\n')
+
+while args and args[0].startswith('-'):
+    args = args[2:]
+
+if args[1:]:
+    os.execvp('sh', ['sh', '-c', ' '.join(args[1:])])
+"""
 
 
 class RsyncCopyManagerTestCase(CopyManagerTestCase):
@@ -27,3 +53,274 @@ class RsyncCopyManagerTestCase(CopyManagerTestCase):
             self.copy_manager.save_item(backup_item)
 
         self.assertEqual(exc.exception.args, ('Destination already contains colliding files',))
+
+    def test_save_item_directory_dest_exists_keeps_existing(self):
+        # Collisions are found during the transfer itself, which stops at the
+        #   first one, and nothing on the destination is overwritten.
+        dest_subdir = os.path.join(self.dest_dir, os.path.basename(self.source_dir))
+        dest_filename = os.path.join(dest_subdir, os.path.basename(self.source_file.name))
+        os.makedirs(dest_subdir)
+        with open(dest_filename, 'w') as f:
+            f.write('Existing content.\n')
+
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            self.copy_manager.save_item(backup_item)
+
+        with open(dest_filename) as f:
+            self.assertEqual(f.read(), 'Existing content.\n')
+
+    def test_async_save_item_directory_dest_exists_keeps_existing(self):
+        dest_subdir = os.path.join(self.dest_dir, os.path.basename(self.source_dir))
+        dest_filename = os.path.join(dest_subdir, os.path.basename(self.source_file.name))
+        os.makedirs(dest_subdir)
+        with open(dest_filename, 'w') as f:
+            f.write('Existing content.\n')
+
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        async_copy_manager = self.copy_manager.get_async_copy_manager()
+
+        with self.assertRaises(DestinationAlreadyExistsError):
+            asyncio.run(async_copy_manager.save_item(backup_item))
+
+        with open(dest_filename) as f:
+            self.assertEqual(f.read(), 'Existing content.\n')
+
+    def test_save_item_collision_lists_written_files(self):
+        # Files transferred before the collision was found are left on the
+        #   destination, and listed, so they can be told apart from the files
+        #   that were already there.
+        copy_manager = RsyncCopyManager()
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        name = os.path.basename(self.source_dir)
+        output = '>bkfile 4096 {0}/\n>bkfile 12 {0}/a.sav\n{0}/b.sav exists\n'.format(name)
+
+        async_copy_manager = copy_manager.get_async_copy_manager()
+        saves = [
+            lambda: copy_manager.save_item(backup_item),
+            lambda: asyncio.run(async_copy_manager.save_item(backup_item))
+        ]
+        for save in saves:
+            with self._exit_with(copy_manager, 0, output), patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                with self.assertRaises(DestinationAlreadyExistsError):
+                    save()
+
+                self.assertEqual(stderr.getvalue(), 'Written before the collision was found:\n{}/a.sav\n'.format(name))
+
+        self.assertIn('--out-format=>bkfile %l %n', copy_manager._rsync_args(self.source_dir, self.dest_dir, False))
+
+    def test_save_items_batch(self):
+        other_source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_source_dir)
+        with open(os.path.join(other_source_dir, 'other.sav'), 'w') as f:
+            f.write(self.expected_content)
+
+        # The first item already has a copy on the remote.
+        shutil.copytree(self.source_dir, os.path.join(self.dest_dir, os.path.basename(self.source_dir)))
+
+        backup_items = [BackupItem(self.source_dir, self.dest_dir), BackupItem(other_source_dir, self.dest_dir)]
+
+        errors = RsyncCopyManager(batch=True).save_items(backup_items)
+
+        self.assertIsInstance(errors[0], DestinationAlreadyExistsError)
+        self.assertIsNone(errors[1])
+        with open(os.path.join(self.dest_dir, os.path.basename(other_source_dir), 'other.sav')) as f:
+            self.assertEqual(f.read(), self.expected_content)
+
+    def test_save_item_snapshots(self):
+        copy_manager = RsyncCopyManager(snapshots=True, retention={'last': 2})
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        source_name = os.path.basename(self.source_file.name)
+
+        for _ in range(3):
+            copy_manager.save_item(backup_item)
+
+        first, second = copy_manager.get_snapshots(backup_item)
+        snapshot_root = os.path.join(self.dest_dir, os.path.basename(self.source_dir))
+        self.assertEqual(sorted(os.listdir(snapshot_root)), [first, second])
+        self.assertTrue(os.path.samefile(
+            os.path.join(snapshot_root, first, source_name), os.path.join(snapshot_root, second, source_name)
+        ))
+
+        # Snapshots are found by the name of the item's local directory.
+        load_dir = os.path.join(self.dest_dir, 'loaded', os.path.basename(self.source_dir))
+        copy_manager.load_item(BackupItem(load_dir, self.dest_dir, snapshot=first))
+        with open(os.path.join(load_dir, source_name)) as f:
+            self.assertEqual(f.read(), self.expected_content)
+
+    def test_save_item_snapshot_failed(self):
+        copy_manager = RsyncCopyManager(snapshots=True, retention={'last': 1})
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+        snapshot_root = os.path.join(self.dest_dir, os.path.basename(self.source_dir))
+        os.makedirs(os.path.join(snapshot_root, '2020-01-01T000000Z'))
+
+        # Stands in for an rsync that fails part way through the transfer.
+        command = [sys.executable, '-c', 'import os, sys; os.makedirs(sys.argv[-1]); sys.exit(23)']
+        with patch.object(copy_manager, '_rsync_command', return_value=command):
+            with self.assertRaises(OSError):
+                copy_manager.save_item(backup_item)
+
+        self.assertEqual(os.listdir(snapshot_root), ['2020-01-01T000000Z'])
+
+    def test_is_collision(self):
+        self.assertTrue(RsyncCopyManager._is_collision(b'tmpabc/tmpdef exists'))
+        self.assertFalse(RsyncCopyManager._is_collision(b'tmpabc/tmpdef'))
+        self.assertFalse(RsyncCopyManager._is_collision(
+            b'delta-transmission disabled for local transfer or --whole-file'
+        ))
+
+        items_by_name = {'tmpabc': None}
+        self.assertFalse(RsyncCopyManager._is_collision(b'tmpabc/tmpdef exists', items_by_name, {'tmpdef': 10}))
+        self.assertTrue(RsyncCopyManager._is_collision(b'tmpabc/tmpghi exists', items_by_name, {'tmpdef': 10}))
+
+    def test_report_transfer(self):
+        copy_manager = RsyncCopyManager()
+        listener = RecordingCopyListener()
+        copy_manager.add_listener(listener)
+        first, second = BackupItem('/local/first', '/remote'), BackupItem('/local/second', '/remote')
+
+        self.assertFalse(copy_manager._report_transfer(b'first/save.dat exists', {'first': first}))
+        self.assertTrue(copy_manager._report_transfer(b'>bkfile 4096 first/', {'first': first}))
+        self.assertTrue(copy_manager._report_transfer(b'>bkfile 12 first/slot/save.dat', {'first': first}))
+        both = {'first': first, 'second': second}
+        self.assertTrue(copy_manager._report_transfer(b'>bkfile 1536 second/a b.dat', both))
+        self.assertTrue(copy_manager._report_transfer(b'>bkfile 1234567 save.dat', {None: first}))
+
+        self.assertEqual(listener.files, [
+            (first, 'slot/save.dat', 12),
+            (second, 'a b.dat', 1536),
+            (first, 'save.dat', 1234567)
+        ])
+
+        # Sizes are only ever printed as plain digits.
+        self.assertIn('--no-h', copy_manager._transfer_args())
+
+    def test_remote_host(self):
+        self.assertEqual(RsyncCopyManager._remote_host('root@192.168.0.10:/var/lib/backups'), 'root@192.168.0.10')
+        self.assertEqual(RsyncCopyManager._remote_host('host:saves'), 'host')
+        self.assertIsNone(RsyncCopyManager._remote_host('/var/lib/backups'))
+        self.assertIsNone(RsyncCopyManager._remote_host('some/dir:with/colon'))
+        self.assertIsNone(RsyncCopyManager._remote_host('host::module/path'))
+
+    def test_get_transfer_paths(self):
+        copy_manager = RsyncCopyManager()
+
+        backup_item = BackupItem('/local/saves', '/remote/root')
+        self.assertEqual(copy_manager.get_transfer_paths(backup_item), ('/local/saves', '/remote/root/saves'))
+        self.assertEqual(copy_manager.get_transfer_paths(BackupItem('/local/saves/', '/remote/root')),
+                         ('/local/saves/', '/remote/root/'))
+
+        backup_item = BackupItem('/local/saves', '/remote/root/saves')
+        self.assertEqual(copy_manager.get_transfer_paths(backup_item, loading=True),
+                         ('/remote/root/saves', '/local/saves/saves'))
+
+        self.assertIsNone(copy_manager.get_transfer_paths(BackupItem('/local/saves', 'host:/remote/root')))
+        self.assertIsNone(copy_manager.get_transfer_paths(BackupItem('/local/saves', 'rsync://host/module')))
+
+    def test_rsync_command_multiplexed(self):
+        copy_manager = RsyncCopyManager(ssh_multiplex=True)
+        self.addCleanup(copy_manager.close)
+
+        self.assertEqual(copy_manager._rsync_command(self.source_dir, self.dest_dir), ['rsync'])
+
+        command = copy_manager._rsync_command(self.source_dir, 'host:/saves')
+        self.assertEqual(command[:2], ['rsync', '-e'])
+        self.assertIn('ControlMaster=auto', command[2])
+        self.assertIn('ControlPath={}'.format(os.path.join(copy_manager._control_dir, '%C')), command[2])
+
+    def test_rsync_command_throttled(self):
+        copy_manager = RsyncCopyManager()
+        throttle = Throttle(bandwidth='4M', nice=10, ionice='idle', max_transfers=2)
+        copy_manager.set_throttle(throttle)
+
+        with patch('backup.core.throttle.shutil.which', return_value='/usr/bin/tool'):
+            command = copy_manager._rsync_command(self.source_dir, self.dest_dir)
+            self.assertEqual(command, ['nice', '-n', '10', 'ionice', '-c', '3', 'rsync', '--bwlimit=4096'])
+
+            # The bandwidth is divided between transfers running at once.
+            throttle.limit_concurrency(4)
+            self.assertEqual(copy_manager._rsync_command(self.source_dir, self.dest_dir)[-1], '--bwlimit=2048')
+
+    def test_load_item_snapshot_over_ssh(self):
+        copy_manager = RsyncCopyManager(snapshots=True)
+        backup_item = BackupItem(self.source_dir, 'host:/saves')
+        snapshot = '2020-01-01T000000Z'
+
+        with patch.object(copy_manager, '_list_directory', return_value=[snapshot]), \
+                patch('backup.core.copy_managers.rsync_copy_manager.subprocess.Popen') as popen:
+            popen.return_value.returncode = 0
+            copy_manager.load_item(backup_item, force=True)
+
+        # The remote snapshot isn't looked for locally.
+        src = 'host:/saves/{}/{}/'.format(os.path.basename(self.source_dir), snapshot)
+        self.assertEqual(popen.call_args[0][0][-2:], [src, self.source_dir])
+
+    def test_rsync_exit_status(self):
+        copy_manager = RsyncCopyManager()
+        backup_item = BackupItem(self.source_dir, self.dest_dir)
+
+        for status, force in [(12, False), (23, True), (255, False)]:
+            with self.subTest(status=status), self._exit_with(copy_manager, status):
+                with self.assertRaises(OSError):
+                    copy_manager.save_item(backup_item, force)
+                with self.assertRaises(OSError):
+                    asyncio.run(copy_manager.get_async_copy_manager().save_item(backup_item, force))
+
+        # Files that vanished while saving were only deleted.
+        with self._exit_with(copy_manager, 24):
+            copy_manager.save_item(backup_item)
+            asyncio.run(copy_manager.get_async_copy_manager().save_item(backup_item))
+
+    def test_save_items_batch_exit_status(self):
+        other_source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_source_dir)
+        copy_manager = RsyncCopyManager(batch=True)
+        backup_items = [BackupItem(self.source_dir, self.dest_dir), BackupItem(other_source_dir, self.dest_dir)]
+
+        with self._exit_with(copy_manager, 23):
+            errors = copy_manager.save_items(backup_items)
+
+        self.assertIsInstance(errors[0], OSError)
+        self.assertIsInstance(errors[1], OSError)
+
+        # Items that collided are reported as such, whatever else failed.
+        collision = '{}/save.dat exists\n'.format(os.path.basename(self.source_dir))
+        with self._exit_with(copy_manager, 23, collision):
+            errors = copy_manager.save_items(backup_items)
+
+        self.assertIsInstance(errors[0], DestinationAlreadyExistsError)
+        self.assertNotIsInstance(errors[1], DestinationAlreadyExistsError)
+        self.assertIsInstance(errors[1], OSError)
+
+    @staticmethod
+    def _exit_with(copy_manager, status, output=''):
+        """Have the copy manager run a process that prints output and exits
+        with status in place of rsync.
+        """
+        command = [sys.executable, '-c', 'import sys; sys.stdout.write({!r}); sys.exit({})'.format(output, status)]
+        return patch.object(copy_manager, '_rsync_command', return_value=command)
+
+    def test_save_item_ssh_multiplex(self):
+        ssh_log = os.path.join(self.dest_dir, 'ssh.log')
+        fake_ssh = os.path.join(self.source_dir, 'ssh')
+        with open(fake_ssh, 'w') as f:
+            f.write(FAKE_SSH_SCRIPT.format(python=sys.executable, log=ssh_log))
+        os.chmod(fake_ssh, os.stat(fake_ssh).st_mode | stat.S_IXUSR)
+
+        copy_manager = RsyncCopyManager(ssh_multiplex=True, ssh_command=fake_ssh)
+        self.addCleanup(copy_manager.close)
+        remote_dir = os.path.join(self.dest_dir, 'remote')
+        copy_manager.save_item(BackupItem(self.source_dir, 'localhost:' + remote_dir))
+        copy_manager.save_item(BackupItem(self.source_dir, 'localhost:' + remote_dir), force=True)
+        copy_manager.close()
+
+        with open(ssh_log) as f:
+            invocations = f.read().splitlines()
+
+        # Every connection, including the one that closes the master, has to
+        #   go through the same control socket.
+        self.assertEqual(len(invocations), 3)
+        self.assertEqual(len({re.search(r'ControlPath=(\S+)', i).group(1) for i in invocations}), 1)
+        self.assertIn('-O exit localhost', invocations[2])
+        self.assertTrue(os.path.exists(os.path.join(remote_dir, os.path.basename(self.source_dir))))
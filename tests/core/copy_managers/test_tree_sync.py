@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from backup.core.copy_managers.tree_sync import TreeSync, walk
+
+
+class TreeSyncTestCase(TestCase):
+    def setUp(self):
+        super(TreeSyncTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        self.src = os.path.join(self.temp_dir, 'src')
+        self.dst = os.path.join(self.temp_dir, 'dst')
+        os.makedirs(os.path.join(self.src, 'slot'))
+        for name in ('a.sav', os.path.join('slot', 'b.sav')):
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write('Save data for {}.\n'.format(name))
+
+    def test_walk_skips_link_cycles(self):
+        os.symlink(self.src, os.path.join(self.src, 'slot', 'loop'))
+
+        walked = [os.path.relpath(dirpath, self.src) for dirpath, dirnames, filenames in walk(self.src)]
+
+        self.assertEqual(walked, [os.curdir, 'slot'])
+
+    def test_sync_replaces_type_conflicts(self):
+        # Each path is a file on one side and a directory on the other.
+        os.makedirs(os.path.join(self.dst, 'a.sav'))
+        with open(os.path.join(self.dst, 'a.sav', 'old.sav'), 'w') as f:
+            f.write('Old.\n')
+        with open(os.path.join(self.dst, 'slot'), 'w') as f:
+            f.write('Old.\n')
+
+        tree_sync = TreeSync(self.src, self.dst, delete=True)
+        plan = tree_sync.scan()
+
+        self.assertEqual(sorted(plan.replaced), ['a.sav', 'slot'])
+        self.assertEqual(plan.extraneous, [])
+
+        tree_sync.apply(plan)
+
+        with open(os.path.join(self.dst, 'a.sav')) as f:
+            self.assertEqual(f.read(), 'Save data for a.sav.\n')
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, 'slot', 'b.sav')))
+        self.assertFalse(tree_sync.scan().has_changes)
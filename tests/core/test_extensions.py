@@ -1,14 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 
-from backup.core.extensions import BackupExtension
+from backup.core.extensions import BackupExtension, EXTENSIONS_CACHE_FILENAME
 
 
 class ExtensionsTestCase(TestCase):
+    def setUp(self):
+        super(ExtensionsTestCase, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+        patcher = patch.dict(os.environ, {'BACKUP_CACHE_DIR': self.cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_get_all_extensions(self):
         extensions = BackupExtension.get_all_extensions()
 
         self.assertEqual(len(extensions), 1)
 
+    def test_get_extensions_metadata(self):
+        metadata = BackupExtension.get_extensions_metadata()
+
+        self.assertEqual([(m.name, m.module_dirname) for m in metadata], [('games', 'games')])
+        self.assertEqual(metadata[0].help, 'save and load game saves')
+
+        extension = BackupExtension.load_extension(metadata[0].module_dirname)
+        self.assertEqual(extension.get_extension_name(), 'games')
+
+    def test_get_extensions_metadata_uses_cache(self):
+        BackupExtension.get_extensions_metadata()
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, EXTENSIONS_CACHE_FILENAME)))
+
+        with patch.object(BackupExtension, 'load_extension') as load_extension:
+            metadata = BackupExtension.get_extensions_metadata()
+
+        load_extension.assert_not_called()
+        self.assertEqual([m.name for m in metadata], ['games'])
+
+    def test_get_extensions_metadata_stale_cache(self):
+        BackupExtension.get_extensions_metadata()
+
+        cache_path = os.path.join(self.cache_dir, EXTENSIONS_CACHE_FILENAME)
+        with open(cache_path) as f:
+            cache = json.load(f)
+        cache['extensions']['games']['mtime_ns'] -= 1
+        cache['extensions']['games']['name'] = 'stale'
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f)
+
+        metadata = BackupExtension.get_extensions_metadata()
+        self.assertEqual([m.name for m in metadata], ['games'])
+
     def test_get_system_platform_this_platform_supported(self):
         p = BackupExtension.get_system_platform()
         self.assertIsNotNone(p)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers.copy_manager import ICopyManager
+from backup.core.file_index import FileStateIndex, IndexedCopyManager, scan_tree
+
+
+class CountingCopyManager(ICopyManager):
+    def __init__(self):
+        self.saves = 0
+        self.loads = 0
+
+    def save_item(self, backup_item, force=False):
+        self.saves += 1
+
+    def load_item(self, backup_item, force=False):
+        self.loads += 1
+
+
+class FileIndexTestCase(TestCase):
+    def setUp(self):
+        super(FileIndexTestCase, self).setUp()
+
+        self.source_dir = tempfile.mkdtemp()
+        self.index_dir = tempfile.mkdtemp()
+
+        os.makedirs(os.path.join(self.source_dir, 'slot1'))
+        with open(os.path.join(self.source_dir, 'slot1', 'save.dat'), 'w') as f:
+            f.write('Some save data.\n')
+
+        self.index = FileStateIndex(os.path.join(self.index_dir, 'index.sqlite3'))
+        self.inner = CountingCopyManager()
+        self.copy_manager = IndexedCopyManager(self.inner, self.index)
+        self.backup_item = BackupItem(self.source_dir, '/some/remote')
+
+    def tearDown(self):
+        super(FileIndexTestCase, self).tearDown()
+
+        self.index.close()
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.index_dir)
+
+    def test_scan_tree(self):
+        states = scan_tree(self.source_dir)
+
+        self.assertEqual(list(states), [os.path.join('slot1', 'save.dat')])
+        self.assertEqual(states[os.path.join('slot1', 'save.dat')].size, 16)
+
+    def test_scan_tree_links(self):
+        os.symlink(os.path.join(self.source_dir, 'missing.dat'), os.path.join(self.source_dir, 'broken.dat'))
+        os.symlink(self.source_dir, os.path.join(self.source_dir, 'slot1', 'loop'))
+
+        states = scan_tree(self.source_dir)
+
+        self.assertEqual(sorted(states), ['broken.dat', os.path.join('slot1', 'save.dat')])
+
+    def test_scan_tree_file(self):
+        save_path = os.path.join(self.source_dir, 'slot1', 'save.dat')
+
+        states = scan_tree(save_path)
+
+        self.assertEqual(list(states), [''])
+        self.assertEqual(states[''].size, 16)
+
+    def test_save_item_skips_unchanged(self):
+        self.copy_manager.save_item(self.backup_item)
+        self.copy_manager.save_item(self.backup_item)
+
+        self.assertEqual(self.inner.saves, 1)
+
+    def test_async_save_item_skips_unchanged(self):
+        async_copy_manager = self.copy_manager.get_async_copy_manager()
+        asyncio.run(async_copy_manager.save_item(self.backup_item))
+        asyncio.run(async_copy_manager.save_item(self.backup_item))
+
+        self.assertEqual(self.inner.saves, 1)
+
+        asyncio.run(async_copy_manager.load_item(self.backup_item))
+        asyncio.run(async_copy_manager.save_item(self.backup_item))
+
+        self.assertEqual(self.inner.loads, 1)
+        self.assertEqual(self.inner.saves, 2)
+
+    def test_save_item_changed(self):
+        self.copy_manager.save_item(self.backup_item)
+
+        with open(os.path.join(self.source_dir, 'slot2.dat'), 'w') as f:
+            f.write('More save data.\n')
+
+        self.copy_manager.save_item(self.backup_item)
+
+        self.assertEqual(self.inner.saves, 2)
+
+    def test_save_item_different_remote(self):
+        self.copy_manager.save_item(self.backup_item)
+        self.copy_manager.save_item(BackupItem(self.source_dir, '/some/other/remote'))
+
+        self.assertEqual(self.inner.saves, 2)
+
+    def test_save_item_force_not_skipped(self):
+        self.copy_manager.save_item(self.backup_item)
+        self.copy_manager.save_item(self.backup_item, force=True)
+        asyncio.run(self.copy_manager.get_async_copy_manager().save_item(self.backup_item, force=True))
+        self.copy_manager.save_items([self.backup_item], force=True)
+
+        self.assertEqual(self.inner.saves, 4)
+
+    def test_save_item_failure_not_recorded(self):
+        def fail(backup_item, force=False):
+            raise OSError(5, 'Input/output error')
+
+        self.inner.save_item = fail
+        with self.assertRaises(OSError):
+            self.copy_manager.save_item(self.backup_item)
+
+        self.assertIsNone(self.index.get_states(self.backup_item))
+
+    def test_load_item_forgets_item(self):
+        self.copy_manager.save_item(self.backup_item)
+        self.copy_manager.load_item(self.backup_item)
+        self.copy_manager.save_item(self.backup_item)
+
+        self.assertEqual(self.inner.saves, 2)
+        self.assertEqual(self.inner.loads, 1)
+
+    def test_record_keeps_hashes(self):
+        states = scan_tree(self.source_dir)
+        states[os.path.join('slot1', 'save.dat')].hash = 'abc'
+        self.index.record(self.backup_item, states)
+
+        self.index.record(self.backup_item, scan_tree(self.source_dir))
+
+        recorded = self.index.get_states(self.backup_item)
+        self.assertEqual(recorded[os.path.join('slot1', 'save.dat')].hash, 'abc')
+
+    def test_save_items_skips_unchanged(self):
+        other_item = BackupItem(os.path.join(self.source_dir, 'slot1'), '/some/remote')
+        self.copy_manager.save_item(self.backup_item)
+
+        errors = self.copy_manager.save_items([self.backup_item, other_item])
+
+        self.assertEqual(errors, [None, None])
+        self.assertEqual(self.inner.saves, 2)
+        self.assertIsNotNone(self.index.get_states(other_item))
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import NativeCopyManager, RsyncCopyManager
+from backup.core.journal import ResumableCopyManager, TransferJournal
+
+
+class InterruptedCopyManager(NativeCopyManager):
+    """Stops, as if interrupted, once it's copied a number of files."""
+    def __init__(self, files_before_interrupt):
+        super(InterruptedCopyManager, self).__init__()
+        self.files_before_interrupt = files_before_interrupt
+        self.copied = []
+
+    def _copy_file(self, src, dst):
+        if len(self.copied) == self.files_before_interrupt:
+            raise KeyboardInterrupt
+        super(InterruptedCopyManager, self)._copy_file(src, dst)
+        self.copied.append(os.path.basename(src))
+
+
+class JournalTestCase(TestCase):
+    def setUp(self):
+        super(JournalTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        self.journal_path = os.path.join(self.temp_dir, 'journals', 'run.jsonl')
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        os.makedirs(self.source_dir)
+        for name in ('a.sav', 'b.sav', 'c.sav'):
+            with open(os.path.join(self.source_dir, name), 'w') as f:
+                f.write('Save data for {}.\n'.format(name))
+
+        self.backup_item = BackupItem(self.source_dir, os.path.join(self.temp_dir, 'dest'))
+        self.other_item = BackupItem(self.source_dir, os.path.join(self.temp_dir, 'other'))
+
+    def test_journal_resume(self):
+        journal = TransferJournal(self.journal_path)
+        journal.file_copied(self.backup_item, 'a.sav', 10)
+        journal.item_completed(self.other_item)
+        journal.close()
+
+        # An entry cut short by an interruption is ignored.
+        with open(self.journal_path, 'a') as f:
+            f.write('{"path": "b.sav", "si')
+
+        journal = TransferJournal(self.journal_path, resume=True)
+        self.assertEqual(journal.get_completed_files(self.backup_item), {'a.sav': 10})
+        self.assertFalse(journal.is_complete(self.backup_item))
+        self.assertTrue(journal.is_complete(self.other_item))
+        journal.close()
+
+        journal = TransferJournal(self.journal_path)
+        self.assertEqual(journal.get_completed_files(self.backup_item), {})
+        self.assertFalse(journal.is_complete(self.other_item))
+
+        journal.discard()
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_interrupted_save_resumes(self):
+        journal = TransferJournal(self.journal_path)
+        copy_manager = ResumableCopyManager(InterruptedCopyManager(2), journal)
+
+        with self.assertRaises(KeyboardInterrupt):
+            copy_manager.save_items([self.other_item, self.backup_item])
+        journal.close()
+
+        # Only complete copies are ever moved into place.
+        self.assertFalse(os.path.exists(self.backup_item.remote_path))
+        self.assertFalse(os.path.exists(self.other_item.remote_path))
+
+        journal = TransferJournal(self.journal_path, resume=True)
+        inner = InterruptedCopyManager(None)
+        copy_manager = ResumableCopyManager(inner, journal)
+        errors = copy_manager.save_items([self.other_item, self.backup_item])
+        journal.discard()
+
+        self.assertEqual(errors, [None, None])
+        self.assertEqual(sorted(inner.copied), ['a.sav', 'b.sav', 'c.sav', 'c.sav'])
+        for item in (self.other_item, self.backup_item):
+            self.assertEqual(sorted(os.listdir(item.remote_path)), ['a.sav', 'b.sav', 'c.sav'])
+
+    def test_completed_items_skipped(self):
+        journal = TransferJournal(self.journal_path)
+        copy_manager = ResumableCopyManager(NativeCopyManager(), journal)
+        copy_manager.save_item(self.backup_item)
+        journal.close()
+
+        # Saving again would otherwise collide with the first copy.
+        journal = TransferJournal(self.journal_path, resume=True)
+        copy_manager = ResumableCopyManager(NativeCopyManager(), journal)
+        copy_manager.save_item(self.backup_item)
+        asyncio.run(copy_manager.get_async_copy_manager().save_items([self.backup_item, self.other_item]))
+        journal.close()
+
+        self.assertEqual(sorted(os.listdir(self.other_item.remote_path)), ['a.sav', 'b.sav', 'c.sav'])
+
+    def test_failed_items_not_completed(self):
+        inner = RsyncCopyManager()
+        # Stands in for an rsync that fails part way through the transfer.
+        command = [sys.executable, '-c', 'import sys; sys.exit(23)']
+        journal = TransferJournal(self.journal_path)
+        copy_manager = ResumableCopyManager(inner, journal)
+        with patch.object(inner, '_rsync_command', return_value=command):
+            with self.assertRaises(OSError):
+                copy_manager.save_item(self.backup_item)
+            errors = copy_manager.save_items([self.other_item])
+            asyncio.run(copy_manager.get_async_copy_manager().save_items([self.other_item]))
+        journal.close()
+
+        self.assertIsInstance(errors[0], OSError)
+        journal = TransferJournal(self.journal_path, resume=True)
+        self.assertFalse(journal.is_complete(self.backup_item))
+        self.assertFalse(journal.is_complete(self.other_item))
+
+    def test_journal_replaced_once_written(self):
+        journal = TransferJournal(self.journal_path)
+        journal.item_completed(self.other_item)
+        journal.close()
+
+        # A run that copies nothing leaves the last run's journal alone.
+        TransferJournal(self.journal_path).close()
+        self.assertTrue(TransferJournal(self.journal_path, resume=True).is_complete(self.other_item))
+
+        journal = TransferJournal(self.journal_path)
+        journal.item_completed(self.backup_item)
+        journal.close()
+        self.assertFalse(TransferJournal(self.journal_path, resume=True).is_complete(self.other_item))
+
+    def test_close_detaches_journal(self):
+        inner = NativeCopyManager()
+        journal = TransferJournal(self.journal_path)
+        copy_manager = ResumableCopyManager(inner, journal)
+        copy_manager.save_item(self.backup_item)
+        copy_manager.close()
+
+        # Later copies by the wrapped copy manager aren't journaled.
+        inner.save_item(self.other_item)
+        journal = TransferJournal(self.journal_path, resume=True)
+        self.assertTrue(journal.is_complete(self.backup_item))
+        self.assertEqual(journal.get_completed_files(self.other_item), {})
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core import profiling
+from backup.core.backup_item import BackupItem
+from backup.core.profiling import PhaseProfiler
+
+
+class ProfilingTestCase(TestCase):
+    def test_span_nesting(self):
+        profiler = PhaseProfiler()
+        with profiler.span('outer'):
+            with profiler.span('inner'):
+                pass
+        with profiler.span('after'):
+            pass
+
+        self.assertEqual([(s.name, s.depth) for s in profiler.spans], [('inner', 1), ('outer', 0), ('after', 0)])
+
+        report = profiler.report()
+        self.assertEqual(len(report), 3)
+        self.assertTrue(report[0].endswith(' ms  outer'))
+        self.assertTrue(report[1].endswith(' ms    inner'))
+
+    def test_item_finished(self):
+        profiler = PhaseProfiler()
+        profiler.item_finished(BackupItem('/local/saves', '/remote'), False, 0.5, None)
+        profiler.item_finished(BackupItem('/local/saves', '/remote'), True, 0.25, None)
+
+        self.assertEqual([s.name for s in profiler.spans], ['save /local/saves', 'load /local/saves'])
+        self.assertEqual(profiler.spans[0].duration, 0.5)
+
+    def test_span_disabled(self):
+        with patch.object(profiling, '_profiler', None):
+            with profiling.span('ignored'):
+                pass
+            self.assertIsNone(profiling.get_profiler())
+
+            profiler = profiling.enable()
+            self.assertIs(profiling.enable(), profiler)
+            with profiling.span('recorded'):
+                pass
+
+        self.assertEqual([s.name for s in profiler.spans], ['recorded'])
+
+    def test_import_loads_no_copy_managers(self):
+        # Profiling starts before anything else, so importing it mustn't pay
+        #   for loading every copy manager.
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys; import backup.core.profiling; print("backup.core.copy_managers" in sys.modules)'
+        ])
+        self.assertEqual(output.strip(), b'False')
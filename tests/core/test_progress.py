@@ -0,0 +1,82 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import NativeCopyManager
+from backup.core.progress import ObservedCopyManager, ProgressRenderer, TransferMetrics
+
+
+class ProgressTestCase(TestCase):
+    def setUp(self):
+        super(ProgressTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        os.makedirs(os.path.join(self.source_dir, 'slot'))
+        for name in ('a.sav', os.path.join('slot', 'b.sav')):
+            with open(os.path.join(self.source_dir, name), 'wb') as f:
+                f.write(b'x' * 1024)
+
+        self.backup_item = BackupItem(self.source_dir, os.path.join(self.temp_dir, 'dest'))
+        self.copy_manager = ObservedCopyManager(NativeCopyManager())
+
+    def test_transfer_metrics(self):
+        metrics = TransferMetrics()
+        self.copy_manager.add_listener(metrics)
+
+        self.copy_manager.save_item(self.backup_item)
+
+        item_metrics, = metrics.get_item_metrics()
+        self.assertIs(item_metrics.backup_item, self.backup_item)
+        self.assertEqual(item_metrics.files, 2)
+        self.assertEqual(item_metrics.bytes, 2048)
+        self.assertIsNotNone(item_metrics.duration)
+        self.assertIsNone(item_metrics.error)
+
+    def test_transfer_metrics_failures(self):
+        metrics = TransferMetrics()
+        self.copy_manager.add_listener(metrics)
+
+        missing_item = BackupItem(os.path.join(self.temp_dir, 'missing'), self.backup_item.remote_path)
+        errors = self.copy_manager.save_items([missing_item, self.backup_item])
+        with self.assertRaises(OSError) as exc:
+            self.copy_manager.load_item(BackupItem(self.source_dir, os.path.join(self.temp_dir, 'missing')))
+
+        item_metrics = metrics.get_item_metrics()
+        self.assertEqual([m.files for m in item_metrics], [0, 2, 0])
+        self.assertEqual([m.error for m in item_metrics], [errors[0], None, exc.exception])
+
+    def test_transfer_metrics_async(self):
+        metrics = TransferMetrics()
+        self.copy_manager.add_listener(metrics)
+
+        missing_item = BackupItem(os.path.join(self.temp_dir, 'missing'), self.backup_item.remote_path)
+        async_copy_manager = self.copy_manager.get_async_copy_manager()
+        errors = asyncio.run(async_copy_manager.save_items([missing_item, self.backup_item]))
+
+        item_metrics = sorted(metrics.get_item_metrics(), key=lambda m: m.files)
+        self.assertEqual([m.backup_item for m in item_metrics], [missing_item, self.backup_item])
+        self.assertEqual([m.files for m in item_metrics], [0, 2])
+        self.assertEqual([m.error for m in item_metrics], errors)
+
+    def test_progress_renderer(self):
+        stream = io.StringIO()
+        progress = ProgressRenderer(stream, total_items=1, describe_item=lambda item: 'Some Game')
+        self.copy_manager.add_listener(progress)
+
+        self.copy_manager.save_item(self.backup_item)
+        progress.finish()
+        progress.finish()
+
+        lines = stream.getvalue().split('\r')
+        self.assertTrue(lines[1].startswith('0/1 done, 0 files, 0.0 MB'))
+        self.assertTrue(lines[1].rstrip().endswith(' - Some Game'))
+        self.assertTrue(lines[-1].startswith('1/1 done, 2 files, 0.0 MB'))
+        self.assertTrue(stream.getvalue().endswith('\n'))
+        self.assertEqual(stream.getvalue().count('\n'), 1)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+from backup.core.snapshots import RetentionPolicy, SnapshotNotFoundError, new_snapshot_name, select_snapshot
+from backup.core.snapshots import sort_snapshot_names
+
+
+def names_at(*times):
+    return [new_snapshot_name(now=t) for t in times]
+
+
+class SnapshotsTestCase(TestCase):
+    def test_new_snapshot_name(self):
+        now = datetime(2026, 10, 17, 12, 30, 5, tzinfo=timezone.utc)
+
+        self.assertEqual(new_snapshot_name(now=now), '2026-10-17T123005Z')
+        self.assertEqual(new_snapshot_name(['2026-10-17T123005Z'], now), '2026-10-17T123005Z-1')
+        self.assertEqual(
+            new_snapshot_name(['2026-10-17T123005Z', '2026-10-17T123005Z-1'], now), '2026-10-17T123005Z-2'
+        )
+
+    def test_sort_snapshot_names(self):
+        names = ['2026-10-17T123005Z-10', '.2026-10-17T123006Z.partial', '2026-10-17T123005Z-9', 'other',
+                 '2026-10-17T123005Z', '2026-01-01T000000Z']
+
+        self.assertEqual(sort_snapshot_names(names), [
+            '2026-01-01T000000Z', '2026-10-17T123005Z', '2026-10-17T123005Z-9', '2026-10-17T123005Z-10'
+        ])
+
+    def test_select_snapshot(self):
+        names = ['2026-10-17T123005Z', '2026-01-01T000000Z']
+
+        self.assertEqual(select_snapshot(names), '2026-10-17T123005Z')
+        self.assertEqual(select_snapshot(names, '2026-01-01T000000Z'), '2026-01-01T000000Z')
+
+        with self.assertRaises(SnapshotNotFoundError) as exc:
+            select_snapshot(names, '2025-01-01T000000Z')
+        self.assertIn('Try one of the following:\n  2026-10-17T123005Z\n  2026-01-01T000000Z', str(exc.exception))
+
+        with self.assertRaises(SnapshotNotFoundError):
+            select_snapshot([])
+
+    def test_retention_policy(self):
+        start = datetime(2026, 10, 1, 0, 0, tzinfo=timezone.utc)
+        # A snapshot every 20 minutes for three weeks.
+        names = names_at(*(start + timedelta(minutes=20 * i) for i in range(3 * 7 * 24 * 3)))
+
+        expired = RetentionPolicy(last=2, hourly=3, daily=2, weekly=3).select_expired(names)
+        kept = [name for name in names if name not in expired]
+
+        self.assertEqual(kept, [
+            '2026-10-11T234000Z',  # Weekly
+            '2026-10-18T234000Z',  # Weekly
+            '2026-10-20T234000Z',  # Daily
+            '2026-10-21T214000Z',  # Hourly
+            '2026-10-21T224000Z',  # Hourly
+            '2026-10-21T232000Z',  # Last
+            '2026-10-21T234000Z'   # Last, hourly, daily, and weekly
+        ])
+
+    def test_retention_policy_keeps_latest(self):
+        names = ['2026-10-17T123005Z', '2026-01-01T000000Z']
+
+        self.assertEqual(RetentionPolicy(last=0).select_expired(names), ['2026-01-01T000000Z'])
+        self.assertIsNone(RetentionPolicy.from_option(None))
+        with self.assertRaises(TypeError):
+            RetentionPolicy.from_option({'monthly': 3})
@@ -0,0 +1,101 @@
+import io
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core.throttle import InvalidThrottleError, Throttle, ThrottledFile, TokenBucket, parse_rate
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ThrottleTestCase(TestCase):
+    def setUp(self):
+        super(ThrottleTestCase, self).setUp()
+
+        self.clock = FakeClock()
+        patcher = patch('backup.core.throttle.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate(1000), 1000)
+        self.assertEqual(parse_rate('512K'), 512 * 1024)
+        self.assertEqual(parse_rate('10MB/s'), 10 * 1024 * 1024)
+        self.assertEqual(parse_rate('1.5 GiB'), 1.5 * 1024 ** 3)
+
+        for value in ('fast', '-1', 0, True):
+            with self.assertRaises(InvalidThrottleError):
+                parse_rate(value)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(100)
+
+        # A second's worth can be taken at once.
+        bucket.consume(100)
+        self.assertEqual(self.clock.sleeps, [])
+
+        # After that, takers wait for what they've taken.
+        bucket.consume(50)
+        bucket.consume(100)
+        self.assertEqual(self.clock.sleeps, [0.5, 1.0])
+
+        # Time spent idle refills the bucket, but no more than its burst.
+        self.clock.now += 10
+        bucket.consume(100)
+        bucket.consume(100)
+        self.assertEqual(self.clock.sleeps, [0.5, 1.0, 1.0])
+
+    def test_throttle_from_option(self):
+        self.assertIsNone(Throttle.from_option(None))
+
+        throttle = Throttle.from_option({'bandwidth': '1M', 'max_transfers': 2})
+        self.assertEqual(throttle.bandwidth, 1024 * 1024)
+        self.assertEqual(throttle.max_transfers, 2)
+
+        for option in ('1M', {'bandwidth': 'fast'}, {'ionice': 'low'}, {'max_transfers': 0}, {'speed': 1}):
+            with self.assertRaises(InvalidThrottleError):
+                Throttle.from_option(option)
+
+    def test_throttle_limit_concurrency(self):
+        throttle = Throttle(bandwidth=1000, max_transfers=2)
+        self.assertEqual(throttle.get_transfer_rate(), 1000)
+
+        self.assertEqual(throttle.limit_concurrency(4), 2)
+        self.assertEqual(throttle.get_transfer_rate(), 500)
+        self.assertEqual(throttle.limit_concurrency(1), 1)
+        self.assertEqual(throttle.get_transfer_rate(), 1000)
+
+        self.assertIsNone(Throttle().get_transfer_rate())
+        self.assertEqual(Throttle().limit_concurrency(8), 8)
+
+    def test_throttle_command_prefix(self):
+        self.assertEqual(Throttle(bandwidth=1000).get_command_prefix(), [])
+
+        throttle = Throttle(nice=5, ionice='best-effort')
+        with patch('backup.core.throttle.shutil.which', return_value='/usr/bin/tool'):
+            self.assertEqual(throttle.get_command_prefix(), ['nice', '-n', '5', 'ionice', '-c', '2'])
+
+        # Tools that aren't installed are skipped.
+        with patch('backup.core.throttle.shutil.which', return_value=None):
+            self.assertEqual(throttle.get_command_prefix(), [])
+
+    def test_throttled_file(self):
+        throttle = Throttle(bandwidth=100)
+        f = ThrottledFile(io.BytesIO(), throttle)
+
+        f.write(b'x' * 150)
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+        f.seek(0)
+        self.assertEqual(f.read(), b'x' * 150)
+        self.assertEqual(self.clock.sleeps, [0.5, 1.5])
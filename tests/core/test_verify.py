@@ -0,0 +1,104 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from backup.core import verify
+from backup.core.backup_item import BackupItem
+from backup.core.copy_managers import ArchiveCopyManager, NativeCopyManager
+from backup.core.file_index import FileStateIndex, IndexedCopyManager
+from backup.core.verify import TreeVerifier, hash_file
+
+
+class VerifyTestCase(TestCase):
+    def setUp(self):
+        super(VerifyTestCase, self).setUp()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        self.dest_dir = os.path.join(self.temp_dir, 'dest')
+        for name, content in (('a.sav', b'first save'), (os.path.join('slot', 'b.sav'), b'second save')):
+            path = os.path.join(self.source_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+        self.backup_item = BackupItem(self.source_dir, self.dest_dir)
+        self.copy_manager = NativeCopyManager()
+        self.copy_manager.save_item(self.backup_item)
+
+        self.verifier = TreeVerifier(jobs=2)
+        self.addCleanup(self.verifier.close)
+
+    def test_hash_file(self):
+        path = os.path.join(self.source_dir, 'a.sav')
+        self.assertEqual(hash_file(path), hashlib.blake2b(b'first save').hexdigest())
+
+    def test_verify(self):
+        result = self.verifier.verify(self.copy_manager, self.backup_item)
+
+        self.assertTrue(result.succeeded)
+        self.assertEqual(result.files, 2)
+
+    def test_verify_load(self):
+        result = self.verifier.verify(self.copy_manager, self.backup_item, loading=True)
+
+        self.assertTrue(result.succeeded)
+
+    def test_verify_mismatches(self):
+        with open(os.path.join(self.dest_dir, 'a.sav'), 'wb') as f:
+            f.write(b'first sav!')
+        with open(os.path.join(self.dest_dir, 'slot', 'b.sav'), 'wb') as f:
+            f.write(b'second')
+        os.unlink(os.path.join(self.source_dir, 'slot', 'b.sav'))
+        os.rename(os.path.join(self.dest_dir, 'slot', 'b.sav'), os.path.join(self.source_dir, 'slot', 'b.sav'))
+        with open(os.path.join(self.source_dir, 'c.sav'), 'wb') as f:
+            f.write(b'third save')
+
+        result = self.verifier.verify(self.copy_manager, self.backup_item)
+
+        self.assertFalse(result.succeeded)
+        self.assertEqual(result.missing, ['c.sav', os.path.join('slot', 'b.sav')])
+        self.assertEqual(result.mismatched, ['a.sav'])
+
+    def test_verify_missing_destination(self):
+        shutil.rmtree(self.dest_dir)
+
+        result = self.verifier.verify(self.copy_manager, self.backup_item)
+
+        self.assertEqual(result.missing, ['a.sav', os.path.join('slot', 'b.sav')])
+
+    def test_verify_single_file(self):
+        paths = (os.path.join(self.source_dir, 'a.sav'), os.path.join(self.dest_dir, 'a.sav'))
+        with patch.object(self.copy_manager, 'get_transfer_paths', return_value=paths):
+            self.assertTrue(self.verifier.verify(self.copy_manager, self.backup_item).succeeded)
+
+            with open(paths[1], 'wb') as f:
+                f.write(b'first sav!')
+            self.assertEqual(self.verifier.verify(self.copy_manager, self.backup_item).mismatched, [''])
+
+    def test_verify_unsupported_copy_manager(self):
+        self.assertIsNone(self.verifier.verify(ArchiveCopyManager(compression='gzip'), self.backup_item))
+
+    def test_verify_reuses_indexed_hashes(self):
+        index = FileStateIndex(os.path.join(self.temp_dir, 'index.sqlite3'))
+        self.addCleanup(index.close)
+        copy_manager = IndexedCopyManager(self.copy_manager, index)
+        copy_manager.save_item(self.backup_item, force=True)
+
+        verifier = TreeVerifier(index)
+        self.addCleanup(verifier.close)
+        self.assertTrue(verifier.verify(copy_manager, self.backup_item).succeeded)
+
+        with patch.object(verify, 'hash_file', wraps=hash_file) as hashed:
+            self.assertTrue(verifier.verify(copy_manager, self.backup_item).succeeded)
+
+        # Only the remote side has to be read again.
+        self.assertEqual(
+            sorted(c[0][0] for c in hashed.call_args_list),
+            [os.path.join(self.dest_dir, 'a.sav'), os.path.join(self.dest_dir, 'slot', 'b.sav')]
+        )
@@ -0,0 +1,117 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase, skipIf
+
+from backup.core.watcher import Debouncer, InotifyWatcher, PollingWatcher, WatcherUnavailableError, create_watcher
+
+try:
+    InotifyWatcher().close()
+    INOTIFY_AVAILABLE = True
+except WatcherUnavailableError:  # pragma: no cover (Depends on the platform)
+    INOTIFY_AVAILABLE = False
+
+
+class DebouncerTestCase(TestCase):
+    def test_waits_for_quiet_period(self):
+        debouncer = Debouncer(5)
+        debouncer.changed(['a'], 0)
+        debouncer.changed(['a'], 3)
+
+        self.assertEqual(debouncer.next_deadline(), 8)
+        self.assertEqual(debouncer.pop_ready(7), [])
+        self.assertEqual(debouncer.pop_ready(8), ['a'])
+        self.assertEqual(debouncer.pop_ready(20), [])
+        self.assertIsNone(debouncer.next_deadline())
+
+    def test_max_delay(self):
+        debouncer = Debouncer(5, max_delay=12)
+        for now in range(0, 12, 2):
+            debouncer.changed(['a'], now)
+            self.assertEqual(debouncer.pop_ready(now), [])
+
+        debouncer.changed(['a', 'b'], 12)
+        self.assertEqual(debouncer.pop_ready(12), ['a'])
+        self.assertEqual(debouncer.pop_ready(17), ['b'])
+
+
+class WatcherTestCase(object):
+    def setUp(self):
+        super(WatcherTestCase, self).setUp()
+        self.root = mkdtemp()
+        self.game_a = os.path.join(self.root, 'a')
+        self.game_b = os.path.join(self.root, 'b')
+        os.makedirs(os.path.join(self.game_a, 'slots'))
+        os.makedirs(self.game_b)
+
+        self.watcher = self._create_watcher()
+        self.watcher.add('a', self.game_a)
+        self.watcher.add('b', self.game_b)
+        self.watcher.add('missing', os.path.join(self.root, 'missing'))
+
+    def tearDown(self):
+        super(WatcherTestCase, self).tearDown()
+        self.watcher.close()
+        shutil.rmtree(self.root)
+
+    def _wait_for_changes(self):
+        changed = set()
+        for _ in range(10):
+            changed.update(self.watcher.wait(0.5))
+            if changed:
+                return changed
+        return changed  # pragma: no cover
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.watcher.wait(0.1), set())
+
+    def test_file_written(self):
+        with open(os.path.join(self.game_a, 'slots', 'save1'), 'w') as f:
+            f.write('progress')
+
+        self.assertEqual(self._wait_for_changes(), {'a'})
+
+    def test_file_in_new_directory_written(self):
+        # Empty directories don't need saving, so whether creating one counts
+        #   as a change depends on the watcher.
+        os.makedirs(os.path.join(self.game_b, 'new'))
+        self.watcher.wait(0.5)
+
+        with open(os.path.join(self.game_b, 'new', 'save1'), 'w') as f:
+            f.write('progress')
+
+        self.assertEqual(self._wait_for_changes(), {'b'})
+
+    def test_missing_directory_created(self):
+        os.makedirs(os.path.join(self.root, 'missing', 'slots'))
+        self.watcher.wait(0.5)
+
+        with open(os.path.join(self.root, 'missing', 'slots', 'save1'), 'w') as f:
+            f.write('progress')
+
+        self.assertEqual(self._wait_for_changes(), {'missing'})
+
+    def test_single_file_written(self):
+        save_path = os.path.join(self.root, 'single.sav')
+        with open(save_path, 'w') as f:
+            f.write('progress')
+        self.watcher.add('single', save_path)
+
+        with open(save_path, 'a') as f:
+            f.write('more progress')
+
+        self.assertEqual(self._wait_for_changes(), {'single'})
+
+
+@skipIf(not INOTIFY_AVAILABLE, 'inotify is not available on this platform')
+class InotifyWatcherTestCase(WatcherTestCase, TestCase):
+    def _create_watcher(self):
+        return create_watcher()
+
+
+class PollingWatcherTestCase(WatcherTestCase, TestCase):
+    def _create_watcher(self):
+        return create_watcher(poll=True, poll_interval=0.1)
+
+    def test_is_polling(self):
+        self.assertIsInstance(self.watcher, PollingWatcher)
@@ -0,0 +1,133 @@
+import os
+import shutil
+import sys
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+import yaml
+
+from backup.ext.games.config_loader import InvalidConfigError, NoGamesDefinedError, load_config
+
+
+THIS_MACHINE_SIMULATED_PLATFORM = 'some_platform'
+
+
+class ConfigLoaderTestCase(TestCase):
+    def setUp(self):
+        super(ConfigLoaderTestCase, self).setUp()
+        self.temp_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        patcher = patch.dict(os.environ, {'BACKUP_CACHE_DIR': os.path.join(self.temp_dir, 'cache')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for k in ('REMOTE_ROOT', 'EXAMPLE_VARIABLE', 'EXAMPLE_ROOT'):
+            os.environ.pop(k, None)
+
+        self.config_path = os.path.join(self.temp_dir, 'config.yaml')
+        self.config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                THIS_MACHINE_SIMULATED_PLATFORM: '/remote/root'
+            },
+            'variables': {
+                'EXAMPLE_VARIABLE': '$EXAMPLE_ROOT/some_dirname'
+            },
+            'games': [
+                {
+                    'name': 'Some Game',
+                    'aliases': ['sg'],
+                    THIS_MACHINE_SIMULATED_PLATFORM: {
+                        'local': '$EXAMPLE_VARIABLE/local'
+                    }
+                },
+                {
+                    'name': 'Other Game',
+                    'some_other_platform': {
+                        'local': '/lol/path/doesnt/matter'
+                    }
+                }
+            ]
+        }
+        self._write_config()
+
+    def _write_config(self):
+        with open(self.config_path, 'w') as f:
+            yaml.dump(self.config, f)
+
+    def _load_config(self):
+        config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+        # The environment is only set up once per process normally.
+        for k in config.environment:
+            del os.environ[k]
+        return config
+
+    def test_load_config(self):
+        os.environ['EXAMPLE_ROOT'] = '/example'
+        config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+
+        self.assertEqual(config.manager, 'NativeCopyManager')
+        self.assertEqual(config.environment, {
+            'REMOTE_ROOT': '/remote/root',
+            'EXAMPLE_VARIABLE': '/example/some_dirname'
+        })
+        self.assertEqual(os.environ['EXAMPLE_VARIABLE'], '/example/some_dirname')
+        self.assertEqual(config.game_definitions, [{
+            'name': 'Some Game',
+            'aliases': ['sg'],
+            THIS_MACHINE_SIMULATED_PLATFORM: {
+                'local': '/example/some_dirname/local',
+                'remote': '/remote/root'
+            }
+        }])
+
+    def test_load_config_uses_cache(self):
+        expected = self._load_config()
+
+        # The config isn't parsed, so PyYAML isn't even imported.
+        with patch.dict(sys.modules):
+            del sys.modules['yaml']
+            config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+            self.assertNotIn('yaml', sys.modules)
+
+        self.assertEqual(config.to_dict(), expected.to_dict())
+        self.assertEqual(os.environ['REMOTE_ROOT'], '/remote/root')
+
+    def test_load_config_file_changed(self):
+        self._load_config()
+
+        self.config['games'][0]['aliases'] = ['sg2']
+        self._write_config()
+
+        config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+        self.assertEqual(config.game_definitions[0]['aliases'], ['sg2'])
+
+    def test_load_config_environment_changed(self):
+        self._load_config()
+
+        os.environ['EXAMPLE_ROOT'] = '/elsewhere'
+        config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+        self.assertEqual(
+            config.game_definitions[0][THIS_MACHINE_SIMULATED_PLATFORM]['local'],
+            '/elsewhere/some_dirname/local'
+        )
+
+    def test_load_config_variable_overridden(self):
+        self._load_config()
+
+        os.environ['EXAMPLE_VARIABLE'] = '/overridden'
+        config = load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+        self.assertNotIn('EXAMPLE_VARIABLE', config.environment)
+        self.assertEqual(config.game_definitions[0][THIS_MACHINE_SIMULATED_PLATFORM]['local'], '/overridden/local')
+
+    def test_load_config_no_games(self):
+        del self.config['games']
+        self._write_config()
+
+        with self.assertRaises(NoGamesDefinedError):
+            load_config(self.config_path, THIS_MACHINE_SIMULATED_PLATFORM)
+
+    def test_load_config_no_remote(self):
+        with self.assertRaises(InvalidConfigError):
+            load_config(self.config_path, 'some_other_platform')
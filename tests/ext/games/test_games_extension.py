@@ -1,9 +1,12 @@
+import json
 import os
 import shutil
+import signal
 import sys
 from subprocess import Popen, PIPE
 from tempfile import NamedTemporaryFile, mkdtemp
 from unittest import TestCase
+from unittest.mock import patch
 
 import yaml
 
@@ -65,6 +68,17 @@ class GamesTestCase(TestCase):
 
         cls.cli_path = os.path.join(cls.root_dir, 'backup', 'cli.py')
 
+    def setUp(self):
+        super(GamesTestCase, self).setUp()
+
+        # The CLI is run with a copy of this environment, so its caches are
+        #   kept out of the user's cache directory too.
+        cache_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        patcher = patch.dict(os.environ, {'BACKUP_CACHE_DIR': cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def _call_cli(self, cli_args, stdin=None):
         full_command = [PYTHON_BIN, self.cli_path, 'games'] + cli_args
 
@@ -79,7 +93,7 @@ class GamesTestCase(TestCase):
         rv, so, se = self._call_cli([])
 
         self.assertEqual(rv, 2)
-        self.assertIn(b'{save,load}', se)
+        self.assertIn(b'{save,load,watch}', se)
 
     def test_cli_fails_with_unknown_action(self):
         rv, so, se = self._call_cli(['unsave'])
@@ -167,6 +181,51 @@ class GamesTestCase(TestCase):
             self.assertEqual(rv, 1)
             self.assertIn(b'Failed to find copy manager: ActuallyDeletesCopyManager', se)
 
+    def test_cli_invalid_throttle(self):
+        config = {
+            'manager': 'NativeCopyManager',
+            'throttle': {
+                'bandwidth': 'as fast as possible'
+            },
+            'remotes': {
+                GameBackupExtension.get_system_platform(): '/some/root/path'
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': '/lol/path/doesnt/matter',
+                    'remote': '/somewhere/else/lol'
+                }
+            }]
+        }
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(['-c', cfg, 'save'])
+            self.assertEqual(rv, 1)
+            self.assertIn(b'Invalid bandwidth: as fast as possible', se)
+
+    def test_cli_suggests_similar_games(self):
+        config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                GameBackupExtension.get_system_platform(): '/some/root/path'
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': '/lol/path/doesnt/matter',
+                    'remote': '/somewhere/else/lol'
+                }
+            }]
+        }
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(['-c', cfg, 'save', '--game', 'Sme Game'])
+            self.assertEqual(rv, 3)
+            self.assertIn(b'No game found with that name\nDid you mean one of the following:\n  Some Game\n', se)
+
+            rv, so, se = self._call_cli(['-c', cfg, 'save', '--game', 'Nothing Like It'])
+            self.assertEqual(rv, 3)
+            self.assertIn(b'Try one of the following:\n  Some Game\n', se)
+
     def test_cli_saves_successfully(self):
         # Create some temporary files and directories that simulate save files.
         expected_content = 'This is example content for comparison.\n'
@@ -202,6 +261,119 @@ class GamesTestCase(TestCase):
         shutil.rmtree(source_dir)
         shutil.rmtree(dest_dir)
 
+    def test_cli_saves_and_loads_with_verify(self):
+        source_dir = mkdtemp()
+        dest_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir)
+        self.addCleanup(shutil.rmtree, dest_dir)
+
+        with open(os.path.join(source_dir, 'save.dat'), 'w') as f:
+            f.write('This is example content for comparison.\n')
+
+        config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                GameBackupExtension.get_system_platform(): os.path.join(dest_dir, 'remote')
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': source_dir
+                }
+            }]
+        }
+
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(['-c', cfg, 'save', '--game', 'Some Game', '--verify'])
+            self.assertEqual(rv, 0)
+            self.assertIn(b'Verified Some Game (1 files)', so)
+
+            rv, so, se = self._call_cli(['-c', cfg, 'load', '--game', 'Some Game', '--force', '--verify'])
+            self.assertEqual(rv, 0)
+            self.assertIn(b'Verified Some Game (1 files)', so)
+
+    def test_cli_saves_with_progress_and_metrics(self):
+        source_dir = mkdtemp()
+        dest_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir)
+        self.addCleanup(shutil.rmtree, dest_dir)
+
+        with open(os.path.join(source_dir, 'save.dat'), 'w') as f:
+            f.write('This is example content for comparison.\n')
+
+        config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                GameBackupExtension.get_system_platform(): os.path.join(dest_dir, 'remote')
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': source_dir
+                }
+            }]
+        }
+
+        metrics_path = os.path.join(dest_dir, 'metrics.json')
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(
+                ['-c', cfg, 'save', '--all', '--progress', '--metrics-json', metrics_path]
+            )
+            self.assertEqual(rv, 0)
+            self.assertIn(b'1/1 done, 1 files', se)
+
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+
+        game, = metrics['games']
+        self.assertEqual(game['name'], 'Some Game')
+        self.assertEqual(game['operation'], 'save')
+        self.assertEqual(game['files'], 1)
+        self.assertEqual(game['bytes'], 40)
+        self.assertIsNone(game['error'])
+
+    def test_cli_watch_saves_changed_games(self):
+        source_dir = mkdtemp()
+        dest_dir = mkdtemp()
+        shutil.rmtree(dest_dir)
+
+        config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                GameBackupExtension.get_system_platform(): dest_dir
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': source_dir
+                }
+            }]
+        }
+
+        with TempConfig(config) as cfg:
+            env = os.environ.copy()
+            env['PYTHONPATH'] = self.root_dir
+            process = Popen([PYTHON_BIN, self.cli_path, 'games', '-c', cfg, 'watch', '--quiet-period', '0.2'],
+                            stdout=PIPE, stderr=PIPE, env=env)
+            try:
+                self.assertEqual(process.stdout.readline(), b'Watching 1 games\n')
+
+                with open(os.path.join(source_dir, 'save1'), 'w') as f:
+                    f.write('progress')
+
+                self.assertEqual(process.stdout.readline(), b'Saved Some Game\n')
+            finally:
+                process.send_signal(signal.SIGINT)
+                so, se = process.communicate()
+
+            self.assertEqual(process.returncode, 0)
+
+        with open(os.path.join(dest_dir, 'save1')) as f:
+            self.assertEqual(f.read(), 'progress')
+
+        shutil.rmtree(source_dir)
+        shutil.rmtree(dest_dir)
+
     def test_cli_resolves_variables(self):
         # Create some temporary files and directories that simulate save files.
         expected_content = 'This is example content for comparison.\n'
@@ -353,6 +525,50 @@ class GamesTestCase(TestCase):
         shutil.rmtree(source_dir)
         shutil.rmtree(dest_dir)
 
+    def test_cli_saves_all_concurrently_with_failures(self):
+        expected_content = 'This is example content for comparison.\n'
+
+        source_dirs = [mkdtemp(), mkdtemp(), mkdtemp()]
+        dest_dir = mkdtemp()
+
+        for source_dir in source_dirs:
+            with open(os.path.join(source_dir, 'save.dat'), 'w') as f:
+                f.write(expected_content)
+
+        # The second game already has a copy on the remote, so it should fail
+        #   without stopping the other two from being saved.
+        os.makedirs(os.path.join(dest_dir, 'Game 2'))
+
+        config = {
+            'manager': 'NativeCopyManager',
+            'remotes': {
+                GameBackupExtension.get_system_platform(): dest_dir
+            },
+            'games': [{
+                'name': 'Game {}'.format(i),
+                GameBackupExtension.get_system_platform(): {
+                    'local': source_dir,
+                    'remote': os.path.join('$REMOTE_ROOT', 'Game {}'.format(i))
+                }
+            } for i, source_dir in enumerate(source_dirs, 1)]
+        }
+
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(['-c', cfg, 'save', '--all', '--jobs', '3'])
+            self.assertEqual(rv, 5)
+            self.assertIn(b'Saved 2 of 3 games', so)
+            self.assertIn(b'Game 2: Destination already contains colliding files', se)
+            # How the games that were saved got copied is still reported.
+            self.assertIn(b'Copied 2 files using ', so)
+
+        for name in ('Game 1', 'Game 3'):
+            with open(os.path.join(dest_dir, name, 'save.dat')) as f:
+                self.assertEqual(f.read(), expected_content)
+
+        for source_dir in source_dirs:
+            shutil.rmtree(source_dir)
+        shutil.rmtree(dest_dir)
+
     def test_cli_loads_successfully(self):
         # Create some temporary files and directories that simulate save files.
         expected_content = 'This is example content for comparison.\n'
@@ -387,3 +603,55 @@ class GamesTestCase(TestCase):
 
         shutil.rmtree(source_dir)
         shutil.rmtree(dest_dir)
+
+    def test_cli_loads_snapshots(self):
+        source_dir = mkdtemp()
+        dest_dir = mkdtemp()
+        save_path = os.path.join(source_dir, 'save1')
+
+        config = {
+            'manager': 'NativeCopyManager',
+            'manager_options': {
+                'snapshots': True
+            },
+            'remotes': {
+                GameBackupExtension.get_system_platform(): dest_dir
+            },
+            'games': [{
+                'name': 'Some Game',
+                GameBackupExtension.get_system_platform(): {
+                    'local': source_dir
+                }
+            }]
+        }
+
+        with TempConfig(config) as cfg:
+            for content in ('First save.\n', 'Second save.\n'):
+                with open(save_path, 'w') as f:
+                    f.write(content)
+                rv, so, se = self._call_cli(['-c', cfg, 'save', '--game', 'Some Game'])
+                self.assertEqual(rv, 0)
+
+            rv, so, se = self._call_cli(['-c', cfg, 'load', '--game', 'Some Game', '--list-snapshots'])
+            self.assertEqual(rv, 0)
+            second, first = so.decode().splitlines()
+            self.assertEqual(sorted(os.listdir(dest_dir)), [first, second])
+
+            shutil.rmtree(source_dir)
+            rv, so, se = self._call_cli(['-c', cfg, 'load', '--game', 'Some Game', '--snapshot', first])
+            self.assertEqual(rv, 0)
+            with open(save_path) as f:
+                self.assertEqual(f.read(), 'First save.\n')
+
+            rv, so, se = self._call_cli(['-c', cfg, 'load', '--game', 'Some Game', '--snapshot', 'missing'])
+            self.assertEqual(rv, 3)
+            self.assertIn('No snapshot named missing', se.decode())
+
+        del config['manager_options']
+        with TempConfig(config) as cfg:
+            rv, so, se = self._call_cli(['-c', cfg, 'load', '--game', 'Some Game', '--snapshot', first])
+            self.assertEqual(rv, 3)
+            self.assertIn('isn\'t configured to save snapshots', se.decode())
+
+        shutil.rmtree(source_dir)
+        shutil.rmtree(dest_dir)
@@ -99,3 +99,31 @@ class GamesManagerTestCase(TestCase):
             gm.resolve_alias('game3')
 
         self.assertEqual(exc.exception.args, ('No game found with that name',))
+
+    def test_get_game_names(self):
+        gm = GamesManager(THIS_MACHINE_SIMULATED_PLATFORM, self.game_definitions)
+
+        self.assertEqual(gm.get_game_names(), ['game1 (g1)', 'game2 (g2)'])
+
+    def test_find_games(self):
+        gm = GamesManager(THIS_MACHINE_SIMULATED_PLATFORM, self.game_definitions)
+
+        self.assertEqual(gm.find_games('GAME'), ['game1', 'game2'])
+        self.assertEqual(gm.find_games('g2'), ['game2'])
+        self.assertEqual(gm.find_games('g', limit=1), ['game1'])
+        self.assertEqual(gm.find_games('game3'), [])
+
+    def test_suggest_games(self):
+        game_definitions = [
+            {'name': 'Borderlands 2', 'aliases': ['Borderlands2'], 'p': {'local': '/a', 'remote': '/b'}},
+            {'name': 'Burnout Paradise', 'p': {'local': '/c', 'remote': '/d'}},
+            {'name': 'The Crew', 'aliases': ['TheCrew'], 'p': {'local': '/e', 'remote': '/f'}}
+        ]
+        gm = GamesManager('p', game_definitions)
+
+        self.assertEqual(gm.suggest_games('bord'), ['Borderlands 2'])
+        self.assertEqual(gm.suggest_games('Borderlnds 2'), ['Borderlands 2'])
+        self.assertEqual(gm.suggest_games('teh crew'), ['The Crew'])
+        self.assertEqual(gm.suggest_games('b', limit=1), ['Borderlands 2'])
+        self.assertEqual(gm.suggest_games('zzz'), [])
+        self.assertEqual(gm.suggest_games(''), [])
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from benchmarks.chunker import measure_chunker
+from benchmarks.run import compare
+from benchmarks.tree_generator import TreeProfile, generate_tree
+
+
+class BenchmarksTestCase(TestCase):
+    def test_generate_tree(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        profile = TreeProfile(
+            tiny_files=20, tiny_file_size=64, large_files=1, large_file_size=1024, depth=4, hardlinks=3
+        )
+        stats = generate_tree(root, profile)
+
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            files.extend(os.path.join(dirpath, f) for f in filenames)
+
+        self.assertEqual(stats.files, 25)
+        self.assertEqual(len(files), 25)
+        self.assertEqual(stats.bytes, sum(os.path.getsize(f) for f in files))
+        self.assertGreaterEqual(len([f for f in files if os.stat(f).st_nlink > 1]), 3)
+
+    def test_compare(self):
+        baseline = {'results': [
+            {'manager': 'NativeCopyManager', 'scenario': 'save', 'wall_seconds': 1.0},
+            {'manager': 'NativeCopyManager', 'scenario': 'load', 'wall_seconds': 1.0}
+        ]}
+        report = {'results': [
+            {'manager': 'NativeCopyManager', 'scenario': 'save', 'wall_seconds': 0.5},
+            {'manager': 'NativeCopyManager', 'scenario': 'load', 'wall_seconds': 2.0},
+            {'manager': 'RsyncCopyManager', 'scenario': 'save', 'error': 'FileNotFoundError'}
+        ]}
+
+        lines, regressed = compare(report, baseline)
+
+        self.assertTrue(regressed)
+        self.assertEqual(len(lines), 2)
+        self.assertIn('REGRESSION', lines[1])
+
+    def test_measure_chunker(self):
+        results = measure_chunker(64 * 1024, repeat=1, min_size=256, avg_size=1024, max_size=4096)
+
+        self.assertEqual(sorted(results), ['random', 'zeros'])
+        self.assertTrue(all(mb_per_second > 0 for mb_per_second in results.values()))
@@ -1,5 +1,7 @@
 import os
+import pstats
 import sys
+import tempfile
 from subprocess import Popen, PIPE
 
 from unittest import TestCase
@@ -43,3 +45,20 @@ class CliTestCase(TestCase):
 
         self.assertEqual(rv, 2)
         self.assertIn(b'invalid choice', se)
+
+    def test_cli_profile(self):
+        rv, so, se = self._call_cli(['--profile', 'games'])
+
+        self.assertEqual(rv, 2)
+        self.assertIn(b'Phases:\n', se)
+        self.assertIn(b' ms  extension discovery\n', se)
+        self.assertIn(b' ms  run games\n', se)
+
+    def test_cli_profile_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, 'run.prof')
+            rv, so, se = self._call_cli(['--profile-output', output, 'games'])
+
+            self.assertEqual(rv, 2)
+            self.assertIn(b' ms  run games\n', se)
+            self.assertGreater(pstats.Stats(output).total_calls, 0)